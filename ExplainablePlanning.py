@@ -1,5 +1,13 @@
 import MultiAgentGraph
 import argparse
+import contextlib
+import sys
+import mapParser
+import resultWriter
+from astar import AstarSolver
+from heuristics import HEURISTICS
+from instrumentation import Instrumentation, profileCall
+from mapCache import MapCache
 
 
 class BenchTester:
@@ -7,8 +15,27 @@ class BenchTester:
         self.mag = None  # Multi Agent Graph object, to be initialized later
         self.graph = None
         self.resetParams(1,2)
+        self.operatorDecomposition=False
+        self.maxNodes=None  # limit on expanded nodes
+        self.maxMemory=None  # limit on the process RSS, in MB
+        self.progress=None  # function called with the live search stats
+        self.processes=None  # worker processes of minimizeSegments, None for one per CPU
+        self.tableSize=None  # transposition table entries of the memory bounded search, None to use A*
+        self.heuristic="sum"  # name of the search heuristic, see heuristics.HEURISTICS
+        self.actions="move"  # action model of the agents, see astar.AstarSolver.ACTIONS
+        self.cbs=False  # plan with Conflict-Based Search instead of A*
+        self.incremental=False  # plan through the graph's SolverSession, reusing the previous query
+        self.independence=False  # plan groups of agents separately with independence detection
+        self.anytime=False  # keep improving the plan until the timeout, see MultiAgentGraph.planAnytime
+        self.bound=None  # initial suboptimality bound of the anytime search, None for the number of agents
+        self.onSolution=None  # function called with every plan found by the anytime search
+        self.instrumentation=None  # Instrumentation of the A* search, None to run without it
+        self.workers=None  # processes of the parallel A* search (HDA*), None for the serial search
+        self.cache=MapCache.fromEnvironment()  # MapCache of compiled maps, None to parse every map
+        self.compiled=None
         self.graph_file=None
         self.bench_file=None
+        self.verbose=False  # print the log messages
 
 
     def resetParams(self, decomp_parts,num_agents):
@@ -33,45 +60,66 @@ class BenchTester:
 
     def planAll(self,timeout):
         #toggle between history-dependent A* and standard A*
-        return self.mag.planAstar(self.decomp_parts-1,timeout)
+        if self.cbs:
+            return self.mag.planCBS(self.decomp_parts-1,timeout,self.maxNodes,self.maxMemory,self.progress)
+        if self.incremental:
+            return self.mag.planSession(self.decomp_parts-1,timeout,self.operatorDecomposition,
+                                        self.maxNodes,self.maxMemory,self.progress,self.heuristic,self.actions)
+        if self.anytime:
+            return self.mag.planAnytime(self.decomp_parts-1,timeout,self.bound,self.maxNodes,self.maxMemory,
+                                        self.progress,self.heuristic,self.actions,self.onSolution)
+        if self.independence:
+            return self.mag.planIndependent(self.decomp_parts-1,timeout,self.operatorDecomposition,
+                                            self.maxNodes,self.maxMemory,self.progress,self.heuristic,self.actions)
+        if self.tableSize is not None:
+            return self.mag.planIdaStar(self.decomp_parts-1,timeout,self.tableSize,
+                                        self.maxNodes,self.maxMemory,self.progress,self.heuristic,self.actions)
+        return self.mag.planAstar(self.decomp_parts-1,timeout,self.operatorDecomposition,
+                                  self.maxNodes,self.maxMemory,self.progress,self.heuristic,self.actions,
+                                  self.instrumentation,self.workers)
         #return self.mag.planAstarNoHist()
 
+    def minimizeSegments(self,timeout):
+        #plan with the fewest decomposition parts, up to decomp_parts
+        return self.mag.minimizeSegments(self.decomp_parts,timeout,self.operatorDecomposition,
+                                         self.maxNodes,self.maxMemory,self.processes,self.heuristic,self.actions)
+
     def setSource(self,agent,node):
         if self.mag is not None:
             self.mag.updateSource(agent, node)
-            self.log(
-                "Set source for agent " + str(agent) + " as " + str(node))
+            if self.verbose:
+                self.log("Set source for agent " + str(agent) + " as " + str(node))
 
     def setTarget(self,agent,node):
         if self.mag is not None:
             self.mag.updateTarget(agent, node)
-            self.log(
-                "Set target for agent " + str(agent) + " as " + str(node))
-            self.log(str(self.mag))
+            if self.verbose:
+                self.log("Set target for agent " + str(agent) + " as " + str(node))
+                self.log(str(self.mag))
 
     def setupGraph(self):
-        self.mag = MultiAgentGraph.MultiAgentGraph(self.graph, self.num_agents)
+        if self.compiled is not None:
+            self.mag = MultiAgentGraph.MultiAgentGraph(self.graph, self.num_agents,
+                                                       self.compiled.index, self.compiled.distanceTables)
+        else:
+            self.mag = MultiAgentGraph.MultiAgentGraph(self.graph, self.num_agents)
 
     def readBenchmarkData(self):
-        f = open(self.bench_file, "r")
-
-        if f.mode != "r":
-            self.log("cannot read scenario file")
-            exit(0)
-
-        lines = f.read().splitlines()
-        for i in range(self.num_agents):
-            dat = lines[i+1].split()
-            node_source=(int(dat[4]),int(dat[5]))
+        #reads only the rows of the agents, see mapParser.iterScenario
+        for i, (node_source, node_target) in enumerate(mapParser.readScenario(self.bench_file, self.num_agents)):
             self.setSource(i,node_source)
-            node_target=(int(dat[6]),int(dat[7]))
             self.setTarget(i, node_target)
 
 
     def readGraph(self,graphFile,benchFile):
         self.graph_file=graphFile
         self.bench_file=benchFile
-        self.graph = MultiAgentGraph.MultiAgentGraph.readGraphFile(self.graph_file)
+        if self.cache is not None:
+            self.compiled = self.cache.load(self.graph_file)
+            self.graph = self.compiled.graph
+        else:
+            self.compiled = None
+            self.graph = MultiAgentGraph.MultiAgentGraph.readGraphFile(self.graph_file)
         self.setupGraph()
         self.readBenchmarkData()
 
@@ -85,9 +133,18 @@ class BenchTester:
         outstr += self.mag.resultOutput()
         return outstr
 
+    def resultRecord(self):
+        #structured form of writeResult, see resultWriter for the output formats
+        record = {"map": self.graph_file, "scen": self.bench_file, "agents": self.num_agents,
+                  "max_decomp_parts": self.decomp_parts}
+        record.update(self.mag.resultRecord())
+        if self.instrumentation is not None:
+            record["profile"] = self.instrumentation.asDict()
+        return record
+
     def log(self, text):
-        pass
-        #print("LOG: "+text)
+        if self.verbose:
+            print("LOG: "+text)
 
 
 if __name__ == "__main__":
@@ -97,19 +154,96 @@ if __name__ == "__main__":
     parser.add_argument("numagent", help="number of agents (minimum 2)", type=int)
     parser.add_argument("numseg", help="number of segments (minimum 1)", type=int)
     parser.add_argument("timeout", help="time limit (in seconds)", type=int)
+    parser.add_argument("--od", help="use operator decomposition (move one agent at a time)", action="store_true")
+    parser.add_argument("--max-nodes", help="limit on the number of expanded nodes", type=int)
+    parser.add_argument("--max-memory", help="limit on the memory used (in MB)", type=float)
+    parser.add_argument("--progress", help="print search statistics while planning", action="store_true")
+    parser.add_argument("--heuristic", help="search heuristic (default: sum)", choices=list(HEURISTICS), default="sum")
+    parser.add_argument("--actions", help="action model: move (agents always move, and leave the graph at their "
+                                          "target), wait (may also wait), stay (may wait, and stay at their target) "
+                                          "(default: move)", choices=AstarSolver.ACTIONS, default="move")
+    #the search engines, at most one of them (A* by default)
+    engine = parser.add_mutually_exclusive_group()
+    engine.add_argument("--ida", help="use memory bounded IDA* with a transposition table of this many entries",
+                        type=int, metavar="TABLE_SIZE")
+    engine.add_argument("--cbs", help="use Conflict-Based Search (independent agent plans, repaired on conflicts)",
+                        action="store_true")
+    engine.add_argument("--id", help="independence detection: plan groups of agents that do not interact separately",
+                        action="store_true")
+    engine.add_argument("--anytime", help="report a first plan quickly, then better ones until the timeout, "
+                                          "each with its suboptimality bound", action="store_true")
+    parser.add_argument("--bound", help="initial suboptimality bound of --anytime (default: number of agents, "
+                                        "the plain search)", type=float)
+    engine.add_argument("--minimize", help="find the fewest segments, up to numseg, planning several in parallel",
+                        action="store_true")
+    parser.add_argument("--processes", help="number of worker processes of --minimize (default: number of CPUs)",
+                        type=int)
+    engine.add_argument("--workers", help="run the A* search in parallel (HDA*) over this many worker processes "
+                                          "(0: one per CPU)", type=int)
+    parser.add_argument("--profile", help="time the phases of the serial A* search and count its operations, "
+                                          "reported on PROFILE lines (or in the profile field)", action="store_true")
+    parser.add_argument("--cprofile", help="also run the search under cProfile and write the stats to this file "
+                                           "(pstats format, e.g. for snakeviz or flameprof)", metavar="FILE")
+    parser.add_argument("--format", help="output format (default: text)", choices=("text",) + resultWriter.FORMATS,
+                        default="text")
+    parser.add_argument("--cache-dir", help="directory caching compiled maps and distance tables "
+                                            "(default: $" + MapCache.ENV_VAR + ")")
 
     args = parser.parse_args()
+    if args.profile:
+        #the other engines never run the instrumented search, their profile would be empty
+        engines = {"--ida": args.ida is not None, "--cbs": args.cbs, "--id": args.id, "--anytime": args.anytime,
+                   "--minimize": args.minimize, "--workers": args.workers is not None}
+        for name, used in engines.items():
+            if used:
+                parser.error("--profile times the serial A* search only, it cannot be used with " + name)
 
     #print(args)
     
     gv = BenchTester()
 
     gv.resetParams(args.numseg, args.numagent)
+    gv.operatorDecomposition = args.od
+    gv.maxNodes = args.max_nodes
+    gv.maxMemory = args.max_memory
+    #in the structured formats stdout only holds the records, messages go to stderr
+    messages = sys.stdout if args.format == "text" else sys.stderr
+    if args.progress:
+        gv.progress = lambda stats: print("PROGRESS:\t" + str(stats), file=messages, flush=True)
+    if args.cache_dir:
+        gv.cache = MapCache(args.cache_dir)
     gv.readGraph(args.mapfile, args.scenfile)
 
-    res = gv.planAll(args.timeout)
-    last_dec = gv.minimalDecomposition()
-    print(gv.writeResult())
+    gv.processes = args.processes
+    gv.tableSize = args.ida
+    gv.heuristic = args.heuristic
+    gv.actions = args.actions
+    gv.cbs = args.cbs
+    gv.workers = args.workers
+    gv.independence = args.id
+    gv.anytime = args.anytime
+    gv.bound = args.bound
+    if args.anytime and args.format == "text":
+        gv.onSolution = lambda solution: print("ANYTIME:\t" + str(solution), flush=True)
+    if args.bound is not None and not args.anytime:
+        parser.error("--bound is the initial bound of --anytime, it cannot be used without it")
+    if args.profile:
+        gv.instrumentation = Instrumentation()
+    plan = gv.minimizeSegments if args.minimize else gv.planAll
+    with contextlib.redirect_stdout(messages):
+        if args.cprofile:
+            res = profileCall(args.cprofile, plan, args.timeout)
+        else:
+            res = plan(args.timeout)
+    if args.format == "text":
+        last_dec = gv.minimalDecomposition()
+        print(gv.writeResult())
+        if gv.instrumentation is not None:
+            print(gv.instrumentation.report())
+    else:
+        with contextlib.redirect_stdout(messages):
+            gv.minimalDecomposition()
+        resultWriter.createWriter(sys.stdout, args.format).write(gv.resultRecord())
 
 
 
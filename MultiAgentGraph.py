@@ -1,42 +1,38 @@
-import networkx as nx
-
+import anytime
 import astar
 import astarNoHist
+import cbs
+import hdaStar
+import independence
+import mapParser
+from planArray import PlanArray
+from searchLimits import SearchLimits
+from segmentSweep import SegmentSweep
+from solverSession import SolverSession
 
 class MultiAgentGraph:
-    def __init__(self,graph,num_agents):
+    def __init__(self,graph,num_agents,index=None,distanceTables=None):
+        #index, distanceTables: CellIndex and DistanceTables of graph shared by the solvers, e.g. from a MapCache
         self.graph=graph
         self.num_agents=num_agents
+        self.index=index
+        self.distanceTables=distanceTables
         self.agents={}
         self.decomposition=[]
         self.planTime=None
+        self.planStatus=None
+        self.planStats=None
         self.foundPlan=False
+        self.minParts=None  # fewest decomposition parts found by minimizeSegments
+        self.minPartsProven=False
+        self.session=None  # SolverSession of planSession, kept across calls
+        self.groups=None  # groups of agents planned separately by planIndependent
+        self.solutions=None  # anytime.Solution of every plan found by planAnytime
+        self.bound=None  # suboptimality bound of the plan of planAnytime
 
     @staticmethod
     def readGraphFile(filename):
-        f=open(filename,"r")
-        if f.mode != "r":
-            print("cannot read graph file")
-            exit(0)
-
-        contents = f.read()
-
-        h_idx = contents.find("height")
-        w_idx = contents.find("width")
-        m_idx = contents.find("map")
-        height = int(contents[h_idx + len("height "):w_idx])
-        width = int(contents[w_idx + len("width "):m_idx])
-        map_str = contents[m_idx + len("map") + 1:]
-        map_lines = map_str.split('\n')
-
-        graph = nx.DiGraph(nx.grid_2d_graph(width, height))  # type: digraph
-
-        for j in range(height):
-            for i in range(width):
-                if map_lines[j][i] == "@":
-                    graph.remove_node((i, j))
-
-        return graph
+        return mapParser.readGraph(filename)
 
 
     def updateSource(self,agent,node):
@@ -79,11 +75,27 @@ class MultiAgentGraph:
             return self.agents[ag]['plan']
         return None
 
-    def planAstar(self, num_seg, timeout=300):
+    def planAstar(self, num_seg, timeout=300, operatorDecomposition=False, maxNodes=None, maxMemory=None, progress=None,
+                  heuristic="sum", actions="move", instrumentation=None, workers=None):
+        #maxNodes: limit on expanded nodes, maxMemory: limit on the process RSS in MB,
+        #progress: function called with the live SearchStats during the search, heuristic: see heuristics.HEURISTICS,
+        #actions: action model of the agents, see astar.AstarSolver.ACTIONS,
+        #instrumentation: optional instrumentation.Instrumentation filled with the timers and counters of the search,
+        #workers: number of processes of a parallel search (see hdaStar.HdaStar), None for the serial search
+        if workers is not None and instrumentation is not None:
+            raise ValueError("the parallel search cannot be instrumented")
         solver = astar.AstarSolver(self.graph, [self.getSource(ag) for ag in range(self.num_agents)],
-                                 [self.getTarget(ag) for ag in range(self.num_agents)])
-        solver.computeHeuristic()
-        if solver.astar(num_seg,timeout):
+                                 [self.getTarget(ag) for ag in range(self.num_agents)], self.index, actions)
+        solver.computeHeuristic(self.distanceTables, heuristic)
+        solver.instrumentation = instrumentation
+        limits = SearchLimits(timeout, maxNodes, maxMemory, progress=progress)
+        if workers is not None:
+            found = hdaStar.HdaStar(solver, workers).astar(num_seg,timeout,operatorDecomposition,limits)
+        else:
+            found = solver.astar(num_seg,timeout,operatorDecomposition,limits)
+        self.planStatus = solver.status
+        self.planStats = solver.stats
+        if found:
             self.foundPlan = True
             for ag in self.agents:
                 plan = solver.getPlan(ag)
@@ -96,11 +108,115 @@ class MultiAgentGraph:
         self.planTime=solver.runtime
         return True
 
-    def planAstarNoHist(self):
+    def planAnytime(self, num_seg, timeout=300, bound=None, maxNodes=None, maxMemory=None, progress=None,
+                    heuristic="sum", actions="move", onSolution=None):
+        #anytime planning (see anytime.AnytimeSearch): a first plan within bound times the cheapest one (by default
+        #the plain search), then better plans with tighter bounds until the limits, keeping the best one.
+        #onSolution: function called with the anytime.Solution of every improved plan
+        solver = astar.AstarSolver(self.graph, [self.getSource(ag) for ag in range(self.num_agents)],
+                                 [self.getTarget(ag) for ag in range(self.num_agents)], self.index, actions)
+        solver.computeHeuristic(self.distanceTables, heuristic)
+        limits = SearchLimits(timeout, maxNodes, maxMemory, progress=progress)
+        search = anytime.AnytimeSearch(solver)
+        found = search.solve(num_seg,bound,timeout,limits,onSolution)
+        self.planStatus = search.status
+        self.planStats = search.stats
+        self.planTime = search.runtime
+        self.solutions = search.solutions
+        self.bound = search.bound
+        if not found:
+            print("No plan")
+            self.foundPlan = False
+            return False
+        self.foundPlan = True
+        for ag in self.agents:
+            self.agents[ag]['plan'] = search.getPlan(ag)
+        return True
+
+    def planIdaStar(self, num_seg, timeout=300, tableSize=1000000, maxNodes=None, maxMemory=None, progress=None,
+                    heuristic="sum", actions="move"):
+        #memory bounded planning (see AstarSolver.idaStar), tableSize: entries of the transposition table
+        solver = astar.AstarSolver(self.graph, [self.getSource(ag) for ag in range(self.num_agents)],
+                                 [self.getTarget(ag) for ag in range(self.num_agents)], self.index, actions)
+        solver.computeHeuristic(self.distanceTables, heuristic)
+        limits = SearchLimits(timeout, maxNodes, maxMemory, progress=progress)
+        found = solver.idaStar(num_seg,timeout,tableSize,limits)
+        self.planStatus = solver.status
+        self.planStats = solver.stats
+        self.planTime = solver.runtime
+        if not found:
+            print("No plan")
+            return False
+        self.foundPlan = True
+        for ag in self.agents:
+            self.agents[ag]['plan'] = solver.getPlan(ag)
+        return True
+
+    def planCBS(self, num_seg, timeout=300, maxNodes=None, maxMemory=None, progress=None):
+        #Conflict-Based Search with at most num_seg new segments (see cbs.CbsSolver), maxNodes limits constraint tree nodes
+        solver = cbs.CbsSolver(self.graph, [self.getSource(ag) for ag in range(self.num_agents)],
+                               [self.getTarget(ag) for ag in range(self.num_agents)], self.index)
+        solver.computeHeuristic(self.distanceTables)
+        limits = SearchLimits(timeout, maxNodes, maxMemory, checkEvery=10, progress=progress)
+        found = solver.solve(num_seg,timeout,limits)
+        self.planStatus = solver.status
+        self.planStats = solver.stats
+        self.planTime = solver.runtime
+        if not found:
+            print("No plan")
+            return False
+        self.foundPlan = True
+        for ag in self.agents:
+            self.agents[ag]['plan'] = solver.getPlan(ag)
+        return True
+
+    def planSession(self, num_seg, timeout=300, operatorDecomposition=False, maxNodes=None, maxMemory=None,
+                    progress=None, heuristic="sum", actions="move"):
+        #as planAstar, through a SolverSession kept across calls, for queries that change a few sources or targets
+        session = self.session
+        if session is None or not session.matches(heuristic, actions, operatorDecomposition):
+            session = self.session = SolverSession(self, heuristic, actions, operatorDecomposition)
+        found = session.plan(num_seg,timeout,maxNodes,maxMemory,progress)
+        self.planStatus = session.status
+        self.planStats = session.stats
+        self.planTime = session.runtime
+        if not found:
+            print("No plan")
+            self.foundPlan = False
+            return False
+        self.foundPlan = True
+        for ag in self.agents:
+            self.agents[ag]['plan'] = session.getPlan(ag)
+        return True
+
+    def planIndependent(self, num_seg, timeout=300, operatorDecomposition=False, maxNodes=None, maxMemory=None,
+                        progress=None, heuristic="sum", actions="move"):
+        #as planAstar, planning groups of agents that do not interact separately, see independence.IndependenceDetection
+        detection = independence.IndependenceDetection(self, heuristic, actions, operatorDecomposition)
+        limits = SearchLimits(timeout, maxNodes, maxMemory, progress=progress)
+        found = detection.solve(num_seg,timeout,limits)
+        self.planStatus = detection.status
+        self.planStats = detection.stats
+        self.planTime = detection.runtime
+        self.groups = detection.groups
+        if not found:
+            print("No plan")
+            self.foundPlan = False
+            return False
+        self.foundPlan = True
+        for ag in self.agents:
+            self.agents[ag]['plan'] = detection.getPlan(ag)
+        return True
+
+    def planAstarNoHist(self, timeout=300, maxNodes=None, maxMemory=None, progress=None):
+        #plain A* without segment histories (see astarNoHist), limits as planAstar
         solver = astarNoHist.AstarSolverNoHist(self.graph, [self.getSource(ag) for ag in range(self.num_agents)],
-                                 [self.getTarget(ag) for ag in range(self.num_agents)])
-        solver.computeHeuristic()
-        if solver.astar(240):
+                                 [self.getTarget(ag) for ag in range(self.num_agents)], self.index)
+        solver.computeHeuristic(self.distanceTables)
+        found = solver.astar(240, timeout, SearchLimits(timeout, maxNodes, maxMemory, progress=progress))
+        self.planStatus = solver.status
+        self.planStats = solver.stats
+        if found:
             self.foundPlan = True
             for ag in self.agents:
                 plan = solver.getPlan(ag)
@@ -113,6 +229,26 @@ class MultiAgentGraph:
         self.planTime=solver.runtime
         return True
 
+    def minimizeSegments(self, maxParts, timeout=300, operatorDecomposition=False, maxNodes=None, maxMemory=None,
+                         processes=None, heuristic="sum", actions="move"):
+        #plans with the fewest decomposition parts (at most maxParts), trying several budgets in parallel, see SegmentSweep
+        sweep = SegmentSweep(self, maxParts, timeout, operatorDecomposition, maxNodes, maxMemory, processes,
+                             heuristic=heuristic, actions=actions)
+        parts = sweep.run()
+        self.planStatus = sweep.status
+        self.planStats = sweep.bestStats
+        self.planTime = sweep.runtime
+        self.minParts = parts
+        self.minPartsProven = sweep.isProven()
+        if parts is None:
+            print("No plan")
+            self.foundPlan = False
+            return False
+        self.foundPlan = True
+        for ag in self.agents:
+            self.agents[ag]['plan'] = sweep.bestPlans[ag]
+        return True
+
     @staticmethod
     def isDisjointBySize(sets):
         expectedSize = 0
@@ -121,45 +257,21 @@ class MultiAgentGraph:
         if len(unionSet) == expectedSize: return True
         return False
 
+    def planArray(self):
+        #the plans of the agents that have one, as a PlanArray over the cell ids of the graph
+        paths = [self.getPlan(ag) for ag in self.agents if self.getPlan(ag) is not None]
+        ids = self.index.ids if self.index is not None else None
+        return PlanArray.fromPaths(paths, ids)
+
     def computeMinimalDisjointDecomposition(self):
-        if self.checkCollision():
+        decomposition = self.planArray().minimalDisjointDecomposition()
+        if decomposition is None:
             return None
-        decomposition = [0]
-        T = 0  # max length of a path
-        paths=[]
-        for ag in self.agents:
-            plan=self.getPlan(ag)
-            if plan is not None:
-                paths.append(plan)
-                l = len(plan)
-                if l > T: T = l
-        i = 0
-        lasti = 0
-        while i <= T:
-            partialPaths = [set(path[lasti:i]) for path in paths]
-            if not MultiAgentGraph.isDisjointBySize(partialPaths):
-                decomposition.append(i-1)
-                lasti = i-1
-            else:
-                i += 1
-        decomposition.append(T+1)
         self.decomposition=decomposition
         return decomposition
 
     def checkCollision(self):
-        paths=[]
-        T=0
-        for ag in self.agents:
-            plan = self.getPlan(ag)
-            if plan is not None:
-                paths.append(plan)
-                l = len(plan)
-                if l > T: T = l
-        for i in range(T):
-            s=[set(path[i:i+1]) for path in paths]
-            if not MultiAgentGraph.isDisjointBySize(s):
-                return True
-        return False
+        return self.planArray().hasCollision()
 
 
     def getDecompositionNodes(self,decindex):
@@ -175,18 +287,59 @@ class MultiAgentGraph:
 
     def __str__(self):
         out="Num Agents: "+str(self.num_agents)+"\r\n"
-        out+="Graph: "+ str(len(self.graph.edges))+" Edges, and "+ str(len(self.graph.nodes))+" Nodes.\r\n"
+        out+="Graph: "+ str(self.graph.number_of_edges())+" Edges, and "+ str(self.graph.number_of_nodes())+" Nodes.\r\n"
         for ag in self.agents:
             out += str(ag)+": "+str(self.agents[ag])+"\r\n"
         return out
 
+    def resultRecord(self):
+        #the result as a dict of plain JSON types (plans are lists of [x, y] cells), see resultOutput for the text form
+        record = {"found": self.foundPlan, "status": self.planStatus, "runtime": self.planTime,
+                  "plans": None, "makespan": None, "decomposition": None, "decomp_parts": None}
+        if self.foundPlan:
+            plans = [self.getPlan(ag) for ag in self.agents]
+            record["plans"] = [[list(node) for node in plan] for plan in plans]
+            record["makespan"] = max(len(plan) for plan in plans)
+            if self.decomposition:
+                record["decomposition"] = list(self.decomposition)
+                record["decomp_parts"] = len(self.decomposition) - 1
+        stats = self.planStats
+        record["expanded"] = stats.expanded if stats is not None else None
+        record["generated"] = stats.generated if stats is not None else None
+        record["peak_open"] = stats.peakOpenSize if stats is not None else None
+        record["peak_closed"] = stats.peakClosedSize if stats is not None else None
+        record["peak_rss"] = stats.peakRss if stats is not None else None
+        if self.minParts is not None:
+            record["min_parts"] = self.minParts
+            record["min_parts_proven"] = self.minPartsProven
+        if self.groups is not None:
+            record["groups"] = [list(group) for group in self.groups]
+        if self.solutions is not None:
+            record["solutions"] = [solution.asDict() for solution in self.solutions]
+            record["bound"] = self.bound
+        return record
+
     def resultOutput(self):
         sout=""
         if not self.foundPlan:
-            return "NO PLAN\r\n TIMEOUT:\t "+str(self.planTime)
+            sout="NO PLAN\r\n TIMEOUT:\t "+str(self.planTime)
+            if self.planStatus is not None:
+                sout+="\r\nSTATUS:\t"+self.planStatus+"\r\nSTATS:\t"+str(self.planStats)
+            return sout
         for ag in self.agents:
             sout+= "AGENT "+str(ag)+ " PLAN:\t"+str(self.getPlan(ag))+"\r\n"
         sout+="DECOMPOSITION:\t"+str(self.decomposition)+"\r\n"
         sout+="DECOMP PARTS:\t" + str(len(self.decomposition)-1) + "\r\n"
         sout+="RUNTIME:\t"+str(self.planTime)+"\r\n"
+        if self.minParts is not None:
+            sout+="MIN DECOMP PARTS:\t"+str(self.minParts)+(" (proven)" if self.minPartsProven else "")+"\r\n"
+        if self.groups is not None:
+            sout+="GROUPS:\t"+str(self.groups)+"\r\n"
+        if self.solutions is not None:
+            for solution in self.solutions:
+                sout+="SOLUTION:\t"+str(solution)+"\r\n"
+            sout+="BOUND:\t"+str(self.bound)+"\r\n"
+        if self.planStatus is not None:
+            sout+="STATUS:\t"+self.planStatus+"\r\n"
+            sout+="STATS:\t"+str(self.planStats)+"\r\n"
         return sout
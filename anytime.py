@@ -0,0 +1,222 @@
+import functools
+
+from astar import AstarNode, DominanceTable
+from distanceTables import DistanceTables
+from heuristics import SumOfDistances
+from openList import OpenList
+from planArray import PlanArray
+from searchLimits import INTERRUPT_EVERY, SearchInterrupted, SearchLimits, SearchStats, SearchStatus
+from segmentHistory import HistorySpace
+
+
+class Solution:
+    #a plan found by the anytime search: its timesteps (cost), its proven suboptimality bound (the cost is at most
+    #bound times the cost of the cheapest plan), its decomposition parts, and when it was found
+
+    def __init__(self, cost, bound, parts, elapsed, expanded):
+        self.cost = cost
+        self.bound = bound
+        self.parts = parts
+        self.elapsed = elapsed
+        self.expanded = expanded
+
+    def __str__(self):
+        return ("cost: " + str(self.cost) + ", bound: " + str(round(self.bound, 3)) + ", parts: " + str(self.parts)
+                + ", expanded: " + str(self.expanded) + ", elapsed: " + str(round(self.elapsed, 3)))
+
+    def asDict(self):
+        return {"cost": self.cost, "bound": self.bound, "parts": self.parts, "elapsed": self.elapsed,
+                "expanded": self.expanded}
+
+
+class AnytimeOpenList(OpenList):
+    #OpenList of AnytimeSearch, ordered on (g + weight * h, h, segments), and kept from one search to the next as in
+    #ARA*: a state closed in the current search and reached again with a lower g waits in inconsistent until the next
+    #search, a state closed in an earlier search is opened again at once. Dead ends stay closed.
+
+    def __init__(self, weight):
+        super().__init__()
+        self.weight = weight
+        self.closedNow = set() #records closed in the current search
+        self.inconsistent = set()
+
+    def key(self, node, g, h):
+        return (g + self.weight * h, h, node.segments)
+
+    def close(self, record):
+        super().close(record)
+        self.closedNow.add(record)
+
+    def improveClosed(self, record, parent, g):
+        if record.h is None: #dead end
+            return
+        if record in self.closedNow:
+            record.node.parent = parent
+            record.g = g
+            self.inconsistent.add(record)
+        else:
+            self.reopen(record, parent, g)
+
+    def restart(self, weight):
+        #the next search: the inconsistent states are opened again and every open state gets the key of weight
+        self.weight = weight
+        for record in self.inconsistent:
+            record.closed = False
+            self.closedCount -= 1
+            self.openCount += 1
+        self.inconsistent = set()
+        self.closedNow = set()
+        self.buckets = {}
+        self.keys = []
+        for record in self.states.values():
+            if not record.closed:
+                record.key = self.key(record.node, record.g, record.h)
+                self.insert(record.key, record.node)
+
+    def lowest(self, function):
+        #lowest function(record) of the open and inconsistent states, None if there is none
+        values = [function(record) for record in self.states.values() if not record.closed]
+        values.extend(map(function, self.inconsistent))
+        return min(values, default=None)
+
+
+class AnytimeSearch:
+    #anytime planning over the states of an AstarSolver with a weighted A* that tightens its bound, as ARA*.
+    #the cost of a plan is its number of timesteps. The heuristics count the moves left to all the agents, so divided
+    #by the number of agents they bound the timesteps left, and f = g + bound * h / numAgents. For the sum heuristic
+    #that bound is consistent (it drops by at most one per timestep), so each search finds a plan of at most bound
+    #times the cost of the cheapest plan within the segment budget without reopening closed states, and the cheapest
+    #plan costs at least the lowest g + timestepsLeft of the open and inconsistent states (see AnytimeOpenList). The
+    #other heuristics are not consistent, for them only the longest distance of an agent to its target is a lower
+    #bound. The bound of a plan is the lower of its proven bounds. The plain search is the one with bound = numAgents.
+    #the first search runs at the initial bound and each next one at half the bound (and at most the bound of the best
+    #plan, down to 1: the cheapest plan). The open list is kept from one search to the next with its keys updated, and
+    #the states that cannot lead to a plan cheaper than the best one so far are pruned. The limits apply to all the
+    #searches together, and are checked inside the expansions as in AstarSolver.astar. Searches run without operator
+    #decomposition.
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.solutions = [] #the Solution of every improved plan, in order
+        self.plan = None #best plan so far, as AstarSolver.plan
+        self.cost = None
+        self.bound = None #proven suboptimality bound of the best plan
+        self.lowerBound = None #proven lower bound of the cost of a plan
+        self.consistent = False #the heuristic is consistent, see the class comment
+        self.openList = None
+        self.status = None
+        self.stats = None
+        self.runtime = 0
+
+    def solve(self, numSegments, bound=None, timeout=300, limits=None, onSolution=None):
+        #bound: initial suboptimality bound, by default the number of agents, onSolution: function called with
+        #the Solution of every improved plan. Outcome in self.status (solved once a plan was found) and self.stats
+        if limits is None:
+            limits = SearchLimits(timeout=timeout)
+        solver = self.solver
+        if bound is None:
+            bound = solver.numAgents
+        self.consistent = solver.heuristic.name == SumOfDistances.name
+        stats = self.stats = solver.stats = SearchStats()
+        self.openList = AnytimeOpenList(max(bound, 1) / solver.numAgents)
+        try:
+            status = self.search(numSegments, max(bound, 1), limits, onSolution)
+        except SearchInterrupted as interruption: #a limit reached inside an expansion
+            status = interruption.status
+        except MemoryError:
+            status = SearchStatus.MEMORY_LIMIT
+        finally:
+            solver.costBound = None
+            solver.dominance = None
+        if self.plan is not None:
+            solver.plan = self.plan
+            status = SearchStatus.SOLVED
+        limits.finish(stats, status, len(self.openList), self.openList.closedCount)
+        self.status = status
+        self.runtime = stats.elapsed
+        return self.plan is not None
+
+    def search(self, numSegments, bound, limits, onSolution):
+        #the searches until the cheapest plan or a limit, returns their status
+        solver = self.solver
+        stats = self.stats
+        openList = self.openList
+        for ag in range(solver.numAgents):
+            if solver.targetDistances[ag][solver.initIds[ag]] == DistanceTables.UNREACHABLE:
+                return SearchStatus.NO_PLAN
+        self.lowerBound = max(solver.timestepsLeft(solver.initIds), 1)
+        space = HistorySpace(solver.index.numCells(), solver.numAgents)
+        history = space.singles(solver.initIds)
+        startNode = AstarNode(None, solver.initIds, history, space.hashOf(history), 0)
+        solver.heuristic.prepare(space, numSegments)
+        solver.dominance = DominanceTable(space) if solver.actions != "move" else None
+        startH = solver.heuristicVal(startNode)
+        if startH is None:
+            return SearchStatus.NO_PLAN
+        openList.push(startNode, 0, startH)
+
+        stay = solver.actions == "stay"
+        interrupt = functools.partial(limits.interrupt, stats)
+        nextCheck = limits.nextCheck(stats)
+        work = 0 #children since the last interrupt call
+        while True:
+            entry = openList.pop()
+            if entry is None:
+                if openList.inconsistent:
+                    openList.restart(openList.weight)
+                    continue
+                if self.plan is not None and self.consistent: #no cheaper plan
+                    self.lowerBound = self.cost
+                    self.bound = 1
+                return SearchStatus.NO_PLAN
+            f, node, record = entry
+            openList.close(record)
+            if solver.costBound is not None and record.g + solver.timestepsLeft(node.current) >= solver.costBound:
+                continue #opened before the last plan was found, cannot lead to a cheaper one
+
+            if stats.expanded >= nextCheck:
+                status = limits.check(stats, len(openList), openList.closedCount)
+                if status is not None:
+                    return status
+                nextCheck = limits.nextCheck(stats)
+            stats.expanded += 1
+
+            if solver.isGoal(node):
+                solver.computePlan(node)
+                self.improve(bound, onSolution)
+                if self.bound <= 1:
+                    return SearchStatus.SOLVED
+                bound = max(min(bound / 2, self.bound), 1)
+                solver.costBound = self.cost
+                openList.restart(bound / solver.numAgents)
+                continue
+
+            children = node.getChildren(solver.successors, solver.targetIds, space, stay, numSegments=numSegments,
+                                        interrupt=interrupt)
+            solver.pushChildren(children, record.g + 1, numSegments, openList, interrupt)
+            work += len(children)
+            if work >= INTERRUPT_EVERY: #expansions of a few thousand children each, see SearchLimits.interrupt
+                work = 0
+                interrupt()
+
+    def improve(self, bound, onSolution):
+        #the plan of the solver, found by the search at bound, is the best one so far
+        solver = self.solver
+        self.plan = solver.plan
+        self.cost = len(solver.plan) - 1
+        if self.consistent:
+            lowest = self.openList.lowest(lambda record: record.g + solver.timestepsLeft(record.node.current))
+            self.lowerBound = max(self.lowerBound, self.cost if lowest is None else min(lowest, self.cost))
+            self.bound = min(bound, self.cost / self.lowerBound)
+        else:
+            self.bound = self.cost / self.lowerBound
+        paths = [solver.getPlan(ag) for ag in range(solver.numAgents)]
+        decomposition = PlanArray.fromPaths(paths, solver.index.ids).minimalDisjointDecomposition()
+        parts = len(decomposition) - 1 if decomposition is not None else None
+        solution = Solution(self.cost, self.bound, parts, self.stats.elapsed, self.stats.expanded)
+        self.solutions.append(solution)
+        if onSolution is not None:
+            onSolution(solution)
+
+    def getPlan(self, ag):
+        return self.solver.getPlan(ag)
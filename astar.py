@@ -1,219 +1,575 @@
-import networkx as nx
+import functools
 import itertools
-import heapq
+import math
+import operator
 from timeit import default_timer as timer
 
-class AstarNode:
-    #type of data:
-    #data: dictionary with three elements: 'current', 'history', and 'segments'
-    #data['current']: array of current nodes, indexed on agent.
-    #data['history']: array of history nodes, indexed on agent, each history is a set.
-    #data['segments']: number of segments so far
-
-    GOAL_STR="G"
-    hashCount=0
-    hashTime=0
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from heuristics import createHeuristic
+from instrumentation import TimedHeuristic
+import jointMoves
+from openList import OpenList
+from segmentHistory import HistorySpace
+from searchLimits import INTERRUPT_EVERY, SearchInterrupted, SearchLimits, SearchStats, SearchStatus
 
-    def __init__(self, parent, data, graph, target):
-        self.parent = parent
-        self.graph=graph
-        self.data=data
-        self.target= target
-        self.hashVal=0
-        self.runtime=0
-        self.computeHash()
-
-    def getNeighborsNonGoal(self, ag):
-        if self.data['current'][ag]== self.target[ag] or self.data['current'][ag]== AstarNode.GOAL_STR:
-            return [AstarNode.GOAL_STR] #reached goal
-        return self.graph.neighbors(self.data['current'][ag])
+class AstarNode:
+    #compact search state, all cells are dense ids from a CellIndex:
+    #current: tuple of current cell ids, indexed on agent (GOAL once the agent left through its target).
+    #history: tuple of persistent cell sets (see HistorySpace), indexed on agent, the cells each agent visited in this segment.
+    #historyHash: tuple of Zobrist hashes of the history sets, indexed on agent, maintained incrementally from the parent.
+    #segments: number of segments so far
 
-    def getChildren(self):
-        num_agents = len(self.data['current'])
-        ags = list(range(num_agents))
-        children=[]
-        neighbors=[self.getNeighborsNonGoal(ag) for ag in ags]
+    __slots__ = ('parent', 'current', 'history', 'historyHash', 'segments', 'hashVal')
 
-        for tup in list(itertools.product(*neighbors)):
-            newchild_current = list(tup)
+    GOAL = -1
+    partial = False
 
-            if not self.isLegalChild(newchild_current):
+    def __init__(self, parent, current, history, historyHash, segments):
+        self.parent = parent
+        self.current = current
+        self.history = history
+        self.historyHash = historyHash
+        self.segments = segments
+        self.hashVal = hash((current, segments, historyHash))
+
+    def getNeighborsNonGoal(self, ag, neighbors, target, stay=False):
+        #neighbors[cell]: the cells reachable in one action (see AstarSolver.successors),
+        #stay: agents stay at their target forever instead of leaving the graph
+        cell = self.current[ag]
+        if cell == target[ag]:
+            return (cell,) if stay else (AstarNode.GOAL,) #reached goal
+        if cell == AstarNode.GOAL:
+            return (AstarNode.GOAL,)
+        return neighbors[cell]
+
+    def getMoves(self, ag, neighbors, target, space, positions, owners, stay=False):
+        #all moves of a single agent, as (cell, agent currently at that cell or -1, enters another agent's history,
+        #extended history, hash of the extended history, hash of a fresh history holding only the cell)
+        visited = self.history[ag]
+        visitedHash = self.historyHash[ag]
+        moves = []
+        for cell in self.getNeighborsNonGoal(ag, neighbors, target, stay):
+            if cell == AstarNode.GOAL:
+                moves.append((cell, -1, False, visited, visitedHash, 0))
                 continue
-
-            newchild_segments=self.data['segments']
-            newchild_history={}
-            for ag in ags:
-                if tup[ag]!=AstarNode.GOAL_STR:
-                    newchild_history[tup[ag]] = ag
-
-            if self.isNewSegmentChild(newchild_current):
-                newchild_segments += 1
+            owner = owners.get(cell, -1)
+            key = space.key(cell, ag)
+            if owner == ag:
+                moves.append((cell, positions.get(cell, -1), False, visited, visitedHash, key))
             else:
-                newchild_history = self.data['history'].copy()
-                for ag in ags:
-                    if tup[ag] != AstarNode.GOAL_STR:
-                        newchild_history[tup[ag]] = ag
+                moves.append((cell, positions.get(cell, -1), owner >= 0, space.add(visited, cell), visitedHash ^ key, key))
+        return moves
+
+    def getAllMoves(self, neighbors, target, space, stay=False):
+        #the moves of every agent, see getMoves
+        positions = {cell: ag for ag, cell in enumerate(self.current)}
+        candidates = set()
+        for cell in self.current:
+            if cell != AstarNode.GOAL:
+                candidates.update(neighbors[cell])
+        owners = space.owners(self.history, candidates)
+        return [self.getMoves(ag, neighbors, target, space, positions, owners, stay) for ag in range(len(self.current))]
+
+    def getChildren(self, neighbors, target, space, stay=False, moves=None, numSegments=None, interrupt=None,
+                    counters=None):
+        #moves: the result of getAllMoves, if already computed. numSegments: if given, the children over this many
+        #segments are not generated. interrupt: see jointMoves.
+        #counters: optional Instrumentation counters, the legal children over the segment budget are counted in it
+        if moves is None:
+            moves = self.getAllMoves(neighbors, target, space, stay)
+        if math.prod(map(len, moves)) >= jointMoves.MIN_BATCH:
+            return self.getBatchChildren(moves, space, numSegments, interrupt, counters)
+        full = numSegments is not None and self.segments >= numSegments
+        children = []
+        for combination in itertools.product(*moves):
+            newCurrent, entered, foreign, extended, extendedHash, freshHash = zip(*combination)
+            if newCurrent == self.current: #every agent waited
+                continue
+            if not self.isLegalChild(newCurrent, entered):
+                continue
 
-            children.append(AstarNode(self,{'current':newchild_current, 'history':newchild_history, 'segments':newchild_segments},self.graph,self.target))
+            if True in foreign: #new segment child
+                if full:
+                    if counters is not None:
+                        counters["pruned by segment bound"] += 1
+                    continue
+                children.append(AstarNode(self, newCurrent, space.singles(newCurrent), freshHash, self.segments + 1))
+            else:
+                children.append(AstarNode(self, newCurrent, extended, extendedHash, self.segments))
         return children
 
-    def isLegalChild(self, newCurrent):
-        num_agents = len(self.data['current'])
-        for ag1 in range(num_agents):
-            if newCurrent[ag1] != AstarNode.GOAL_STR:
-                for ag2 in range(ag1+1,num_agents):
-                    if newCurrent[ag2] != AstarNode.GOAL_STR:
-                        if newCurrent[ag1] == newCurrent[ag2]: # Collision occurred
-                            return False
-                        if newCurrent[ag1] == self.data['current'][ag2] and newCurrent[ag2] == self.data['current'][ag1]: # Swap occurred
-                            return False
-        return True
-
-    def isNewSegmentChild(self, newCurrent):
-        num_agents = len(self.data['current'])
-        for ag1 in range(num_agents):
-            if newCurrent[ag1] != AstarNode.GOAL_STR:
-                if self.data['history'].get(newCurrent[ag1], ag1) != ag1:
-                    return True
-
-        return False
+    def getBatchChildren(self, moves, space, numSegments=None, interrupt=None, counters=None):
+        #getChildren of many joint moves: collisions, swaps and segment starts are found on the whole batch at once
+        #(see jointMoves), and only the legal joint moves become nodes. When counted, the segment starts over the
+        #budget are built and then dropped, so that they are counted as in getChildren
+        cells, entered, foreign, extended, extendedHash, freshHash = zip(*[tuple(zip(*agMoves)) for agMoves in moves])
+        full = numSegments is not None and self.segments >= numSegments
+        combinations, flags = jointMoves.legalCombinations(self.current, cells, foreign,
+                                                          not full or counters is not None, interrupt)
+        if full and counters is not None:
+            kept = [i for i, isForeign in enumerate(flags) if not isForeign]
+            counters["pruned by segment bound"] += len(flags) - len(kept)
+            combinations = [combinations[i] for i in kept]
+            flags = [False] * len(kept)
+        getitem = operator.getitem
+        children = []
+        for start in range(0, len(combinations), INTERRUPT_EVERY):
+            if start and interrupt is not None:
+                interrupt()
+            end = start + INTERRUPT_EVERY
+            for combination, isForeign in zip(combinations[start:end], flags[start:end]):
+                newCurrent = tuple(map(getitem, cells, combination))
+                if isForeign: #new segment child
+                    children.append(AstarNode(self, newCurrent, space.singles(newCurrent),
+                                              tuple(map(getitem, freshHash, combination)), self.segments + 1))
+                else:
+                    children.append(AstarNode(self, newCurrent, tuple(map(getitem, extended, combination)),
+                                              tuple(map(getitem, extendedHash, combination)), self.segments))
+        return children
 
-    def __eq__(self, other):
-        if self.data['segments'] != other.data['segments']:
-            return False
-        for i in range(len(self.data['current'])):
-            if self.data['current'][i]!=other.data['current'][i]:
-                return False
-        if self.data['history']!=other.data['history']:
+    def isLegalChild(self, newCurrent, entered):
+        #entered[ag]: the agent whose current cell ag moves into, or -1
+        cells = set(newCurrent)
+        cells.discard(AstarNode.GOAL)
+        if len(cells) + newCurrent.count(AstarNode.GOAL) != len(newCurrent): # Collision occurred
             return False
+        if max(entered) >= 0:
+            current = self.current
+            for ag, other in enumerate(entered):
+                if other >= 0 and other != ag and newCurrent[other] == current[ag]: # Swap occurred
+                    return False
         return True
 
-    def computeHash(self):
-        self.hashVal=hash(str(self.data['current'])+str(self.data['segments'])+str(frozenset(self.data['history'].items())))
+    def __eq__(self, other):
+        #the full history comparison only runs when the hashes collide
+        return (self.hashVal == other.hashVal and self.segments == other.segments
+                and self.current == other.current and self.history == other.history)
 
     def __hash__(self):
         return self.hashVal
 
-    def __lt__(self, other):
-        return self.data['segments'] <= other.data['segments']
+    def __str__(self):
+        return str({'current': self.current, 'historyHash': self.historyHash, 'segments': self.segments})
+
+
+class AstarPartialNode:
+    #intermediate state of operator decomposition: the agents before nextAgent already moved from base.
+    #expansion: (moves, heuristic of each move, minimal heuristic of each agent), shared by all the partial nodes of base.
+    #moved: tuple of the moves chosen so far, indexed on agent (see AstarNode.getMoves).
+    #foreign: True if one of the chosen moves enters another agent's history, i.e. the child starts a new segment.
+    #g: cost of the full child, h: heuristic of the moved agents plus the best case of the others.
+
+    __slots__ = ('base', 'expansion', 'moved', 'foreign', 'segments', 'g', 'h')
+
+    partial = True
+    hashVal = None #never equal to a full node
+
+    def __init__(self, base, expansion, moved, foreign, g, h):
+        self.base = base
+        self.expansion = expansion
+        self.moved = moved
+        self.foreign = foreign
+        self.segments = base.segments + 1 if foreign else base.segments
+        self.g = g
+        self.h = h
+
+    def getChildren(self, space, numSegments, counters=None):
+        #moves the next agent, collisions and segment overflows are pruned before the other agents move.
+        #counters: optional Instrumentation counters, the moves over the segment budget are counted in it
+        base = self.base
+        moves, heuristics, minHeuristics = self.expansion
+        ag = len(self.moved)
+        taken = {move[0] for move in self.moved}
+        children = []
+        for move, h in zip(moves[ag], heuristics[ag]):
+            cell, entered = move[0], move[1]
+            if cell != AstarNode.GOAL:
+                if cell in taken: # Collision occurred
+                    continue
+                if 0 <= entered < ag and self.moved[entered][0] == base.current[ag]: # Swap occurred
+                    continue
+            foreign = self.foreign or move[2]
+            if foreign and base.segments >= numSegments:
+                if counters is not None:
+                    counters["pruned by segment bound"] += 1
+                continue
+            moved = self.moved + (move,)
+            if len(moved) < len(moves):
+                children.append(AstarPartialNode(base, self.expansion, moved, foreign, self.g,
+                                                 self.h - minHeuristics[ag] + h))
+                continue
+
+            newCurrent, entered, foreignMoves, extended, extendedHash, freshHash = zip(*moved)
+            if newCurrent == base.current: #every agent waited
+                continue
+            if foreign:
+                children.append(AstarNode(base, newCurrent, space.singles(newCurrent), freshHash, base.segments + 1))
+            else:
+                children.append(AstarNode(base, newCurrent, extended, extendedHash, base.segments))
+        return children
 
     def __str__(self):
-        return str(self.data)
+        return str({'base': str(self.base), 'moved': [move[0] for move in self.moved]})
+
+
+class DominanceTable:
+    #the states reached so far, grouped on the cells of the agents. A state is dominated by another one at the same
+    #cells with no more segments, no higher g, and each agent's history a subset of its own: every plan from the state
+    #is also a plan from the other one. Waits make such states common (waiting keeps the history as is, moving back
+    #and forth grows it). Only the last ENTRIES states of each cells tuple are kept.
+
+    ENTRIES = 8
+
+    def __init__(self, space):
+        self.space = space
+        self.states = {}
+
+    def dominated(self, node, g):
+        #True if node is dominated, otherwise node is recorded
+        entries = self.states.get(node.current)
+        if entries is None:
+            self.states[node.current] = [(node.segments, g, node.history)]
+            return False
+        isSubset = self.space.isSubset
+        for segments, entryG, history in entries:
+            if segments <= node.segments and entryG <= g and all(map(isSubset, history, node.history)):
+                return True
+        if len(entries) >= DominanceTable.ENTRIES:
+            entries.pop(0)
+        entries.append((node.segments, g, node.history))
+        return False
 
 
 class AstarSolver:
-    def __init__(self,graph,initNodes,targetNodes):
+    #action models of the agents:
+    #move: every agent moves at each timestep, and leaves the graph once at its target
+    #wait: agents may also wait in their cell, and leave the graph once at their target
+    #stay: agents may also wait, and stay at their target forever once there instead of leaving the graph
+    ACTIONS = ("move", "wait", "stay")
+
+    def __init__(self,graph,initNodes,targetNodes,index=None,actions="move"):
+        #index: CellIndex of graph to reuse, e.g. loaded from a MapCache
+        if actions not in AstarSolver.ACTIONS:
+            raise ValueError("unknown action model: "+str(actions)+", use one of "+", ".join(AstarSolver.ACTIONS))
         self.graph=graph
         self.initNodes=initNodes
         self.targetNodes=targetNodes
         self.numAgents=len(initNodes)
         self.plan=None
-        self.allShortestPaths = None
-
-    def computeHeuristic(self):
-        self.allShortestPaths=dict(nx.all_pairs_shortest_path_length(self.graph))
+        self.status=None
+        self.stats=None
+        self.runtime=0
+        self.index=index if index is not None else CellIndex.fromGraph(graph)
+        self.initIds=self.index.toIds(initNodes)
+        self.targetIds=self.index.toIds(targetNodes)
+        self.actions=actions
+        #a wait is a move to the agent's own cell, which keeps its history as is.
+        #waiting at the target is never needed when agents leave the graph, leaving frees the cell
+        if actions=="move":
+            self.successors=self.index.neighbors
+        else:
+            self.successors=[cellNeighbors+(cell,) for cell, cellNeighbors in enumerate(self.index.neighbors)]
+        self.targetDistances=None #targetDistances[ag][cell]: distance from cell to the target of ag
+        self.heuristic=None
+        self.instrumentation=None #optional Instrumentation of astar
+        self.costBound=None #children that cannot reach a plan of fewer timesteps are pruned, see anytime.AnytimeSearch
+
+    def setEndpoints(self,initNodes,targetNodes):
+        #new sources and targets for the next search, computeHeuristic must be called again if a target changed
+        self.initNodes=initNodes
+        self.targetNodes=targetNodes
+        self.initIds=self.index.toIds(initNodes)
+        self.targetIds=self.index.toIds(targetNodes)
+
+    def computeHeuristic(self,distanceTables=None,heuristic="sum"):
+        #distanceTables: DistanceTables of self.index to reuse, e.g. across solvers on the same map
+        #heuristic: name of the node heuristic, see heuristics.HEURISTICS
+        if distanceTables is None:
+            distanceTables=DistanceTables(self.index)
+        self.targetDistances=[distanceTables.get(target) for target in self.targetIds]
+        self.heuristic=createHeuristic(heuristic,self)
+
+    def cellHeuristic(self,ag,cell):
+        if cell == AstarNode.GOAL:
+            return 0
+        return self.targetDistances[ag][cell]
+
+    def timestepsLeft(self,current):
+        #lower bound of the timesteps of a plan from the cells current: the longest distance of an agent to its target
+        return max(map(self.cellHeuristic,range(self.numAgents),current))
 
     def heuristicVal(self,node):
-        val = 0
-        for ag in range(self.numAgents):
-            if node.data['current'][ag]!= AstarNode.GOAL_STR:
-                val += self.allShortestPaths[node.data['current'][ag]][self.targetNodes[ag]]
-        return val
+        #None for a dead end
+        return self.heuristic.value(node)
+
+    def decompose(self,node,g,space):
+        #operator decomposition: the intermediate node of node before any agent moved
+        moves=node.getAllMoves(self.successors,self.targetIds,space,self.actions=="stay")
+        heuristics=[[self.cellHeuristic(ag,move[0]) for move in agMoves] for ag, agMoves in enumerate(moves)]
+        minHeuristics=[min(agHeuristics) for agHeuristics in heuristics]
+        return AstarPartialNode(node,(moves,heuristics,minHeuristics),(),False,g,sum(minHeuristics))
 
     def isGoal(self,node):
-        for ag in range(self.numAgents):
-            if node.data['current'][ag] != AstarNode.GOAL_STR and node.data['current'][ag] != self.targetNodes[ag]:
+        for ag, cell in enumerate(node.current):
+            if cell != AstarNode.GOAL and cell != self.targetIds[ag]:
                 return False
         return True
 
-    def astar(self, numSegments,timeout=300):
-        stdata={}
-        stdata['current'] = self.initNodes
-        stdata['history'] = {} #[set() for ag in range(self.numAgents)]
-        for ag in range(self.numAgents):
-            stdata['history'][self.initNodes[ag]]=ag
-        stdata['segments'] = 0
-        startNode=AstarNode(None,stdata,self.graph,self.targetNodes)
+    def astar(self, numSegments,timeout=300,operatorDecomposition=False,limits=None):
+        #operatorDecomposition: move one agent at a time through intermediate nodes instead of
+        #generating the full product of the agents' moves at every expansion
+        #limits: a SearchLimits, by default only the timeout is enforced.
+        #the outcome is left in self.status and the counters in self.stats
+        if limits is None:
+            limits=SearchLimits(timeout=timeout)
+        space=HistorySpace(self.index.numCells(),self.numAgents)
+        history=space.singles(self.initIds)
+        startNode=AstarNode(None,self.initIds,history,space.hashOf(history),0)
+        self.heuristic.prepare(space,numSegments)
         #print(startNode)
 
-        gscore={startNode:0}
-        fscore={startNode:self.heuristicVal(startNode)}
-        openSet=[]
-        closedSet=set()
-        openSetHash=set()
-        heapq.heappush(openSet,(fscore[startNode],startNode))
-        openSetHash.add(startNode)
-
-        diagCounter=0
-        start = timer()
-
-        while openSet:
-            #diagCounter+=1
-            curNode = heapq.heappop(openSet)[1]
-            openSetHash.remove(curNode)
-
-            # if diagCounter == 1000:
-            #     end=timer()
-            #     if int(end)-int(start)>timeout:
-            #         self.runtime=end-start
-            #         return False
-            #     diagCounter=0
-            #     print("Open Set Size: "+ str(len(openSet)))
-            #     print("Closed Set Size: " + str(len(closedSet)))
-            #     print("Current Node: "+ str(curNode))
-
-
-            if self.isGoal(curNode):
-                #print("Reached the goal!"+str(curNode))
-                self.computePlan(curNode)
-                end=timer()
-                self.runtime=end-start
-                return True
-
-            closedSet.add(curNode)
-
-            children = curNode.getChildren()
+        instrumentation=self.instrumentation
+        counters=None
+        if instrumentation is None:
+            openList=OpenList() #open nodes, and the g and parent of every state reached, see OpenList
+        else:
+            openList=instrumentation.openList()
+            counters=instrumentation.counters
+            self.heuristic=instrumentation.heuristic(self.heuristic)
+        self.dominance=DominanceTable(space) if self.actions!="move" else None
+        stats=self.stats=SearchStats()
+        nextCheck=limits.nextCheck(stats)
+        for ag in range(self.numAgents):
+            if self.targetDistances[ag][self.initIds[ag]]==DistanceTables.UNREACHABLE:
+                return self.finish(limits,SearchStatus.NO_PLAN,openList)
+        startH=self.heuristicVal(startNode)
+        if startH is None:
+            return self.finish(limits,SearchStatus.NO_PLAN,openList)
+        openList.push(startNode,0,startH)
+
+        interrupt=functools.partial(limits.interrupt,stats)
+        try:
+            while True:
+                entry=openList.pop()
+                if entry is None:
+                    break
+                f, curNode, record = entry
+                if curNode.partial:
+                    if instrumentation is not None:
+                        start=timer()
+                    children=curNode.getChildren(space,numSegments,counters)
+                    if instrumentation is not None:
+                        instrumentation.expansion(start,children)
+                    self.pushChildren(children,curNode.g,numSegments,openList)
+                    continue
 
-            for child in children:
-                if child.data['segments']>numSegments:
+                if stats.expanded>=nextCheck:
+                    status=limits.check(stats,len(openList),openList.closedCount)
+                    if status is not None:
+                        return self.finish(limits,status,openList)
+                    nextCheck=limits.nextCheck(stats)
+                stats.expanded+=1
+                if stats.bestF is None or f<stats.bestF:
+                    stats.bestF=f
+
+                if self.isGoal(curNode):
+                    #print("Reached the goal!"+str(curNode))
+                    self.computePlan(curNode)
+                    return self.finish(limits,SearchStatus.SOLVED,openList)
+
+                openList.close(record)
+
+                tentative_g=record.g+1
+                if instrumentation is not None:
+                    start=timer()
+                moves=None
+                if operatorDecomposition:
+                    #on equal f, deeper nodes come first so that a started decomposition is finished first
+                    children = self.decompose(curNode,tentative_g,space).getChildren(space,numSegments,counters)
+                elif instrumentation is not None:
+                    moves=curNode.getAllMoves(self.successors,self.targetIds,space,self.actions=="stay")
+                    children = curNode.getChildren(self.successors,self.targetIds,space,moves=moves,
+                                                   numSegments=numSegments,interrupt=interrupt,counters=counters)
+                else:
+                    children = curNode.getChildren(self.successors,self.targetIds,space,self.actions=="stay",
+                                                   numSegments=numSegments,interrupt=interrupt)
+                if instrumentation is not None:
+                    instrumentation.expansion(start,children,moves)
+                self.pushChildren(children,tentative_g,numSegments,openList,interrupt)
+        except SearchInterrupted as interruption: #a limit reached inside an expansion
+            return self.finish(limits,interruption.status,openList)
+        except MemoryError:
+            children=None #the children of the expansion are the likely culprit
+            return self.finish(limits,SearchStatus.MEMORY_LIMIT,openList)
+
+        return self.finish(limits,SearchStatus.NO_PLAN,openList)
+
+    def idaStar(self, numSegments, timeout=300, tableSize=1000000, limits=None):
+        #memory bounded alternative to astar: iterative deepening on the number of timesteps, depth first over the
+        #operator decomposition nodes (so a level holds at most one agent's moves, not their product).
+        #an iteration with threshold T only follows nodes with g + timestepsLeft <= T (an admissible bound of the
+        #timesteps, unlike the search heuristic, which counts every agent's moves), and the next threshold is the
+        #smallest bound that went over T. The first plan found therefore has the fewest timesteps possible with the
+        #segment budget, never more than the plan of astar. Within an iteration children are tried in order of the
+        #f = g + h of astar, so that the plan astar would find is usually tried first.
+        #memory is the current path plus a transposition table of at most tableSize states, keyed on the state hashes,
+        #that prunes states already reached in the current iteration with a lower or equal g (oldest entries evicted first).
+        #the limits are checked every checkEvery expansions, and the timeout and memory limits also every INTERRUPT_EVERY
+        #nodes popped (see SearchLimits.interrupt), as a full expansion can follow thousands of partial or pruned ones.
+        #outcome in self.status and self.stats, as astar
+        if limits is None:
+            limits=SearchLimits(timeout=timeout)
+        space=HistorySpace(self.index.numCells(),self.numAgents)
+        history=space.singles(self.initIds)
+        startNode=AstarNode(None,self.initIds,history,space.hashOf(history),0)
+        self.heuristic.prepare(space,numSegments)
+        stats=self.stats=SearchStats()
+        nextCheck=limits.nextCheck(stats)
+        table={} #state key -> (iteration, g)
+        frames=[] #depth first stack: [list of (bound, node) in reverse order of f, g of its full nodes]
+        for ag in range(self.numAgents):
+            if self.targetDistances[ag][self.initIds[ag]]==DistanceTables.UNREACHABLE:
+                return self.finish(limits,SearchStatus.NO_PLAN,frames,table)
+        if self.heuristicVal(startNode) is None:
+            return self.finish(limits,SearchStatus.NO_PLAN,frames,table)
+
+        threshold=self.timestepsLeft(startNode.current)
+        iteration=0
+        interrupt=functools.partial(limits.interrupt,stats)
+        work=0 #nodes popped since the last interrupt call
+        try:
+            while threshold is not None:
+                iteration+=1
+                stats.bestF=threshold
+                nextThreshold=None
+                frames=[[[(threshold,startNode)],0]]
+                while frames:
+                    frame=frames[-1]
+                    if not frame[0]:
+                        frames.pop()
+                        continue
+                    bound, node = frame[0].pop()
+                    work+=1
+                    if work>=INTERRUPT_EVERY: #most nodes are partial, pruned or seen before, not counted as expanded
+                        work=0
+                        interrupt()
+                    if bound>threshold:
+                        if nextThreshold is None or bound<nextThreshold:
+                            nextThreshold=bound
+                        continue
+                    if node.partial:
+                        frames.append([self.orderChildren(node.getChildren(space,numSegments),node.g),node.g])
+                        continue
+
+                    g=frame[1]
+                    key=(node.hashVal,node.current,node.segments,node.historyHash)
+                    seen=table.get(key)
+                    if seen is not None and seen[0]==iteration and seen[1]<=g:
+                        continue
+                    if seen is None and len(table)>=tableSize:
+                        del table[next(iter(table))]
+                    table[key]=(iteration,g)
+
+                    if stats.expanded>=nextCheck:
+                        status=limits.check(stats,len(frames),len(table))
+                        if status is not None:
+                            return self.finish(limits,status,frames,table)
+                        nextCheck=limits.nextCheck(stats)
+                    stats.expanded+=1
+
+                    if self.isGoal(node):
+                        self.computePlan(node)
+                        return self.finish(limits,SearchStatus.SOLVED,frames,table)
+
+                    root=self.decompose(node,g+1,space)
+                    frames.append([self.orderChildren(root.getChildren(space,numSegments),g+1),g+1])
+                threshold=nextThreshold
+        except SearchInterrupted as interruption: #a limit reached between two checks
+            return self.finish(limits,interruption.status,frames,table)
+        except MemoryError:
+            return self.finish(limits,SearchStatus.MEMORY_LIMIT,frames,table)
+
+        return self.finish(limits,SearchStatus.NO_PLAN,frames,table)
+
+    def partialTimestepsLeft(self,node):
+        #timestepsLeft of the children of an operator decomposition node: the agents that moved are at their chosen
+        #cell, the others at best at their closest move
+        moves, heuristics, minHeuristics = node.expansion
+        moved=len(node.moved)
+        left=max(minHeuristics[moved:],default=0)
+        for ag, move in enumerate(node.moved):
+            left=max(left,self.cellHeuristic(ag,move[0]))
+        return left
+
+    def orderChildren(self,children,g):
+        #(bound, child) of the children, where bound is the timesteps bound of idaStar, in the reverse of the open list
+        #order of astar (lowest f, then lowest h, then fewest segments, then the last child) so that popping gives the
+        #child astar would expand first
+        ordered=[]
+        for child in children:
+            if child.partial:
+                ordered.append(((child.g+child.h,child.h,child.segments,-len(ordered)),
+                                child.g+self.partialTimestepsLeft(child),child))
+            else:
+                self.stats.generated+=1
+                h=self.heuristicVal(child)
+                if h is not None:
+                    ordered.append(((g+h,h,child.segments,-len(ordered)),g+self.timestepsLeft(child.current),child))
+        ordered.sort(key=operator.itemgetter(0),reverse=True)
+        return [(bound,child) for key, bound, child in ordered]
+
+    def finish(self,limits,status,openSet,closedSet=None):
+        #closedSet defaults to the closed states of openSet, an OpenList
+        closedSize=len(closedSet) if closedSet is not None else openSet.closedCount
+        limits.finish(self.stats,status,len(openSet),closedSize)
+        if isinstance(self.heuristic,TimedHeuristic): #instrumented search
+            self.heuristic=self.heuristic.inner
+            self.instrumentation.total+=self.stats.elapsed
+        self.status=status
+        self.runtime=self.stats.elapsed
+        return status==SearchStatus.SOLVED
+
+    def pushChildren(self,children,tentative_g,numSegments,openList,interrupt=None):
+        #new states are opened, open states reached with a lower g are re-parented, closed states are left to the open
+        #list (see OpenList.improveClosed).
+        #interrupt: called every INTERRUPT_EVERY children, see SearchLimits.interrupt
+        for i, child in enumerate(children):
+            if interrupt is not None and i and not i % INTERRUPT_EVERY:
+                interrupt()
+            if child.partial:
+                openList.pushPartial(child)
+                continue
+            if child.segments>numSegments:
+                continue
+            record=openList.get(child)
+            if record is None:
+                if self.dominance is not None and self.dominance.dominated(child,tentative_g):
                     continue
-                if child in closedSet:
+                self.stats.generated += 1
+                h = self.heuristicVal(child)
+                if h is None: #dead end
+                    openList.addClosed(child,tentative_g)
                     continue
-
-                tentative_g=gscore[curNode]+1
-
-                bcheck=(child not in openSetHash)
-
-
-                if bcheck:
-                    child.parent = curNode
-                    gscore[child] = tentative_g
-                    fscore[child] = tentative_g + self.heuristicVal(child)
-                    heapq.heappush(openSet, (fscore[child], child))
-                    openSetHash.add(child)
-
-
-        end=timer()
-        self.runtime=end-start
-        return False
+                if self.costBound is not None and tentative_g+self.timestepsLeft(child.current)>=self.costBound:
+                    continue
+                openList.push(child,tentative_g,h)
+            elif tentative_g<record.g:
+                if not record.closed:
+                    openList.improve(record,child.parent,tentative_g)
+                else:
+                    openList.improveClosed(record,child.parent,tentative_g)
 
     def computePlan(self, curNode):
         plan=[]
         while curNode is not None:
-            plan.append(curNode.data['current'])
+            plan.append(curNode.current)
             curNode=curNode.parent
         self.plan=plan[::-1]
 
     def getPlan(self,ag):
         plan=[tup[ag] for tup in self.plan]
         end = len(plan)
-        if AstarNode.GOAL_STR in plan:
-            end= plan.index(AstarNode.GOAL_STR)
-        return plan[:end]
-
-
-
-
-
-
-
+        if AstarNode.GOAL in plan:
+            end= plan.index(AstarNode.GOAL)
+        return self.index.toNodes(plan[:end])
@@ -1,7 +1,12 @@
-import networkx as nx
+import functools
 import itertools
 import heapq
-from timeit import default_timer as timer
+import math
+
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+import jointMoves
+from searchLimits import INTERRUPT_EVERY, SearchInterrupted, SearchLimits, SearchStats, SearchStatus
 
 class AstarNodeNoHist:
     #type of data:
@@ -28,11 +33,14 @@ class AstarNodeNoHist:
         retVal.append(self.data[ag])
         return retVal
 
-    def getChildren(self):
+    def getChildren(self, interrupt=None):
+        #interrupt: see jointMoves
         num_agents = len(self.data)
         ags = list(range(num_agents))
         children=[]
         neighbors=[self.getNeighborsNonGoal(ag) for ag in ags]
+        if math.prod(map(len, neighbors)) >= jointMoves.MIN_BATCH:
+            return self.getBatchChildren(neighbors, interrupt)
 
         for tup in list(itertools.product(*neighbors)):
             newchild_current = list(tup)
@@ -43,6 +51,24 @@ class AstarNodeNoHist:
             children.append(AstarNodeNoHist(self,newchild_current,self.graph,self.target))
         return children
 
+    def getBatchChildren(self, neighbors, interrupt=None):
+        #getChildren of many joint moves, filtered on small integer codes of the cells (see jointMoves)
+        codes={AstarNodeNoHist.GOAL_STR: jointMoves.GOAL}
+        for cell in itertools.chain(self.data, *neighbors):
+            if cell not in codes:
+                codes[cell]=len(codes)
+        current=tuple(codes[cell] for cell in self.data)
+        cells=[tuple(codes[cell] for cell in agNeighbors) for agNeighbors in neighbors]
+        combinations, flags = jointMoves.legalCombinations(current, cells, interrupt=interrupt)
+        children=[]
+        for start in range(0, len(combinations), INTERRUPT_EVERY):
+            if start and interrupt is not None:
+                interrupt()
+            children.extend(AstarNodeNoHist(self,[agNeighbors[i] for agNeighbors, i in zip(neighbors, combination)],
+                                            self.graph,self.target)
+                            for combination in combinations[start:start + INTERRUPT_EVERY])
+        return children
+
     def isLegalChild(self, newCurrent):
         num_agents = len(self.data)
         for ag1 in range(num_agents):
@@ -77,22 +103,31 @@ class AstarNodeNoHist:
 
 
 class AstarSolverNoHist:
-    def __init__(self,graph,initNodes,targetNodes):
+    def __init__(self,graph,initNodes,targetNodes,index=None):
+        #index: CellIndex of graph to reuse, e.g. loaded from a MapCache
         self.graph=graph
         self.initNodes=initNodes
         self.targetNodes=targetNodes
         self.numAgents=len(initNodes)
         self.plan=None
-        self.allShortestPaths = None
+        self.status=None
+        self.stats=None
+        self.runtime=0
+        self.index=index if index is not None else CellIndex.fromGraph(graph)
+        self.targetDistances=None #targetDistances[ag][cell]: distance from cell id to the target of ag
 
-    def computeHeuristic(self):
-        self.allShortestPaths=dict(nx.all_pairs_shortest_path_length(self.graph))
+    def computeHeuristic(self,distanceTables=None):
+        #distanceTables: DistanceTables of self.index to reuse, e.g. across solvers on the same map
+        if distanceTables is None:
+            distanceTables=DistanceTables(self.index)
+        self.targetDistances=[distanceTables.get(self.index.ids[target]) for target in self.targetNodes]
 
     def heuristicVal(self,node):
         val = 0
+        ids = self.index.ids
         for ag in range(self.numAgents):
             if node.data[ag]!= AstarNodeNoHist.GOAL_STR:
-                val += self.allShortestPaths[node.data[ag]][self.targetNodes[ag]]
+                val += self.targetDistances[ag][ids[node.data[ag]]]
         return val
 
     def isGoal(self,node):
@@ -101,7 +136,12 @@ class AstarSolverNoHist:
                 return False
         return True
 
-    def astar(self, numSegments,timeout=300):
+    def astar(self, numSegments,timeout=300,limits=None):
+        #limits: a SearchLimits, by default only the timeout is enforced. They are checked every limits.checkEvery
+        #expansions and inside the expansions (see SearchLimits.interrupt), where waits give up to 5^agents joint moves.
+        #the outcome is left in self.status and the counters in self.stats, as AstarSolver.astar
+        if limits is None:
+            limits=SearchLimits(timeout=timeout)
         stdata={}
         stdata = self.initNodes
         startNode=AstarNodeNoHist(None,stdata,self.graph,self.targetNodes)
@@ -120,46 +160,56 @@ class AstarSolverNoHist:
         openSetHash.add(startNode)
         #print(openSet)
 
-        diagCounter=0
-        start = timer()
-
+        stats=self.stats=SearchStats()
+        nextCheck=limits.nextCheck(stats)
+        interrupt=functools.partial(limits.interrupt,stats)
+        try:
+            return self.search(openSet,openSetHash,closedSet,gscore,fscore,limits,nextCheck,interrupt)
+        except SearchInterrupted as interruption: #a limit reached inside an expansion
+            return self.finish(limits,interruption.status,openSet,closedSet)
+        except MemoryError:
+            return self.finish(limits,SearchStatus.MEMORY_LIMIT,openSet,closedSet)
+
+    def search(self,openSet,openSetHash,closedSet,gscore,fscore,limits,nextCheck,interrupt):
+        stats=self.stats
         while openSet:
-            diagCounter+=1
-            curNode = heapq.heappop(openSet)[1]
+            f, curNode = heapq.heappop(openSet)
             openSetHash.remove(curNode)
 
-            if diagCounter == 1000:
-                end=timer()
-                if int(end)-int(start)>timeout:
-                    self.runtime=end-start
-                    return False
+            if stats.expanded>=nextCheck:
+                status=limits.check(stats,len(openSet),len(closedSet))
+                if status is not None:
+                    return self.finish(limits,status,openSet,closedSet)
+                nextCheck=limits.nextCheck(stats)
                 #sOpenset=set([tup[1] for tup in openSet])
                 #diff1=sOpenset.difference(openSetHash)
                 #print("diff1 size: "+str(len(diff1)))
                 #for el in diff1:
                 #    print(el)
                 #return False
-                diagCounter=0
                 print("Open Set Size: "+ str(len(openSet)))
                 print("Closed Set Size: " + str(len(closedSet)))
                 print("Current Node: "+ str(curNode))
                 # print("ListCheck total time: "+str(t_time))
                 # print("ListCheck Total Elem: " + str(t_num_elem)+" num checks: "+str(t_num_checks))
+            stats.expanded+=1
+            if stats.bestF is None or f<stats.bestF:
+                stats.bestF=f
 
             if self.isGoal(curNode):
                 print("Reached the goal!"+str(curNode))
                 self.computePlan(curNode)
-                end=timer()
-                self.runtime=end-start
-                return True
+                return self.finish(limits,SearchStatus.SOLVED,openSet,closedSet)
 
             closedSet.add(curNode)
             #print("Open Set:"+str(openSet))
             #print("Closed Set:"+str(closedSet))
 
-            children = curNode.getChildren()
+            children = curNode.getChildren(interrupt)
 
-            for child in children:
+            for i, child in enumerate(children):
+                if i and not i % INTERRUPT_EVERY:
+                    interrupt()
                 if child in closedSet:
                     continue
 
@@ -173,6 +223,7 @@ class AstarSolverNoHist:
                 #t_time+=(end-start)
 
                 if bcheck:
+                    stats.generated+=1
                     child.parent = curNode
                     gscore[child] = tentative_g
                     fscore[child] = tentative_g + self.heuristicVal(child)
@@ -192,9 +243,13 @@ class AstarSolverNoHist:
                     #heapq.heappush(openSet,(fscore[child],child))
                     #openSetHash.add(child)
 
-        end=timer()
-        self.runtime=end-start
-        return False
+        return self.finish(limits,SearchStatus.NO_PLAN,openSet,closedSet)
+
+    def finish(self,limits,status,openSet,closedSet):
+        limits.finish(self.stats,status,len(openSet),len(closedSet))
+        self.status=status
+        self.runtime=self.stats.elapsed
+        return status==SearchStatus.SOLVED
 
     def computePlan(self, curNode):
         plan=[]
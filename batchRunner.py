@@ -0,0 +1,241 @@
+import argparse
+import collections
+import contextlib
+import glob
+import io
+import os
+import signal
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import ExplainablePlanning
+import resultWriter
+from astar import AstarSolver
+from heuristics import HEURISTICS
+from mapCache import MapCache
+from searchLimits import SearchStatus, addressSpaceCeiling
+
+try:
+    import resource
+except ImportError: #not available on Windows, the hard memory cap is then not set
+    resource = None
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+class BatchRunner:
+    #plans a list of instances (map file, scen file, number of agents, number of segments) in a process pool.
+    #each result is appended to the output file as soon as it is known, in one of the resultWriter formats.
+    #instances that already have a record there are skipped, so an interrupted sweep resumes where it stopped, except
+    #the ones that ended with an error (an exception, or a worker that died), which are planned again.
+    #a worker that dies (e.g. killed by the OOM killer) breaks the pool: the instances it was running with the other
+    #workers get an error record, and the remaining ones continue in a new pool.
+    #with maxMemory, the search of a worker stops with memory-limit once its RSS exceeds it, and the address space of
+    #the worker is capped at about the same growth (see searchLimits.addressSpaceCeiling), so that an allocation
+    #between two limit checks fails with a MemoryError instead of overshooting.
+    #settings: BenchTester attributes set for every instance, e.g. {"heuristic": "pairwise", "cbs": True}
+
+    HARD_TIMEOUT_GRACE = 10 #seconds after the timeout at which a task is interrupted if the search did not stop
+
+    def __init__(self, output, processes=None, timeout=300, maxMemory=None, cacheDir=None, operatorDecomposition=False,
+                 fmt="tsv", maxNodes=None, settings=None):
+        self.output = output
+        self.fmt = fmt
+        self.processes = processes or os.cpu_count()
+        self.timeout = timeout
+        self.maxMemory = maxMemory
+        self.cacheDir = cacheDir
+        self.settings = dict(settings or {})
+        self.settings["operatorDecomposition"] = operatorDecomposition
+        self.settings["maxNodes"] = maxNodes
+
+    @staticmethod
+    def readTestsFile(filename, baseDir=None):
+        #instances of a tests.txt file: rows of "<.map> <.scen> <agents> <segments>", paths relative to baseDir
+        if baseDir is None:
+            baseDir = os.path.dirname(filename)
+        instances = []
+        with open(filename) as f:
+            for line in f:
+                dat = line.split()
+                if len(dat) < 4:
+                    continue
+                instances.append((os.path.join(baseDir, dat[0]), os.path.join(baseDir, dat[1]), int(dat[2]), int(dat[3])))
+        return instances
+
+    @staticmethod
+    def globInstances(scenPattern, agents, segments, mapDir=None):
+        #instances of every .scen file matching the pattern, for all agent and segment numbers.
+        #the map of a scenario is the one named in its rows, looked up in mapDir (default: the directory of the .scen file)
+        instances = []
+        for scen in sorted(glob.glob(scenPattern)):
+            with open(scen) as f:
+                f.readline() #version line
+                mapName = f.readline().split()[1]
+            mapFile = os.path.join(mapDir if mapDir is not None else os.path.dirname(scen), mapName)
+            for numAgents in agents:
+                for numSegments in segments:
+                    instances.append((mapFile, scen, numAgents, numSegments))
+        return instances
+
+    @staticmethod
+    def parseRange(text):
+        #"3" -> [3], "2-5" -> [2, 3, 4, 5], "2,4,8" -> [2, 4, 8]
+        values = []
+        for part in text.split(","):
+            if "-" in part:
+                low, high = part.split("-")
+                values.extend(range(int(low), int(high) + 1))
+            else:
+                values.append(int(part))
+        return values
+
+    @staticmethod
+    def instanceKey(mapFile, scen, numAgents, numSegments):
+        return (mapFile, scen, str(numAgents), str(numSegments))
+
+    def run(self, instances, log=None):
+        #plans the instances that have no record yet (or an error record), returns the number of instances planned.
+        #log: optional function called with each record
+        finished = resultWriter.readKeys(self.output, self.fmt, retry=(SearchStatus.ERROR,))
+        todo = [inst for inst in instances if BatchRunner.instanceKey(*inst) not in finished]
+        if not todo:
+            return 0
+        tasks = collections.deque((inst, self.timeout, self.maxMemory, self.settings) for inst in todo)
+        processes = min(self.processes, len(todo))
+        running = {} #future -> task, at most one per worker, so a broken pool only loses the running instances
+        pool = None
+        out, isNew = resultWriter.openAppend(self.output)
+        with out:
+            writer = resultWriter.createWriter(out, self.fmt, isNew)
+            try:
+                while tasks or running:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(processes, initializer=initWorker,
+                                                   initargs=(self.cacheDir, self.maxMemory))
+                    while tasks and len(running) < processes:
+                        task = tasks.popleft()
+                        running[pool.submit(runTask, task)] = task
+                    done = wait(running, return_when=FIRST_COMPLETED)[0]
+                    if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                        #a worker died: every instance running in the pool fails with it, the next ones get a new pool
+                        done = wait(running)[0]
+                        pool.shutdown(wait=False)
+                        pool = None
+                    for future in done:
+                        task = running.pop(future)
+                        try:
+                            record = future.result()
+                        except BrokenProcessPool:
+                            print("A worker died, the instance " + str(task[0]) + " was lost with it.", file=sys.stderr)
+                            record = resultWriter.emptyRecord(*task[0], SearchStatus.ERROR, None)
+                        writer.write(record)
+                        if log is not None:
+                            log(record)
+            finally:
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+        return len(todo)
+
+
+workerCache = None
+
+
+def initWorker(cacheDir, maxMemory):
+    #each worker keeps its own MapCache, so maps and distance tables are built once per worker (or read from cacheDir).
+    #an interrupt (Ctrl-C reaches the whole process group) stops the running instances as well as the parent
+    global workerCache
+    workerCache = MapCache(cacheDir)
+    if maxMemory is not None and resource is not None:
+        ceiling = addressSpaceCeiling(maxMemory)
+        if ceiling is not None:
+            limit = int(ceiling * 1024 * 1024)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def onAlarm(signum, frame):
+    raise TaskTimeout()
+
+
+def runTask(task):
+    (mapFile, scen, numAgents, numSegments), timeout, maxMemory, settings = task
+    gv = ExplainablePlanning.BenchTester()
+    gv.resetParams(numSegments, numAgents)
+    for name, value in settings.items():
+        setattr(gv, name, value)
+    gv.maxMemory = maxMemory
+    gv.cache = workerCache
+    useAlarm = hasattr(signal, "SIGALRM")
+    if useAlarm: #hard limit, in case the search does not reach a limit check in time
+        signal.signal(signal.SIGALRM, onAlarm)
+        signal.alarm(int(timeout) + BatchRunner.HARD_TIMEOUT_GRACE)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            gv.readGraph(mapFile, scen)
+            gv.planAll(timeout)
+            gv.minimalDecomposition()
+        return gv.resultRecord()
+    except TaskTimeout:
+        return resultWriter.emptyRecord(mapFile, scen, numAgents, numSegments, SearchStatus.TIMEOUT, timeout)
+    except MemoryError:
+        return resultWriter.emptyRecord(mapFile, scen, numAgents, numSegments, SearchStatus.MEMORY_LIMIT, None)
+    except Exception:
+        traceback.print_exc()
+        return resultWriter.emptyRecord(mapFile, scen, numAgents, numSegments, SearchStatus.ERROR, None)
+    finally:
+        if useAlarm:
+            signal.alarm(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="plan many instances in parallel, one result row per instance")
+    parser.add_argument("output", help="result file, records are appended and finished instances are skipped")
+    parser.add_argument("--format", help="format of the result file (default: tsv)", choices=resultWriter.FORMATS,
+                        default="tsv")
+    parser.add_argument("--tests", help="tests file with rows of: <.map> <.scen> <agents> <segments>")
+    parser.add_argument("--base-dir", help="directory of the files named in the tests file (default: its directory)")
+    parser.add_argument("--scen", help="glob of .scen files, planned for every --agents and --segments value")
+    parser.add_argument("--map-dir", help="directory of the maps named in the .scen files (default: their directory)")
+    parser.add_argument("--agents", help="numbers of agents, e.g. 2-10 or 2,4,8", default="2")
+    parser.add_argument("--segments", help="numbers of segments, e.g. 1-3", default="1")
+    parser.add_argument("--timeout", help="time limit per instance (in seconds)", type=int, default=300)
+    parser.add_argument("--max-memory", help="memory limit per worker (in MB)", type=float)
+    parser.add_argument("--processes", help="number of worker processes (default: number of CPUs)", type=int)
+    parser.add_argument("--cache-dir", help="directory caching compiled maps and distance tables")
+    parser.add_argument("--max-nodes", help="limit on the number of expanded nodes per instance", type=int)
+    parser.add_argument("--od", help="use operator decomposition", action="store_true")
+    parser.add_argument("--heuristic", help="search heuristic (default: sum)", choices=list(HEURISTICS), default="sum")
+    parser.add_argument("--actions", help="action model of the agents (default: move), see ExplainablePlanning.py",
+                        choices=AstarSolver.ACTIONS, default="move")
+    #the search engines, at most one of them (A* by default), see ExplainablePlanning.py
+    engine = parser.add_mutually_exclusive_group()
+    engine.add_argument("--ida", help="use memory bounded IDA* with a transposition table of this many entries",
+                        type=int, metavar="TABLE_SIZE")
+    engine.add_argument("--cbs", help="use Conflict-Based Search", action="store_true")
+    engine.add_argument("--id", help="use independence detection", action="store_true")
+    engine.add_argument("--anytime", help="keep improving the plan until the timeout", action="store_true")
+
+    args = parser.parse_args()
+
+    instances = []
+    if args.tests:
+        instances += BatchRunner.readTestsFile(args.tests, args.base_dir)
+    if args.scen:
+        instances += BatchRunner.globInstances(args.scen, BatchRunner.parseRange(args.agents),
+                                               BatchRunner.parseRange(args.segments), args.map_dir)
+    if not instances:
+        parser.error("no instances, use --tests and/or --scen")
+
+    settings = {"heuristic": args.heuristic, "actions": args.actions, "tableSize": args.ida, "cbs": args.cbs,
+                "independence": args.id, "anytime": args.anytime}
+    runner = BatchRunner(args.output, args.processes, args.timeout, args.max_memory,
+                         args.cache_dir or os.environ.get(MapCache.ENV_VAR), args.od, args.format, args.max_nodes,
+                         settings)
+    count = runner.run(instances, lambda record: print(record["scen"] + "\t" + str(record["agents"]) + "\t"
+                                                       + str(record["max_decomp_parts"]) + "\t" + str(record["status"]),
+                                                       flush=True))
+    print("Planned " + str(count) + " of " + str(len(instances)) + " instances.", file=sys.stderr)
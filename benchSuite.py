@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import heapq
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+import ExplainablePlanning
+import resultWriter
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from gridGraph import GridGraph
+from searchLimits import SearchStatus, peakRss
+
+
+#offline performance suite: maps and scenarios are generated from fixed seeds (empty, random obstacle and room
+#layouts, in the MovingAI .map/.scen formats), so every run plans the same instances without downloading anything.
+#each case runs in a fresh process and times the phases separately: map loading, distance tables of the targets,
+#search (bounded by a node limit, so the work is the same on every machine) and decomposition.
+#results are compared with a baseline JSON (--baseline). The search results are the same on every machine, so they
+#are the regression gate: more expanded or generated nodes, a longer plan, more parts or a lost plan are
+#regressions. Times depend on the machine and its load, so they are scaled by a calibration run (see calibrate) to
+#the machine of the baseline, and phases slower than the tolerance are only reported.
+
+#instances where the search branches (many more expanded nodes than plan steps), solved within MAX_NODES.
+#name, layout, width, height, layout parameter (obstacle density or room size), seed, agents, segments
+SUITE = [
+    ("empty-16", "empty", 16, 16, None, 4, 5, 2),
+    ("empty-32", "empty", 32, 32, None, 26, 5, 2),
+    ("random-32-10", "random", 32, 32, 0.10, 35, 4, 1),
+    ("random-32-20", "random", 32, 32, 0.20, 23, 5, 2),
+    ("random-32-20-3", "random", 32, 32, 0.20, 20, 6, 3),
+    ("random-64-15", "random", 64, 64, 0.15, 2, 8, 2),
+    ("room-32-7", "room", 32, 32, 7, 10, 6, 3),
+    ("room-64-7", "room", 64, 64, 7, 21, 4, 1),
+]
+
+MAX_NODES = 10000
+TIMEOUT = 120
+TIME_FIELDS = ["load_time", "heuristic_time", "search_time", "decomposition_time"]
+RESULT_FIELDS = ["status", "expanded", "generated", "makespan", "decomp_parts"]
+FIELDS = ["case", "agents", "segments"] + RESULT_FIELDS + TIME_FIELDS + ["expansions_per_sec", "peak_rss"]
+MIN_TIME = 0.05 #phases faster than this (in seconds) in both runs are too noisy to compare
+CALIBRATION_STEPS = 100000
+
+
+def blockedCells(layout, width, height, parameter, rng):
+    if layout == "empty":
+        return set()
+    if layout == "random":
+        cells = [(i, j) for i in range(width) for j in range(height)]
+        return set(rng.sample(cells, int(parameter * len(cells))))
+    if layout == "room":
+        #rooms of parameter x parameter cells, separated by walls with one door to the right and one below
+        step = parameter + 1
+        blocked = {(i, j) for i in range(width) for j in range(height) if i % step == parameter or j % step == parameter}
+        for x in range(0, width, step):
+            for y in range(0, height, step):
+                blocked.discard((min(x + parameter, width - 1), y + rng.randrange(parameter)))
+                blocked.discard((x + rng.randrange(parameter), min(y + parameter, height - 1)))
+        return blocked
+    raise ValueError("unknown layout: " + str(layout))
+
+
+def writeMap(filename, width, height, blocked):
+    with open(filename, "w") as f:
+        f.write("type octile\nheight " + str(height) + "\nwidth " + str(width) + "\nmap\n")
+        for j in range(height):
+            f.write("".join("@" if (i, j) in blocked else "." for i in range(width)) + "\n")
+
+
+def largestComponent(index):
+    best = []
+    seen = set()
+    for start in range(index.numCells()):
+        if start in seen:
+            continue
+        seen.add(start)
+        component = [start]
+        for cell in component:
+            for nb in index.neighbors[cell]:
+                if nb not in seen:
+                    seen.add(nb)
+                    component.append(nb)
+        if len(component) > len(best):
+            best = component
+    return sorted(best)
+
+
+def writeScen(filename, mapName, width, height, index, agents, rng):
+    #agents rows of distinct starts and distinct goals in the largest connected component, with their distances
+    cells = largestComponent(index)
+    starts = rng.sample(cells, agents)
+    goals = rng.sample(cells, agents)
+    tables = DistanceTables(index)
+    with open(filename, "w") as f:
+        f.write("version 1\n")
+        for start, goal in zip(starts, goals):
+            (sx, sy), (gx, gy) = index.cells[start], index.cells[goal]
+            f.write("\t".join(["0", mapName, str(width), str(height), str(sx), str(sy), str(gx), str(gy),
+                               str(tables.get(goal)[start])]) + "\n")
+
+
+def generateCase(case, directory):
+    #writes the .map and .scen files of a case (if missing), returns their paths
+    name, layout, width, height, parameter, seed, agents, segments = case
+    mapFile = os.path.join(directory, name + ".map")
+    scenFile = os.path.join(directory, name + ".scen")
+    if not (os.path.exists(mapFile) and os.path.exists(scenFile)):
+        rng = random.Random(seed)
+        blocked = blockedCells(layout, width, height, parameter, rng)
+        writeMap(mapFile, width, height, blocked)
+        index = CellIndex.fromGraph(GridGraph.grid(width, height, blocked))
+        writeScen(scenFile, name + ".map", width, height, index, agents, rng)
+    return mapFile, scenFile
+
+
+def runCase(task):
+    #worker: plans one case and returns its record
+    case, mapFile, scenFile, maxNodes, timeout = task
+    name, layout, width, height, parameter, seed, agents, segments = case
+    gv = ExplainablePlanning.BenchTester()
+    gv.cache = None
+    gv.resetParams(segments, agents)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = timer()
+        gv.readGraph(mapFile, scenFile)
+        loadTime = timer() - start
+        mag = gv.mag
+        start = timer()
+        mag.index = CellIndex.fromGraph(mag.graph)
+        mag.distanceTables = DistanceTables(mag.index)
+        for ag in range(agents):
+            mag.distanceTables.get(mag.index.ids[mag.getTarget(ag)])
+        heuristicTime = timer() - start
+        start = timer()
+        found = mag.planAstar(segments - 1, timeout, maxNodes=maxNodes)
+        searchTime = timer() - start
+        start = timer()
+        decomposition = mag.computeMinimalDisjointDecomposition() if found else None
+        decompositionTime = timer() - start
+    record = mag.resultRecord()
+    return {"case": name, "agents": agents, "segments": segments, "status": mag.planStatus,
+            "expanded": record["expanded"], "generated": record["generated"], "makespan": record["makespan"],
+            "decomp_parts": len(decomposition) - 1 if decomposition is not None else None,
+            "load_time": loadTime, "heuristic_time": heuristicTime, "search_time": searchTime,
+            "decomposition_time": decompositionTime,
+            "expansions_per_sec": record["expanded"] / searchTime if searchTime > 0 else None, "peak_rss": peakRss()}
+
+
+def runSuite(cases, directory, repeat=3, maxNodes=MAX_NODES, timeout=TIMEOUT):
+    #yields the record of each case, with the best time of each phase over the repeats
+    tasks = []
+    for case in cases:
+        mapFile, scenFile = generateCase(case, directory)
+        tasks += [(case, mapFile, scenFile, maxNodes, timeout)] * repeat
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool: #a fresh process per run: no warm caches, own peak RSS
+        runs = pool.imap(runCase, tasks)
+        for case in cases:
+            records = [next(runs) for _ in range(repeat)]
+            best = dict(records[0])
+            for field in TIME_FIELDS:
+                best[field] = min(record[field] for record in records)
+            best["expansions_per_sec"] = max((record["expansions_per_sec"] or 0) for record in records)
+            best["peak_rss"] = min((record["peak_rss"] or 0) for record in records) or None
+            yield best
+
+
+def calibrate(repeat=5):
+    #seconds of a fixed pure Python workload (heap, dictionary and tuple operations, as in a search), the best of
+    #repeat runs. It does not use the planner, so it measures the speed of the machine and not of the code
+    best = None
+    for _ in range(repeat):
+        rng = random.Random(0)
+        heap = []
+        seen = {}
+        start = timer()
+        for step in range(CALIBRATION_STEPS):
+            key = (rng.randrange(1000), step)
+            heapq.heappush(heap, key)
+            seen[key] = step
+            if step % 3 == 0:
+                del seen[heapq.heappop(heap)]
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def worse(field, old, new):
+    #True if the search result new of field is worse than old
+    if field == "status":
+        return old == SearchStatus.SOLVED
+    return old is not None and (new is None or new > old)
+
+
+def compare(record, baseline, tolerance, scale=1):
+    #(kind, metric, baseline value, current value) of the differences of a record from its baseline: REGRESSION for
+    #worse search results, CHANGED for other ones, SLOWER and LARGER for times and memory beyond the tolerance. Times
+    #are multiplied by scale, the calibration time of the baseline over the current one, before they are compared
+    issues = []
+    for field in RESULT_FIELDS:
+        old, new = baseline.get(field), record[field]
+        if new != old:
+            issues.append(("REGRESSION" if worse(field, old, new) else "CHANGED", field, old, new))
+    for field in TIME_FIELDS:
+        old, new = baseline.get(field), record[field] * scale
+        if old is not None and max(old, new) >= MIN_TIME and new > old * (1 + tolerance):
+            issues.append(("SLOWER", field, old, new))
+    old, new = baseline.get("expansions_per_sec"), record["expansions_per_sec"]
+    if old and new is not None and max(baseline["search_time"], record["search_time"] * scale) >= MIN_TIME \
+            and new / scale * (1 + tolerance) < old:
+        issues.append(("SLOWER", "expansions_per_sec", old, new / scale))
+    old, new = baseline.get("peak_rss"), record["peak_rss"]
+    if old and new is not None and new > old * (1 + tolerance):
+        issues.append(("LARGER", "peak_rss", old, new))
+    return issues
+
+
+if __name__ == "__main__":
+    defaultBaseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchBaseline.json")
+    parser = argparse.ArgumentParser(description="offline benchmark suite on generated maps, compared with a baseline")
+    parser.add_argument("--cases", help="comma separated case names (default: all), one of: "
+                                        + ", ".join(case[0] for case in SUITE))
+    parser.add_argument("--work-dir", help="directory of the generated maps and scenarios (default: a temporary one)")
+    parser.add_argument("--repeat", help="runs per case, the best time of each phase is kept (default: 3)", type=int,
+                        default=3)
+    parser.add_argument("--baseline", help="baseline JSON to compare with (default: benchBaseline.json if it exists)",
+                        default=defaultBaseline)
+    parser.add_argument("--save-baseline", help="write the results as a baseline JSON to this file", metavar="FILE")
+    parser.add_argument("--tolerance", help="relative slowdown (after calibration) or memory growth that is reported "
+                                            "(default: 0.25)", type=float, default=0.25)
+    parser.add_argument("--format", help="format of the per case records (default: tsv)", choices=resultWriter.FORMATS,
+                        default="tsv")
+
+    args = parser.parse_args()
+
+    cases = SUITE
+    if args.cases:
+        names = args.cases.split(",")
+        unknown = set(names) - {case[0] for case in SUITE}
+        if unknown:
+            parser.error("unknown cases: " + ", ".join(sorted(unknown)))
+        cases = [case for case in SUITE if case[0] in names]
+    baseline = None
+    scale = 1
+    calibration = calibrate()
+    print("CALIBRATION:\t" + str(round(calibration, 4)) + " s", file=sys.stderr)
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved["cases"]
+        if saved.get("calibration"):
+            scale = saved["calibration"] / calibration
+
+    writer = resultWriter.createWriter(sys.stdout, args.format, fields=FIELDS)
+    results = {}
+    issues = 0
+    with contextlib.ExitStack() as stack:
+        directory = args.work_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(directory, exist_ok=True)
+        for record in runSuite(cases, directory, args.repeat):
+            writer.write(record)
+            results[record["case"]] = record
+            if baseline is not None and record["case"] in baseline:
+                for kind, metric, old, new in compare(record, baseline[record["case"]], args.tolerance, scale):
+                    print(kind + ":\t" + record["case"] + "\t" + metric + "\t" + str(old) + " -> " + str(new),
+                          file=sys.stderr)
+                    issues += kind == "REGRESSION"
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "max_nodes": MAX_NODES,
+                       "calibration": calibration, "cases": results}, f, indent=1, sort_keys=True)
+            f.write("\n")
+    if baseline is not None:
+        print("SUMMARY:\t" + str(issues) + " regressions", file=sys.stderr)
+    sys.exit(1 if issues else 0)
@@ -0,0 +1,257 @@
+import functools
+import heapq
+
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from searchLimits import INTERRUPT_EVERY, SearchInterrupted, SearchLimits, SearchStats, SearchStatus
+
+
+class CbsNode:
+    #node of the constraint tree.
+    #constraints: tuple indexed on agent of (vertex constraints {(cell, t)}, edge constraints {(from, to, t)})
+    #paths: tuple indexed on agent of the cell id paths (an agent disappears after the last cell, its target)
+    #cost: sum of the path lengths, conflicts: number of conflicts, for tie breaking (see CbsSolver.solve)
+
+    __slots__ = ('constraints', 'paths', 'cost', 'conflicts', 'conflict')
+
+    def __init__(self, constraints, paths, conflict, conflicts):
+        self.constraints = constraints
+        self.paths = paths
+        self.cost = sum(len(path) for path in paths)
+        self.conflict = conflict
+        self.conflicts = conflicts
+
+
+class CbsSolver:
+    #Conflict-Based Search over the same moves as AstarSolver: every agent moves at each timestep (no waiting),
+    #and leaves the graph through its target. The high level branches on
+    #  vertex conflicts: two agents in the same cell at the same timestep,
+    #  swap conflicts: two agents exchanging cells,
+    #  segment conflicts: the plans need more than numSegments + 1 parts in their minimal disjoint decomposition.
+    #    the first cut over the budget is an agent a entering at timestep t a cell c that an agent b visited at t' since
+    #    the previous cut. One branch forbids a at (c, t), the other forbids b at (c, t').
+    #the low level is a space-time A* per agent, avoiding the cells and moves reserved by the other agents' paths, and
+    #then the cells they visit at any time (which would start a new segment), on equal f. It calls the interrupt of the
+    #limits every INTERRUPT_EVERY states, so a single low level search stops at the timeout as well.
+    #segment branching does not cover plans that move the cuts, so the search can miss plans under a tight budget:
+    #an exhausted constraint tree ends with INCOMPLETE, not NO_PLAN.
+
+    def __init__(self, graph, initNodes, targetNodes, index=None):
+        self.graph = graph
+        self.initNodes = initNodes
+        self.targetNodes = targetNodes
+        self.numAgents = len(initNodes)
+        self.plan = None
+        self.status = None
+        self.stats = None
+        self.runtime = 0
+        self.index = index if index is not None else CellIndex.fromGraph(graph)
+        self.initIds = self.index.toIds(initNodes)
+        self.targetIds = self.index.toIds(targetNodes)
+        self.targetDistances = None
+
+    def computeHeuristic(self, distanceTables=None):
+        if distanceTables is None:
+            distanceTables = DistanceTables(self.index)
+        self.targetDistances = [distanceTables.get(target) for target in self.targetIds]
+
+    def solve(self, numSegments, timeout=300, limits=None):
+        #outcome in self.status and self.stats, nodes counted are constraint tree nodes
+        if limits is None:
+            limits = SearchLimits(timeout=timeout)
+        stats = self.stats = SearchStats()
+        openSet = []
+        try:
+            return self.search(numSegments, limits, openSet)
+        except SearchInterrupted as interruption: #a limit reached inside a low level search
+            return self.finish(limits, interruption.status, openSet)
+        except MemoryError:
+            return self.finish(limits, SearchStatus.MEMORY_LIMIT, openSet)
+
+    def search(self, numSegments, limits, openSet):
+        #the high level search of solve, openSet: its open list, empty at first
+        stats = self.stats
+        nextCheck = limits.nextCheck(stats)
+        interrupt = functools.partial(limits.interrupt, stats)
+        for ag in range(self.numAgents):
+            if self.targetDistances[ag][self.initIds[ag]] == DistanceTables.UNREACHABLE:
+                return self.finish(limits, SearchStatus.NO_PLAN, openSet)
+
+        emptyConstraints = tuple((frozenset(), frozenset()) for ag in range(self.numAgents))
+        paths = []
+        for ag in range(self.numAgents):
+            path = self.planAgent(ag, emptyConstraints[ag], paths, interrupt)
+            if path is None:
+                return self.finish(limits, SearchStatus.NO_PLAN, openSet)
+            paths.append(path)
+        root = CbsNode(emptyConstraints, tuple(paths), *self.findConflict(paths, numSegments))
+        #open nodes are (cost, conflicts, counter, node): equal costs go to the fewest conflicts, then to the first
+        #generated, so the nodes themselves are never compared
+        counter = 0
+        heapq.heappush(openSet, (root.cost, root.conflicts, counter, root))
+
+        while openSet:
+            cost, conflicts, _, node = heapq.heappop(openSet)
+            if stats.expanded >= nextCheck:
+                status = limits.check(stats, len(openSet), stats.expanded)
+                if status is not None:
+                    return self.finish(limits, status, openSet)
+                nextCheck = limits.nextCheck(stats)
+            stats.expanded += 1
+            if stats.bestF is None or cost < stats.bestF:
+                stats.bestF = cost
+
+            if node.conflict is None:
+                self.plan = node.paths
+                return self.finish(limits, SearchStatus.SOLVED, openSet)
+
+            for ag, constraint in self.branches(node.conflict):
+                vertex, edge = node.constraints[ag]
+                if len(constraint) == 2:
+                    if constraint in vertex:
+                        continue
+                    agConstraints = (vertex | {constraint}, edge)
+                else:
+                    if constraint in edge:
+                        continue
+                    agConstraints = (vertex, edge | {constraint})
+                others = node.paths[:ag] + node.paths[ag + 1:]
+                path = self.planAgent(ag, agConstraints, others, interrupt)
+                if path is None:
+                    continue
+                constraints = node.constraints[:ag] + (agConstraints,) + node.constraints[ag + 1:]
+                paths = node.paths[:ag] + (path,) + node.paths[ag + 1:]
+                child = CbsNode(constraints, paths, *self.findConflict(paths, numSegments))
+                stats.generated += 1
+                counter += 1
+                heapq.heappush(openSet, (child.cost, child.conflicts, counter, child))
+
+        return self.finish(limits, SearchStatus.INCOMPLETE, openSet)
+
+    def finish(self, limits, status, openSet):
+        limits.finish(self.stats, status, len(openSet), self.stats.expanded)
+        self.status = status
+        self.runtime = self.stats.elapsed
+        return status == SearchStatus.SOLVED
+
+    @staticmethod
+    def branches(conflict):
+        #(agent, constraint) of each child, constraints are (cell, t) or (from, to, t)
+        kind = conflict[0]
+        if kind == "vertex":
+            kind, a, b, cell, t = conflict
+            return [(a, (cell, t)), (b, (cell, t))]
+        if kind == "swap":
+            kind, a, b, fromCell, toCell, t = conflict
+            return [(a, (fromCell, toCell, t)), (b, (toCell, fromCell, t))]
+        kind, a, b, cell, t, tOther = conflict
+        return [(a, (cell, t)), (b, (cell, tOther))]
+
+    @staticmethod
+    def findConflict(paths, numSegments):
+        #(first conflict, number of conflicts) of the paths, the first conflict is None if they are a solution.
+        #collisions come before segment conflicts, which are counted by the cuts over the budget
+        length = max(len(path) for path in paths)
+        first = None
+        count = 0
+        owners = {} #cell -> (agent, last timestep) of the cells visited since the last cut
+        cuts = 0
+        segmentConflict = None
+        for t in range(length):
+            positions = {}
+            cut = None
+            for ag, path in enumerate(paths):
+                if t >= len(path):
+                    continue
+                cell = path[t]
+                other = positions.get(cell)
+                if other is not None:
+                    count += 1
+                    if first is None:
+                        first = ("vertex", other, ag, cell, t)
+                positions[cell] = ag
+                if t > 0 and t < len(paths[ag]):
+                    prev = path[t - 1]
+                    other = positions.get(prev)
+                    if other is not None and other != ag and t < len(paths[other]) and paths[other][t - 1] == cell:
+                        count += 1
+                        if first is None:
+                            first = ("swap", ag, other, prev, cell, t)
+                owner = owners.get(cell)
+                if cut is None and owner is not None and owner[0] != ag:
+                    cut = (ag, owner[0], cell, t, owner[1])
+            if cut is not None:
+                cuts += 1
+                if cuts > numSegments:
+                    count += 1
+                    if segmentConflict is None:
+                        a, b, cell, t, tOther = cut
+                        segmentConflict = ("segment", a, b, cell, t, tOther)
+                owners = {}
+            for cell, ag in positions.items():
+                owners[cell] = (ag, t)
+        return (first if first is not None else segmentConflict), count
+
+    def planAgent(self, ag, constraints, others, interrupt=None):
+        #space-time A* of one agent under its constraints, ties broken on fewer collisions with the other paths
+        #and then fewer cells shared with them. All the paths to a state (cell, t) have the same cost, so a state keeps
+        #the parent with the fewest collisions, then shared cells, replaced when a better one is found.
+        #interrupt: optional function called every INTERRUPT_EVERY states popped, see SearchLimits.interrupt.
+        #Returns the cell id path or None
+        vertex, edge = constraints
+        start = self.initIds[ag]
+        target = self.targetIds[ag]
+        dist = self.targetDistances[ag]
+        neighbors = self.index.neighbors
+        if (start, 0) in vertex:
+            return None
+        reserved = {}
+        shared = set()
+        for path in others:
+            for t, cell in enumerate(path):
+                reserved[(cell, t)] = reserved.get((cell, t), 0) + 1
+                shared.add(cell)
+        lastConstraint = max([c[-1] for c in vertex] + [c[-1] for c in edge] + [0])
+        horizon = lastConstraint + self.index.numCells()
+        parents = {(start, 0): None}
+        best = {(start, 0): (0, 0)} #state -> (collisions, shared cells) of its path through its parent
+        openSet = [(dist[start], 0, 0, 0, start)]
+        work = 0
+        while openSet:
+            f, collisions, sharedCells, t, cell = heapq.heappop(openSet)
+            if interrupt is not None:
+                work += 1
+                if work >= INTERRUPT_EVERY:
+                    work = 0
+                    interrupt()
+            if best[(cell, t)] != (collisions, sharedCells): #reached again with fewer collisions
+                continue
+            if cell == target:
+                path = []
+                state = (cell, t)
+                while state is not None:
+                    path.append(state[0])
+                    state = parents[state]
+                return path[::-1]
+            if t >= horizon:
+                continue
+            nt = t + 1
+            for nb in neighbors[cell]:
+                if dist[nb] == DistanceTables.UNREACHABLE:
+                    continue
+                if (nb, nt) in vertex or (cell, nb, nt) in edge:
+                    continue
+                nbCollisions = collisions + reserved.get((nb, nt), 0)
+                if reserved.get((nb, t)) and reserved.get((cell, nt)): #possible swap
+                    nbCollisions += 1
+                costs = (nbCollisions, sharedCells + (nb in shared))
+                seen = best.get((nb, nt))
+                if seen is not None and seen <= costs:
+                    continue
+                parents[(nb, nt)] = (cell, t)
+                best[(nb, nt)] = costs
+                heapq.heappush(openSet, (nt + dist[nb], costs[0], costs[1], nt, nb))
+        return None
+
+    def getPlan(self, ag):
+        return self.index.toNodes(self.plan[ag])
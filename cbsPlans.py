@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import resultWriter
+from planArray import PlanArray
+
+try:
+    import yaml
+except ImportError: #only needed to read the CBS plans
+    yaml = None
+
+try:
+    import py7zr
+except ImportError: #only needed to read CBS_Plans.7z without extracting it first
+    py7zr = None
+
+
+#minimal disjoint decompositions of the CBS plans of CBS_Plans.7z, i.e. pairs of (<name>.yaml, <name>.schd) files:
+#the .yaml file holds the instance (agents with start and goal, map), the .schd file the CBS schedule,
+#a list of {t, x, y} per agent. Pairs are read one at a time and decomposed in worker processes.
+
+FIELDS = ["name", "agents", "makespan", "cost", "collision", "decomp_parts", "decomposition"]
+
+
+def planLoader():
+    #the fastest safe YAML loader (C based if available), extended with the python/tuple tag of the obstacles
+    if yaml is None:
+        raise ImportError("reading CBS plans requires the PyYAML package")
+    base = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    class PlanLoader(base):
+        pass
+
+    PlanLoader.add_constructor("tag:yaml.org,2002:python/tuple",
+                               lambda loader, node: tuple(loader.construct_sequence(node)))
+    return PlanLoader
+
+
+def iterPairs(directory):
+    #(name, .yaml path, .schd path) of the pairs in a directory and its sub directories, sorted on name
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.endswith(".schd"):
+                name = filename[:-len(".schd")]
+                yield name, os.path.join(root, name + ".yaml"), os.path.join(root, filename)
+
+
+@contextlib.contextmanager
+def openSource(source):
+    #the directory holding the pairs of source, which is a directory or a .7z archive (extracted to a temporary directory)
+    if os.path.isdir(source):
+        yield source
+        return
+    if py7zr is None:
+        raise ImportError("reading " + source + " requires the py7zr package, or extract it and pass the directory")
+    with tempfile.TemporaryDirectory() as tmpDir:
+        with py7zr.SevenZipFile(source) as archive:
+            archive.extractall(tmpDir)
+        yield tmpDir
+
+
+def schedulePaths(instance, schedule):
+    #the plans of a schedule as lists of (x, y), in the order of the agents of the instance.
+    #timesteps missing from a schedule mean the agent waited, before its first step at the cell of that step
+    paths = []
+    for agent in instance["agents"]:
+        path = []
+        for step in schedule["schedule"].get(agent["name"], []):
+            while len(path) < step["t"]:
+                path.append(path[-1] if path else (step["x"], step["y"]))
+            path.append((step["x"], step["y"]))
+        paths.append(path)
+    return paths
+
+
+loader = None
+
+
+def explainPair(pair):
+    global loader
+    if loader is None:
+        loader = planLoader()
+    name, yamlPath, schdPath = pair
+    with open(yamlPath) as f:
+        instance = yaml.load(f, Loader=loader)
+    with open(schdPath) as f:
+        schedule = yaml.load(f, Loader=loader)
+    plans = PlanArray.fromPaths(schedulePaths(instance, schedule))
+    decomposition = plans.minimalDisjointDecomposition()
+    return {"name": name, "agents": plans.numAgents, "makespan": plans.length, "cost": schedule.get("cost"),
+            "collision": decomposition is None, "decomposition": decomposition,
+            "decomp_parts": len(decomposition) - 1 if decomposition is not None else None}
+
+
+class DecompositionSummary:
+    #aggregate statistics of the decomposed plans, updated one record at a time
+
+    def __init__(self):
+        self.instances = 0
+        self.collisions = 0
+        self.parts = {} #number of decomposition parts -> number of instances
+        self.byAgents = {} #number of agents -> [instances, total parts]
+
+    def add(self, record):
+        self.instances += 1
+        if record["collision"]:
+            self.collisions += 1
+            return
+        parts = record["decomp_parts"]
+        self.parts[parts] = self.parts.get(parts, 0) + 1
+        counts = self.byAgents.setdefault(record["agents"], [0, 0])
+        counts[0] += 1
+        counts[1] += parts
+
+    def asDict(self):
+        decomposed = self.instances - self.collisions
+        return {"instances": self.instances, "collisions": self.collisions,
+                "mean_parts": sum(p * n for p, n in self.parts.items()) / decomposed if decomposed else None,
+                "parts": {str(p): self.parts[p] for p in sorted(self.parts)},
+                "mean_parts_by_agents": {str(a): self.byAgents[a][1] / self.byAgents[a][0] for a in sorted(self.byAgents)}}
+
+
+def explainAll(source, processes=None, summary=None):
+    #decomposes every pair of source (a directory or a .7z archive) and yields the records in order, as they are ready.
+    #summary: optional DecompositionSummary updated with each record
+    with openSource(source) as directory:
+        pairs = iterPairs(directory)
+        if processes == 1:
+            records = map(explainPair, pairs)
+            for record in records:
+                if summary is not None:
+                    summary.add(record)
+                yield record
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                for record in pool.imap(explainPair, pairs, chunksize=8):
+                    if summary is not None:
+                        summary.add(record)
+                    yield record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="minimal disjoint decompositions of CBS plans")
+    parser.add_argument("source", help="CBS_Plans.7z or a directory with its extracted (.yaml, .schd) pairs")
+    parser.add_argument("--format", help="format of the per instance records (default: jsonl)",
+                        choices=resultWriter.FORMATS, default="jsonl")
+    parser.add_argument("--processes", help="number of worker processes (default: number of CPUs)", type=int)
+    parser.add_argument("--summary-every", help="also print the summary every N instances (to stderr)", type=int)
+
+    args = parser.parse_args()
+
+    writer = resultWriter.createWriter(sys.stdout, args.format, fields=FIELDS)
+    summary = DecompositionSummary()
+    for record in explainAll(args.source, args.processes, summary):
+        writer.write(record)
+        if args.summary_every and summary.instances % args.summary_every == 0:
+            print("SUMMARY:\t" + json.dumps(summary.asDict()), file=sys.stderr, flush=True)
+    print("SUMMARY:\t" + json.dumps(summary.asDict()), file=sys.stderr, flush=True)
@@ -0,0 +1,39 @@
+class CellIndex:
+    #Dense integer ids for the cells of a graph.
+    #cells[i]: the graph node (e.g. an (x, y) tuple) of cell id i.
+    #ids[node]: the cell id of a graph node.
+    #neighbors[i]: tuple of the cell ids reachable from cell i in one move.
+
+    def __init__(self, cells, neighbors):
+        self.cells = cells
+        self.ids = {node: i for i, node in enumerate(cells)}
+        self.neighbors = neighbors
+        self.predecessors = None
+
+    @staticmethod
+    def fromGraph(graph):
+        if hasattr(graph, "cellIndex"): #a GridGraph already has one
+            return graph.cellIndex()
+        cells = list(graph.nodes)
+        ids = {node: i for i, node in enumerate(cells)}
+        neighbors = [tuple(ids[nb] for nb in graph.neighbors(node)) for node in cells]
+        return CellIndex(cells, neighbors)
+
+    def getPredecessors(self):
+        #predecessors[i]: tuple of the cell ids from which cell i is reachable in one move
+        if self.predecessors is None:
+            predecessors = [[] for _ in self.cells]
+            for cell, cellNeighbors in enumerate(self.neighbors):
+                for nb in cellNeighbors:
+                    predecessors[nb].append(cell)
+            self.predecessors = [tuple(pred) for pred in predecessors]
+        return self.predecessors
+
+    def numCells(self):
+        return len(self.cells)
+
+    def toIds(self, nodes):
+        return tuple(self.ids[node] for node in nodes)
+
+    def toNodes(self, cellIds):
+        return [self.cells[i] for i in cellIds]
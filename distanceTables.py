@@ -0,0 +1,51 @@
+from array import array
+
+
+class DistanceTables:
+    #shortest path distances to target cells, one reverse BFS per distinct target.
+    #each table is a flat array indexed by cell id, holding UNREACHABLE for cells that cannot reach the target.
+    #store: optional persistent storage of the tables (see mapCache.DistanceStore), with load(target) and save(target, table)
+
+    UNREACHABLE = -1
+
+    def __init__(self, index, store=None):
+        self.index = index
+        self.store = store
+        self.tables = {}
+
+    def __getstate__(self):
+        #tables loaded from a store are memory mapped, they are pickled as plain arrays without the store
+        state = dict(self.__dict__)
+        state["tables"] = {target: array('i', table) for target, table in self.tables.items()}
+        state["store"] = None
+        return state
+
+    def get(self, target):
+        #target: a cell id
+        table = self.tables.get(target)
+        if table is None:
+            if self.store is not None:
+                table = self.store.load(target)
+            if table is None:
+                table = self.reverseBfs(target)
+                if self.store is not None:
+                    self.store.save(target, table)
+            self.tables[target] = table
+        return table
+
+    def reverseBfs(self, target):
+        predecessors = self.index.getPredecessors()
+        dist = array('i', [DistanceTables.UNREACHABLE]) * self.index.numCells()
+        dist[target] = 0
+        frontier = [target]
+        d = 0
+        while frontier:
+            d += 1
+            nextFrontier = []
+            for cell in frontier:
+                for pred in predecessors[cell]:
+                    if dist[pred] == DistanceTables.UNREACHABLE:
+                        dist[pred] = d
+                        nextFrontier.append(pred)
+            frontier = nextFrontier
+        return dist
@@ -0,0 +1,95 @@
+import itertools
+from array import array
+
+from cellIndex import CellIndex
+
+
+class GridGraph:
+    #directed graph of the free cells of a grid map, without networkx.
+    #provides the part of the networkx DiGraph interface used by the solvers and MultiAgentGraph
+    #(nodes, edges, neighbors, remove_node, ...), with nodes and neighbors in the same order as
+    #nx.DiGraph(nx.grid_2d_graph(width, height)), so plans do not depend on the backend.
+    #index: CellIndex of the cells, indptr/indices: the adjacency in CSR form over cell ids
+    #(the neighbors of cell i are indices[indptr[i]:indptr[i + 1]]).
+    #the node -> neighbor nodes dict (adj) is only built when neighbors() is first called, the solvers use the index.
+
+    def __init__(self, index):
+        self.setIndex(index)
+
+    def setIndex(self, index):
+        self.index = index
+        self.indptr = array('i', [0])
+        self.indptr.extend(itertools.accumulate(map(len, index.neighbors)))
+        self.indices = array('i', itertools.chain.from_iterable(index.neighbors))
+        self.adj = None
+
+    @staticmethod
+    def grid(width, height, blocked=()):
+        #4-connected width x height grid without the blocked (x, y) cells
+        mask = bytearray(b"\x01") * (width * height)
+        for i, j in blocked:
+            mask[j * width + i] = 0
+        return GridGraph.fromMask(width, height, mask)
+
+    @staticmethod
+    def fromMask(width, height, mask):
+        #4-connected grid of the free cells of mask, a bytes-like of width * height flags in row order
+        #(mask[j * width + i] is non zero if cell (i, j) is free, see mapParser)
+        #ids are kept on a grid padded with a border of blocked cells, so no neighbor needs a bounds check
+        stride = width + 2
+        ids = [-1] * (stride * (height + 2))
+        cells = []
+        rows = range(height)
+        for i in range(width):
+            for j in itertools.compress(rows, mask[i::width]):
+                ids[(j + 1) * stride + i + 1] = len(cells)
+                cells.append((i, j))
+        isCell = (-1).__lt__
+        neighbors = [tuple(filter(isCell, (ids[k - 1], ids[k + 1], ids[k - stride], ids[k + stride])))
+                     for k in [(j + 1) * stride + i + 1 for i, j in cells]]
+        return GridGraph(CellIndex(cells, neighbors))
+
+    def cellIndex(self):
+        return self.index
+
+    @property
+    def nodes(self):
+        return self.index.ids.keys()
+
+    @property
+    def edges(self):
+        cells = self.index.cells
+        return [(cells[k], cells[nb]) for k, nbs in enumerate(self.index.neighbors) for nb in nbs]
+
+    def neighbors(self, node):
+        if self.adj is None:
+            cells = self.index.cells
+            self.adj = {node: tuple(cells[nb] for nb in nbs) for node, nbs in zip(cells, self.index.neighbors)}
+        return self.adj[node]
+
+    def has_node(self, node):
+        return node in self.index.ids
+
+    def number_of_nodes(self):
+        return self.index.numCells()
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def remove_node(self, node):
+        #rebuilds the graph without node, keeping the order of the other cells
+        removed = self.index.ids[node]
+        newIds = [k if k < removed else k - 1 for k in range(self.index.numCells())]
+        cells = [cell for k, cell in enumerate(self.index.cells) if k != removed]
+        neighbors = [tuple(newIds[nb] for nb in nbs if nb != removed)
+                     for k, nbs in enumerate(self.index.neighbors) if k != removed]
+        self.setIndex(CellIndex(cells, neighbors))
+
+    def __contains__(self, node):
+        return node in self.index.ids
+
+    def __len__(self):
+        return self.index.numCells()
+
+    def __iter__(self):
+        return iter(self.index.cells)
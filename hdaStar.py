@@ -0,0 +1,494 @@
+import math
+import multiprocessing
+import queue
+import time
+from timeit import default_timer as timer
+
+from astar import AstarNode, DominanceTable
+from distanceTables import DistanceTables
+from openList import OpenList
+from searchLimits import INTERRUPT_EVERY, SearchInterrupted, SearchLimits, SearchStats, SearchStatus, currentRss
+from segmentHistory import HistorySpace
+
+
+class HdaStar:
+    #Hash Distributed A* (HDA*): the A* search of an AstarSolver split over worker processes. Each state is owned by
+    #the worker hashVal % workers, which keeps its open list and state table (see HdaWorker). Children are sent to
+    #their owner in batches over one queue per worker, and their parents are referenced as (worker, ref) pairs, so
+    #the plan is traced back across the workers at the end.
+    #each worker expands the best node of its own open list without waiting for the others. The open lists are
+    #ordered on the admissible bound g + timestepsLeft of the timesteps of a plan through the node first, then on the
+    #key of the serial search (see TimestepsOpenList), so the workers run A* on the timesteps. A goal popped by a
+    #worker becomes the incumbent (its number of timesteps, in shared memory) if it has fewer timesteps than the
+    #current one, and nodes whose bound is at least the incumbent are pruned, when they are generated and again when
+    #they are popped. States reached again with a lower g are reopened.
+    #the serial search runs next to the workers in one more process (the dive, see searchDive), and its plan becomes
+    #the incumbent too. Its heuristic counts every agent's moves, which is not admissible for the timesteps, but it
+    #dives to a plan in far fewer expansions than the workers need to reach the bound of the best plan: they expand
+    #every state of a lower bound first, and the states of the segment budget blocked by the agents' own histories
+    #can take millions of expansions to rule out. The workers do not follow the serial order of f instead: nodes
+    #expanded on other workers pull it away from the serial dive, and it then finds worse plans than the serial search.
+    #termination: the search ends when every worker is idle (no open node) and no batch is in flight. Both are read
+    #together under one lock, and a batch is only counted as received once its nodes are in the open list of its
+    #owner, so no work can be left when the search ends. The plan then has the fewest timesteps possible with the
+    #segment budget. If a limit is reached first, the incumbent is returned as the plan (SOLVED, as AnytimeSearch),
+    #never more timesteps than the plan of the serial search once the dive found it. A dive that proves there is no
+    #plan ends the search with NO_PLAN.
+    #workers inherit the solver (map, cell index, distance tables) from this process where fork is available.
+    #maxMemory applies to the sum of the RSS of the workers and the dive. A process that dies raises a RuntimeError.
+    #once the search ends (stop flag), the workers and the dive leave their expansion at the next interrupt (see
+    #jointMoves) and publish their final counters, so the search returns soon after its limits. Workers then answer
+    #the trace requests until the exit flag. It is not a message: a worker that exits may leave the inbox of another
+    #one locked in the middle of a batch, and a message behind it would never arrive.
+
+    BATCH_SIZE = 64 #children buffered per destination before they are sent
+    POLL_EVERY = 16 #expansions between two reads of the inbox, buffered children are sent at each read
+    RSS_EVERY = 1000 #expansions between two measures of the RSS of a worker
+    IDLE_WAIT = 0.05 #seconds an idle worker waits for messages before looking at the stop flag again
+    CHECK_INTERVAL = 0.1 #seconds between two limit checks
+    TRACE_WAIT = 1 #seconds between two checks that the worker asked for a part of the plan is alive
+    JOIN_GRACE = 1 #seconds after which the processes that did not exit are terminated
+    DIVE_CHECK_EVERY = 100 #expansions of the dive between two looks at the stop flag (and publications of its counters)
+    DIVE = -1 #worker of the goal when the incumbent is the plan of the dive
+    STOPPED = "stopped" #status of the dive when the search ended before it
+
+    def __init__(self, solver, workers=None):
+        self.solver = solver
+        self.workers = workers or multiprocessing.cpu_count()
+
+    def astar(self, numSegments, timeout=300, operatorDecomposition=False, limits=None):
+        #as AstarSolver.astar, the plan and the outcome are left in the solver
+        solver = self.solver
+        if limits is None:
+            limits = SearchLimits(timeout=timeout)
+        stats = solver.stats = SearchStats()
+        workers = self.workers
+        space = HistorySpace(solver.index.numCells(), solver.numAgents)
+        history = space.singles(solver.initIds)
+        startNode = AstarNode(None, solver.initIds, history, space.hashOf(history), 0)
+        solver.heuristic.prepare(space, numSegments)
+        for ag in range(solver.numAgents):
+            if solver.targetDistances[ag][solver.initIds[ag]] == DistanceTables.UNREACHABLE:
+                return self.finish(limits, SearchStatus.NO_PLAN, 0, 0)
+        if solver.heuristicVal(startNode) is None:
+            return self.finish(limits, SearchStatus.NO_PLAN, 0, 0)
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        shared = SharedState(context, workers)
+        inboxes = [context.Queue() for _ in range(workers)]
+        results = context.Queue()
+        dives = context.Queue()
+        processes = [context.Process(target=searchPartition, daemon=True,
+                                     args=(solver, worker, numSegments, operatorDecomposition, shared, inboxes,
+                                           results))
+                     for worker in range(workers)]
+        dive = context.Process(target=searchDive, daemon=True,
+                               args=(solver, numSegments, operatorDecomposition, limits, shared, workers, dives))
+        for process in processes:
+            process.start()
+        dive.start()
+        divePlan = None
+        shared.inFlight.value = 1
+        inboxes[startNode.hashVal % workers].put(("nodes", [(startNode.current, startNode.history,
+                                                             startNode.historyHash, 0, 0, None, None)]))
+        status = None
+        try:
+            nextCheck = limits.nextCheck(stats)
+            lastCheck = timer()
+            while True:
+                with shared.lock:
+                    done = shared.inFlight.value == 0 and all(shared.idle)
+                stats.expanded, stats.generated, openSize, closedSize = shared.totals()
+                if done:
+                    break
+                HdaStar.checkAlive(processes)
+                if divePlan is None:
+                    divePlan = self.receiveDive(dive, dives, shared)
+                    if divePlan == []:
+                        status = SearchStatus.NO_PLAN
+                        break
+                if stats.expanded >= nextCheck or timer() - lastCheck >= HdaStar.CHECK_INTERVAL:
+                    status = limits.check(stats, openSize, closedSize)
+                    rss = sum(shared.rss)
+                    stats.peakRss = max(stats.peakRss or 0, rss)
+                    if status is None and limits.maxMemory is not None and rss > limits.maxMemory:
+                        status = SearchStatus.MEMORY_LIMIT
+                    if status is not None:
+                        break
+                    nextCheck = limits.nextCheck(stats)
+                    lastCheck = timer()
+                time.sleep(0.002)
+            shared.stop.set()
+            with shared.lock:
+                incumbent = shared.incumbent.value
+                goal = (shared.goal[0], shared.goal[1])
+            if incumbent < math.inf:
+                status = SearchStatus.SOLVED
+                stats.bestF = int(incumbent)
+                if goal[0] == HdaStar.DIVE:
+                    solver.plan = divePlan
+                else:
+                    solver.plan = self.tracePlan(goal, inboxes, results, processes)
+            elif status is None:
+                status = SearchStatus.NO_PLAN
+        finally:
+            shared.stop.set()
+            shared.exit.set()
+            deadline = timer() + HdaStar.JOIN_GRACE
+            for process in processes + [dive]:
+                process.join(max(deadline - timer(), 0))
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            for inbox in inboxes: #messages left for workers that were terminated would block the exit
+                inbox.cancel_join_thread()
+        stats.expanded, stats.generated, openSize, closedSize = shared.totals()
+        return self.finish(limits, status, openSize, closedSize)
+
+    @staticmethod
+    def checkAlive(processes):
+        #workers only exit when told to, so one that exited before died
+        for worker, process in enumerate(processes):
+            if process.exitcode is not None:
+                raise RuntimeError("HDA* worker " + str(worker) + " died (exit code " + str(process.exitcode) + ")")
+
+    @staticmethod
+    def receiveDive(dive, dives, shared):
+        #the plan of the dive once it is done, [] if it proved there is no plan, None if it is still searching (or
+        #stopped at a limit of its own). Its plan becomes the incumbent if it has fewer timesteps
+        try:
+            status, plan = dives.get_nowait()
+        except queue.Empty:
+            if dive.exitcode not in (None, 0):
+                raise RuntimeError("HDA* dive died (exit code " + str(dive.exitcode) + ")")
+            return None
+        if status == SearchStatus.NO_PLAN:
+            return []
+        if status != SearchStatus.SOLVED:
+            return None
+        with shared.lock:
+            if len(plan) - 1 < shared.incumbent.value:
+                shared.incumbent.value = len(plan) - 1
+                shared.goal[0] = HdaStar.DIVE
+        return plan
+
+    @staticmethod
+    def tracePlan(ref, inboxes, results, processes):
+        #the joint plan ending at the node ref, a (worker, ref) pair, asking each worker for its part of the path
+        plan = []
+        while ref is not None:
+            worker = ref[0]
+            inboxes[worker].put(("trace", ref[1]))
+            while True:
+                try:
+                    currents, ref = results.get(timeout=HdaStar.TRACE_WAIT)
+                    break
+                except queue.Empty:
+                    HdaStar.checkAlive([processes[worker]])
+            plan.extend(currents)
+        return plan[::-1]
+
+    def finish(self, limits, status, openSize, closedSize):
+        solver = self.solver
+        limits.finish(solver.stats, status, openSize, closedSize)
+        solver.status = status
+        solver.runtime = solver.stats.elapsed
+        return status == SearchStatus.SOLVED
+
+
+class SharedState:
+    #what the workers and the coordinator share, these fields are read and written under lock:
+    #inFlight: batches sent and not yet in the open list of their owner, idle[w]: worker w has no open node,
+    #incumbent: timesteps of the best goal so far, goal: (worker, ref) of that goal.
+    #stop: the search ended, exit: the plan was traced, the workers exit.
+    #and these ones without: counters: expanded, generated, open and closed states of each worker and of the dive
+    #(the last ones), rss: RSS of each worker and of the dive in MB
+
+    def __init__(self, context, workers):
+        self.lock = context.Lock()
+        self.stop = context.Event()
+        self.exit = context.Event()
+        self.inFlight = context.RawValue('q', 0)
+        self.idle = context.RawArray('b', [1] * workers)
+        self.incumbent = context.RawValue('d', math.inf)
+        self.goal = context.RawArray('q', 2)
+        self.counters = context.RawArray('q', 4 * (workers + 1))
+        self.rss = context.RawArray('d', workers + 1)
+
+    def totals(self):
+        counters = self.counters
+        return tuple(sum(counters[i::4]) for i in range(4))
+
+
+class HdaWorker:
+    #one partition of the HDA* search, see HdaStar. Nodes sent to another worker reference their parent by the index
+    #of the parent in exported, nodes of this worker by the parent node itself
+
+    def __init__(self, solver, worker, numSegments, operatorDecomposition, shared, inboxes, results):
+        self.solver = solver
+        self.worker = worker
+        self.numSegments = numSegments
+        self.operatorDecomposition = operatorDecomposition
+        self.shared = shared
+        self.inboxes = inboxes
+        self.results = results
+        self.space = HistorySpace(solver.index.numCells(), solver.numAgents) #same seed: same keys in every worker
+        solver.heuristic.prepare(self.space, numSegments)
+        solver.stats = SearchStats()
+        solver.dominance = DominanceTable(self.space) if solver.actions != "move" else None
+        self.openList = TimestepsOpenList(solver)
+        self.outgoing = [[] for _ in inboxes]
+        self.exported = []
+        self.refs = {} #exported node -> its index in exported
+        self.nextRss = 0
+
+    def run(self):
+        shared = self.shared
+        openList = self.openList
+        try:
+            while not shared.stop.is_set():
+                for _ in range(HdaStar.POLL_EVERY):
+                    entry = openList.pop()
+                    if entry is None:
+                        break
+                    self.expand(*entry)
+                self.flush()
+                self.receive(not self.hasWork())
+        except SearchInterrupted: #the search ended during an expansion
+            pass
+        self.publish()
+        self.serve()
+
+    def interrupt(self):
+        #called inside the expansions (see jointMoves), leaves the expansion once the search ended
+        if self.shared.stop.is_set():
+            raise SearchInterrupted(HdaStar.STOPPED)
+
+    def hasWork(self):
+        return self.openList.peek() is not None
+
+    def pruned(self, g, left):
+        #True if a node g timesteps from the start and at least left from a goal cannot beat the incumbent
+        return g + left >= self.shared.incumbent.value
+
+    def receive(self, block):
+        #handles the messages in the inbox, waiting a little for one if block (the worker is then idle)
+        shared = self.shared
+        inbox = self.inboxes[self.worker]
+        if block:
+            with shared.lock:
+                shared.idle[self.worker] = True
+        try:
+            message = inbox.get(timeout=HdaStar.IDLE_WAIT) if block else inbox.get_nowait()
+            while True:
+                self.handle(message)
+                message = inbox.get_nowait()
+        except queue.Empty:
+            pass
+        self.publish()
+
+    def handle(self, message):
+        kind = message[0]
+        if kind == "trace":
+            self.trace(message[1])
+        elif kind == "nodes" and not self.shared.stop.is_set():
+            for current, history, historyHash, segments, g, h, parent in message[1]:
+                self.add(AstarNode(parent, current, history, historyHash, segments), g, h)
+            shared = self.shared
+            with shared.lock:
+                shared.inFlight.value -= 1
+                shared.idle[self.worker] = not self.hasWork()
+
+    def add(self, node, g, h=None):
+        #a node owned by this worker, reached with cost g, h: its heuristic if the sender computed it
+        openList = self.openList
+        solver = self.solver
+        record = openList.get(node)
+        if record is None:
+            if self.pruned(g, solver.timestepsLeft(node.current)):
+                return
+            if solver.dominance is not None and solver.dominance.dominated(node, g):
+                return
+            solver.stats.generated += 1
+            if h is None:
+                h = solver.heuristicVal(node)
+            if h is None: #dead end
+                openList.addClosed(node, g)
+            else:
+                openList.push(node, g, h)
+        elif g < record.g and record.h is not None:
+            if record.closed:
+                openList.reopen(record, node.parent, g)
+            else:
+                openList.improve(record, node.parent, g)
+
+    def expand(self, bound, node, record):
+        #bound: first field of the key of the node, see TimestepsOpenList
+        solver = self.solver
+        space = self.space
+        pruned = bound >= self.shared.incumbent.value #a better goal was found since it was opened
+        if node.partial:
+            if not pruned:
+                self.route(node.getChildren(space, self.numSegments), node.g)
+            return
+        self.openList.close(record)
+        if pruned:
+            return
+        solver.stats.expanded += 1
+        if solver.isGoal(node):
+            shared = self.shared
+            with shared.lock:
+                if record.g < shared.incumbent.value:
+                    shared.incumbent.value = record.g
+                    shared.goal[0] = self.worker
+                    shared.goal[1] = self.export(node)
+            return
+        g = record.g + 1
+        if self.operatorDecomposition:
+            children = solver.decompose(node, g, space).getChildren(space, self.numSegments)
+        else:
+            children = node.getChildren(solver.successors, solver.targetIds, space, solver.actions == "stay",
+                                        numSegments=self.numSegments, interrupt=self.interrupt)
+        self.route(children, g)
+
+    def route(self, children, g):
+        #keeps the children owned by this worker (and the partial ones), buffers the others for their owners
+        workers = len(self.inboxes)
+        solver = self.solver
+        for i, child in enumerate(children):
+            if i and not i % INTERRUPT_EVERY:
+                self.interrupt()
+            if child.partial:
+                self.openList.pushPartial(child)
+                continue
+            if child.segments > self.numSegments:
+                continue
+            owner = child.hashVal % workers
+            if owner == self.worker:
+                self.add(child, g)
+                continue
+            if self.pruned(g, solver.timestepsLeft(child.current)):
+                continue
+            h = solver.heuristicVal(child)
+            if h is None: #dead end
+                continue
+            batch = self.outgoing[owner]
+            batch.append((child.current, child.history, child.historyHash, child.segments, g, h,
+                          (self.worker, self.export(child.parent))))
+            if len(batch) >= HdaStar.BATCH_SIZE:
+                self.send(owner)
+
+    def export(self, node):
+        ref = self.refs.get(node)
+        if ref is None:
+            ref = self.refs[node] = len(self.exported)
+            self.exported.append(node)
+        return ref
+
+    def send(self, owner):
+        batch = self.outgoing[owner]
+        self.outgoing[owner] = []
+        shared = self.shared
+        with shared.lock:
+            shared.inFlight.value += 1
+        self.inboxes[owner].put(("nodes", batch))
+
+    def flush(self):
+        for owner, batch in enumerate(self.outgoing):
+            if batch:
+                self.send(owner)
+
+    def publish(self):
+        stats = self.solver.stats
+        counters = self.shared.counters
+        base = 4 * self.worker
+        counters[base] = stats.expanded
+        counters[base + 1] = stats.generated
+        counters[base + 2] = len(self.openList)
+        counters[base + 3] = self.openList.closedCount
+        if stats.expanded >= self.nextRss:
+            self.shared.rss[self.worker] = currentRss() or 0
+            self.nextRss = stats.expanded + HdaStar.RSS_EVERY
+
+    def trace(self, ref):
+        #sends the cells of the path to an exported node, up to the first parent on another worker
+        node = self.exported[ref]
+        currents = []
+        while isinstance(node, AstarNode):
+            currents.append(node.current)
+            node = node.parent
+        self.results.put((currents, node))
+
+    def serve(self):
+        #after the search: answers the trace requests until the exit flag
+        inbox = self.inboxes[self.worker]
+        while not self.shared.exit.is_set():
+            try:
+                self.handle(inbox.get(timeout=HdaStar.IDLE_WAIT))
+            except queue.Empty:
+                pass
+
+
+class TimestepsOpenList(OpenList):
+    #OpenList ordered on (g + timestepsLeft, f, h, segments): the nodes that can lead to the plans with the fewest
+    #timesteps first, in the order of the serial search among them
+
+    def __init__(self, solver):
+        super().__init__()
+        self.solver = solver
+
+    def key(self, node, g, h):
+        if node.partial:
+            left = self.solver.partialTimestepsLeft(node)
+        else:
+            left = self.solver.timestepsLeft(node.current)
+        return (g + left, g + h, h, node.segments)
+
+
+def searchPartition(solver, worker, numSegments, operatorDecomposition, shared, inboxes, results):
+    #worker process of HdaStar
+    for inbox in inboxes + [results]: #exit even if other workers left batches unread
+        inbox.cancel_join_thread()
+    HdaWorker(solver, worker, numSegments, operatorDecomposition, shared, inboxes, results).run()
+
+
+class DiveLimits(SearchLimits):
+    #limits of the dive: the node limit of the search, and the stop flag of HdaStar, looked at every DIVE_CHECK_EVERY
+    #expansions and inside the expansions
+
+    def __init__(self, shared, maxNodes, progress):
+        SearchLimits.__init__(self, maxNodes=maxNodes, checkEvery=HdaStar.DIVE_CHECK_EVERY, progress=progress)
+        self.shared = shared
+
+    def check(self, stats, openSize, closedSize):
+        status = SearchLimits.check(self, stats, openSize, closedSize)
+        if status is None and self.shared.stop.is_set():
+            return HdaStar.STOPPED
+        return status
+
+    def interrupt(self, stats):
+        if self.shared.stop.is_set():
+            raise SearchInterrupted(HdaStar.STOPPED)
+        SearchLimits.interrupt(self, stats)
+
+
+def searchDive(solver, numSegments, operatorDecomposition, limits, shared, slot, dives):
+    #dive process of HdaStar: the serial search, until it is done, the node limit, or the end of the search (see
+    #DiveLimits). Its counters are published at every limit check and at the end in the slot of SharedState after
+    #the workers
+    def publish(stats):
+        counters = shared.counters
+        counters[4 * slot] = stats.expanded
+        counters[4 * slot + 1] = stats.generated
+        counters[4 * slot + 2] = stats.openSize
+        counters[4 * slot + 3] = stats.closedSize
+        shared.rss[slot] = currentRss() or 0
+
+    found = solver.astar(numSegments, operatorDecomposition=operatorDecomposition,
+                         limits=DiveLimits(shared, limits.maxNodes, publish))
+    publish(solver.stats)
+    if solver.status != HdaStar.STOPPED: #nobody reads the result any more
+        dives.put((solver.status, solver.plan if found else None))
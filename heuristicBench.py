@@ -0,0 +1,102 @@
+import argparse
+import contextlib
+import io
+import math
+import sys
+
+import ExplainablePlanning
+import resultWriter
+from batchRunner import BatchRunner
+from heuristics import HEURISTICS
+from mapCache import MapCache
+
+
+#plans every instance with each heuristic, one after the other in this process so that runtimes are comparable,
+#then summarizes each heuristic against the first one (the baseline) on the instances both solved.
+
+FIELDS = ["heuristic", "map", "scen", "agents", "max_decomp_parts", "status", "decomp_parts", "makespan", "runtime",
+          "expanded", "generated"]
+
+
+def runInstance(cache, instance, heuristic, timeout, maxNodes, operatorDecomposition):
+    mapFile, scen, numAgents, numSegments = instance
+    gv = ExplainablePlanning.BenchTester()
+    gv.resetParams(numSegments, numAgents)
+    gv.cache = cache
+    gv.heuristic = heuristic
+    gv.maxNodes = maxNodes
+    gv.operatorDecomposition = operatorDecomposition
+    with contextlib.redirect_stdout(io.StringIO()):
+        gv.readGraph(mapFile, scen)
+        gv.planAll(timeout)
+        gv.minimalDecomposition()
+    record = gv.resultRecord()
+    record["heuristic"] = heuristic
+    return record
+
+
+def summarize(records, heuristics):
+    #per heuristic: solved instances, and on the instances solved by both it and the baseline,
+    #the geometric mean ratio of expanded nodes and runtime to the baseline
+    baseline = heuristics[0]
+    byInstance = {}
+    for record in records:
+        byInstance.setdefault(resultWriter.recordKey(record), {})[record["heuristic"]] = record
+    summary = {}
+    for heuristic in heuristics:
+        solved = [runs[heuristic] for runs in byInstance.values() if runs[heuristic]["found"]]
+        common = [(runs[baseline], runs[heuristic]) for runs in byInstance.values()
+                  if runs[baseline]["found"] and runs[heuristic]["found"]]
+        expandedRatio = runtimeRatio = None
+        if common:
+            expandedRatio = math.exp(sum(math.log(max(run["expanded"], 1) / max(base["expanded"], 1))
+                                         for base, run in common) / len(common))
+            runtimeRatio = math.exp(sum(math.log(max(run["runtime"], 1e-6) / max(base["runtime"], 1e-6))
+                                        for base, run in common) / len(common))
+        summary[heuristic] = {"solved": len(solved), "common": len(common),
+                              "expanded_vs_" + baseline: expandedRatio, "runtime_vs_" + baseline: runtimeRatio}
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare the search heuristics on a set of instances")
+    parser.add_argument("--tests", help="tests file with rows of: <.map> <.scen> <agents> <segments>")
+    parser.add_argument("--base-dir", help="directory of the files named in the tests file (default: its directory)")
+    parser.add_argument("--scen", help="glob of .scen files, planned for every --agents and --segments value")
+    parser.add_argument("--map-dir", help="directory of the maps named in the .scen files (default: their directory)")
+    parser.add_argument("--agents", help="numbers of agents, e.g. 2-10 or 2,4,8", default="2")
+    parser.add_argument("--segments", help="numbers of segments, e.g. 1-3", default="1")
+    parser.add_argument("--heuristics", help="comma separated heuristics, the first is the baseline (default: all)",
+                        default=",".join(HEURISTICS))
+    parser.add_argument("--timeout", help="time limit per run (in seconds)", type=int, default=60)
+    parser.add_argument("--max-nodes", help="limit on the number of expanded nodes per run", type=int)
+    parser.add_argument("--od", help="use operator decomposition", action="store_true")
+    parser.add_argument("--format", help="format of the per run records (default: tsv)", choices=resultWriter.FORMATS,
+                        default="tsv")
+
+    args = parser.parse_args()
+
+    instances = []
+    if args.tests:
+        instances += BatchRunner.readTestsFile(args.tests, args.base_dir)
+    if args.scen:
+        instances += BatchRunner.globInstances(args.scen, BatchRunner.parseRange(args.agents),
+                                               BatchRunner.parseRange(args.segments), args.map_dir)
+    if not instances:
+        parser.error("no instances, use --tests and/or --scen")
+    heuristics = args.heuristics.split(",")
+    for heuristic in heuristics:
+        if heuristic not in HEURISTICS:
+            parser.error("unknown heuristic: " + heuristic)
+
+    cache = MapCache.fromEnvironment() or MapCache()
+    writer = resultWriter.createWriter(sys.stdout, args.format, fields=FIELDS)
+    records = []
+    for instance in instances:
+        for heuristic in heuristics:
+            record = runInstance(cache, instance, heuristic, args.timeout, args.max_nodes, args.od)
+            writer.write(record)
+            del record["plans"]
+            records.append(record)
+    for heuristic, values in summarize(records, heuristics).items():
+        print("SUMMARY:\t" + heuristic + "\t" + str(values), file=sys.stderr)
@@ -0,0 +1,176 @@
+import heapq
+
+from distanceTables import DistanceTables
+
+GOAL = -1 #AstarNode.GOAL
+
+
+class SumOfDistances:
+    #sum over the agents of the distance to their target, ignoring the other agents.
+    #value returns None for a node from which no plan exists (a dead end), which the solvers prune.
+
+    name = "sum"
+
+    def __init__(self, solver):
+        self.targetDistances = solver.targetDistances
+        self.targetIds = solver.targetIds
+        self.neighbors = solver.index.neighbors
+
+    def prepare(self, space, numSegments):
+        #called by the solver before each search
+        self.space = space
+        self.numSegments = numSegments
+
+    def value(self, node):
+        val = 0
+        for ag, cell in enumerate(node.current):
+            if cell != GOAL:
+                val += self.targetDistances[ag][cell]
+        return val
+
+
+class PairwiseConflicts(SumOfDistances):
+    #sum of distances plus one per pair of agents with a cardinal conflict (as in CBS-H): every shortest path of one
+    #agent collides with every shortest path of the other, so one of them needs at least one more move.
+    #the pairs are counted with a greedy matching of the conflict graph, a lower bound of its minimal vertex cover.
+    #cardinal points of an agent (timesteps where all its shortest paths go through the same cell) are cached per cell.
+
+    name = "pairwise"
+    CACHE_SIZE = 1000000
+
+    def __init__(self, solver):
+        super().__init__(solver)
+        self.cardinal = {}
+
+    def cardinalCells(self, ag, cell):
+        #{t: cell at timestep t of every shortest path of ag from cell}, from the levels of its MDD
+        key = (ag, cell)
+        points = self.cardinal.get(key)
+        if points is None:
+            dist = self.targetDistances[ag]
+            remaining = dist[cell]
+            level = {cell}
+            points = {}
+            t = 0
+            while True:
+                if len(level) == 1:
+                    points[t] = next(iter(level))
+                if remaining == 0:
+                    break
+                remaining -= 1
+                t += 1
+                level = {nb for c in level for nb in self.neighbors[c] if dist[nb] == remaining}
+            if len(self.cardinal) >= PairwiseConflicts.CACHE_SIZE:
+                self.cardinal.clear()
+            self.cardinal[key] = points
+        return points
+
+    @staticmethod
+    def conflicting(pointsA, pointsB):
+        for t, cell in pointsA.items():
+            other = pointsB.get(t)
+            if other is None:
+                continue
+            if other == cell: # Collision
+                return True
+            if pointsA.get(t + 1) == other and pointsB.get(t + 1) == cell: # Swap
+                return True
+        return False
+
+    def value(self, node):
+        val = 0
+        active = []
+        for ag, cell in enumerate(node.current):
+            if cell != GOAL:
+                val += self.targetDistances[ag][cell]
+                active.append((ag, self.cardinalCells(ag, cell)))
+        matched = set()
+        for i, (agA, pointsA) in enumerate(active):
+            if agA in matched:
+                continue
+            for agB, pointsB in active[i + 1:]:
+                if agB not in matched and PairwiseConflicts.conflicting(pointsA, pointsB):
+                    matched.add(agA)
+                    matched.add(agB)
+                    val += 1
+                    break
+        return val
+
+
+class SegmentAware(SumOfDistances):
+    #sum of distances, where in the last allowed segment each agent's distance avoids the cells visited by the other
+    #agents in this segment: entering them would start a new segment. These cells only grow within a segment, so the
+    #distance stays a lower bound, and an agent cut off from its target makes the node a dead end.
+    #distances are cached per (agent, cell, hashes of the other agents' histories).
+
+    name = "segment"
+    CACHE_SIZE = 1000000
+
+    def __init__(self, solver):
+        super().__init__(solver)
+        self.constrained = {}
+
+    def value(self, node):
+        if node.segments < self.numSegments:
+            return super().value(node)
+        val = 0
+        for ag, cell in enumerate(node.current):
+            if cell != GOAL:
+                dist = self.constrainedDistance(node, ag, cell)
+                if dist is None:
+                    return None
+                val += dist
+        return val
+
+    def constrainedDistance(self, node, ag, cell):
+        key = (ag, cell, node.historyHash[:ag] + node.historyHash[ag + 1:])
+        if key in self.constrained:
+            return self.constrained[key]
+        others = [cellSet for other, cellSet in enumerate(node.history) if other != ag and cellSet is not None]
+        if not others:
+            dist = self.targetDistances[ag][cell]
+        else:
+            dist = self.search(ag, cell, others)
+        if len(self.constrained) >= SegmentAware.CACHE_SIZE:
+            self.constrained.clear()
+        self.constrained[key] = dist
+        return dist
+
+    def search(self, ag, cell, others):
+        #A* from cell to the target of ag around the blocked cells, guided by the unconstrained distances
+        space = self.space
+        if not space.shifts: #flat sets are bitsets over the whole map
+            blockedBits = 0
+            for cellSet in others:
+                blockedBits |= cellSet
+            isBlocked = lambda c: blockedBits >> c & 1
+        else:
+            isBlocked = lambda c: any(space.contains(cellSet, c) for cellSet in others)
+        dist = self.targetDistances[ag]
+        target = self.targetIds[ag]
+        if isBlocked(target):
+            return None
+        gscore = {cell: 0}
+        openSet = [(dist[cell], 0, cell)]
+        while openSet:
+            f, negG, c = heapq.heappop(openSet)
+            if c == target:
+                return -negG
+            g = -negG
+            if gscore[c] < g:
+                continue
+            for nb in self.neighbors[c]:
+                if gscore.get(nb, g + 2) <= g + 1 or dist[nb] == DistanceTables.UNREACHABLE or isBlocked(nb):
+                    continue
+                gscore[nb] = g + 1
+                heapq.heappush(openSet, (g + 1 + dist[nb], -(g + 1), nb))
+        return None
+
+
+HEURISTICS = {heuristic.name: heuristic for heuristic in (SumOfDistances, PairwiseConflicts, SegmentAware)}
+
+
+def createHeuristic(name, solver):
+    if name not in HEURISTICS:
+        raise ValueError("unknown heuristic: " + str(name) + ", use one of " + ", ".join(HEURISTICS))
+    return HEURISTICS[name](solver)
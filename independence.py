@@ -0,0 +1,205 @@
+from astar import AstarSolver
+from cbs import CbsSolver
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from planArray import PlanArray
+from searchLimits import SearchLimits, SearchStats, SearchStatus
+
+
+class IndependenceDetection:
+    #independence detection (Standley): the agents are split into groups that are planned separately with the joint
+    #A* (AstarSolver), starting from one group per agent, and only the groups that interact are merged.
+    #the combined plan is checked for collisions, swaps and segments over the budget (CbsSolver.findConflict). For two
+    #conflicting groups, one is first planned again on the cells that no other agent visits (a group that shares no
+    #cell with the others adds no cut), a single agent else around the paths of the others, then the other group.
+    #if both fail (or the two groups already conflicted before) they are merged and planned jointly, on the cells of
+    #no other agent when possible. The searches on a subset of the cells give up after REPAIR_NODES expansions.
+    #the segment budget applies to the combined plan, where the cuts of the groups add up, so a group is planned
+    #with the segments the others left first. A plan over the budget is repaired on the first two groups that share
+    #a cell, or else the two groups with the most cuts are merged, so that the joint search can align their cuts.
+    #groups may take detours, the plans are not optimal.
+
+    REPAIR_NODES = 2000 #expansions of a search without the cells of the other groups, before giving up on it
+
+    def __init__(self, mag, heuristic="sum", actions="move", operatorDecomposition=False):
+        self.mag = mag
+        self.heuristic = heuristic
+        self.actions = actions
+        self.operatorDecomposition = operatorDecomposition
+        if mag.index is None:
+            mag.index = CellIndex.fromGraph(mag.graph)
+        if mag.distanceTables is None:
+            mag.distanceTables = DistanceTables(mag.index)
+        self.groups = None #tuples of agents, planned separately
+        self.paths = None #cell id paths, indexed on agent
+        self.planner = None #CbsSolver of the single agent repairs
+        self.status = None
+        self.stats = None
+        self.runtime = 0
+
+    def solve(self, numSegments, timeout=300, limits=None):
+        #outcome in self.status and self.stats, the counters add up those of the searches of all groups
+        if limits is None:
+            limits = SearchLimits(timeout=timeout)
+        self.stats = SearchStats()
+        numAgents = self.mag.num_agents
+        self.groups = [(ag,) for ag in range(numAgents)]
+        self.paths = [None] * numAgents
+        for group in self.groups:
+            status = self.planGroup(group, numSegments, limits)
+            if status != SearchStatus.SOLVED:
+                return self.finish(limits, status)
+        tried = set() #pairs of groups already repaired without merging
+        while True:
+            conflict = self.findConflict(numSegments)
+            if conflict is None:
+                return self.finish(limits, SearchStatus.SOLVED)
+            a, b = conflict
+            status = SearchStatus.NO_PLAN
+            pair = frozenset((a, b))
+            if pair not in tried:
+                tried.add(pair)
+                for group in (b, a):
+                    status = self.repair(group, numSegments, limits)
+                    if status != SearchStatus.NO_PLAN:
+                        break
+            if status == SearchStatus.NO_PLAN:
+                merged = tuple(sorted(a + b))
+                self.groups = [group for group in self.groups if group != a and group != b] + [merged]
+                status = self.planGroup(merged, self.groupBudget(merged, numSegments), limits,
+                                        self.otherCells(merged), IndependenceDetection.REPAIR_NODES)
+                if status == SearchStatus.NO_PLAN:
+                    status = self.planGroup(merged, numSegments, limits)
+            if status != SearchStatus.SOLVED:
+                return self.finish(limits, status)
+
+    def repair(self, group, numSegments, limits):
+        #plans group again on the cells of no other group, or else a single agent around the paths of the others
+        status = self.planGroup(group, self.groupBudget(group, numSegments), limits, self.otherCells(group),
+                                IndependenceDetection.REPAIR_NODES)
+        if status == SearchStatus.NO_PLAN and len(group) == 1 and self.actions == "move":
+            status = self.planAround(group[0])
+        return status
+
+    def finish(self, limits, status):
+        stats = self.stats
+        limits.finish(stats, status, stats.openSize, stats.closedSize)
+        self.status = status
+        self.runtime = stats.elapsed
+        if status == SearchStatus.SOLVED:
+            self.paths = self.combinedPaths()
+        else:
+            self.paths = None
+        return status == SearchStatus.SOLVED
+
+    def planGroup(self, group, numSegments, limits, avoid=None, maxNodes=None):
+        #plans the agents of group jointly, without the cells of avoid (a set of cell ids) if given, and within
+        #maxNodes expansions if given (NO_PLAN past them). The paths of the group are replaced only if a plan is found
+        mag = self.mag
+        sources = [mag.getSource(ag) for ag in group]
+        targets = [mag.getTarget(ag) for ag in group]
+        if avoid is None:
+            index = mag.index
+            distanceTables = mag.distanceTables
+        else:
+            endpoints = mag.index.toIds(sources + targets)
+            if any(cell in avoid for cell in endpoints):
+                return SearchStatus.NO_PLAN
+            index = self.restrictIndex(avoid)
+            distanceTables = DistanceTables(index)
+        solver = AstarSolver(mag.graph, sources, targets, index, self.actions)
+        solver.computeHeuristic(distanceTables, self.heuristic)
+        found = solver.astar(numSegments, None, self.operatorDecomposition, limits.remaining(self.stats, maxNodes))
+        self.stats.add(solver.stats)
+        if found:
+            for i, ag in enumerate(group):
+                self.paths[ag] = mag.index.toIds(solver.getPlan(i))
+        elif (maxNodes is not None and solver.status == SearchStatus.NODE_LIMIT
+              and (limits.maxNodes is None or self.stats.expanded < limits.maxNodes)):
+            return SearchStatus.NO_PLAN
+        return solver.status
+
+    def planAround(self, ag):
+        #plans a single agent around the paths of the others (see CbsSolver.planAgent), sharing as few cells with
+        #them as its shortest paths allow
+        mag = self.mag
+        if self.planner is None:
+            self.planner = CbsSolver(mag.graph, [mag.getSource(other) for other in range(mag.num_agents)],
+                                     [mag.getTarget(other) for other in range(mag.num_agents)], mag.index)
+            self.planner.computeHeuristic(mag.distanceTables)
+        others = self.paths[:ag] + self.paths[ag + 1:]
+        vertex = {(cell, t) for path in others for t, cell in enumerate(path)}
+        edge = {(path[t], path[t - 1], t) for path in others for t in range(1, len(path))} #swaps
+        path = self.planner.planAgent(ag, (vertex, edge), others)
+        if path is None:
+            return SearchStatus.NO_PLAN
+        self.paths[ag] = tuple(path)
+        return SearchStatus.SOLVED
+
+    def restrictIndex(self, removed):
+        #CellIndex of the map without the cells of removed, renumbered
+        index = self.mag.index
+        kept = [cell for cell in range(index.numCells()) if cell not in removed]
+        ids = {cell: i for i, cell in enumerate(kept)}
+        neighbors = [tuple(ids[nb] for nb in index.neighbors[cell] if nb in ids) for cell in kept]
+        return CellIndex([index.cells[cell] for cell in kept], neighbors)
+
+    def groupBudget(self, group, numSegments):
+        #the segments left to group by the cuts of the other groups
+        others = [path for ag, path in enumerate(self.paths) if ag not in group]
+        if not others:
+            return numSegments
+        return max(numSegments - self.countCuts(others), 0)
+
+    def otherCells(self, group):
+        #cells visited by the agents outside of group
+        members = set(group)
+        return {cell for ag, path in enumerate(self.paths) if ag not in members for cell in path}
+
+    def combinedPaths(self):
+        #agents that stay at their target are still there when the other groups move on
+        paths = self.paths
+        if self.actions != "stay":
+            return paths
+        length = max(len(path) for path in paths)
+        return [path + (path[-1],) * (length - len(path)) for path in paths]
+
+    def findConflict(self, numSegments):
+        #(group, group) to repair, None if the combined plan is a solution
+        paths = self.combinedPaths()
+        conflict, count = CbsSolver.findConflict(paths, numSegments)
+        if conflict is None:
+            return None
+        groupOf = {ag: group for group in self.groups for ag in group}
+        a = groupOf[conflict[1]]
+        b = groupOf[conflict[2]]
+        if a != b:
+            return a, b
+        #a cut over the budget within one group, the budget was spent by cuts between groups before
+        shared = self.firstSharedCell(paths, groupOf)
+        if shared is not None:
+            return shared
+        cuts = sorted((self.countCuts([paths[ag] for ag in group]), i) for i, group in enumerate(self.groups))
+        return self.groups[cuts[-1][1]], self.groups[cuts[-2][1]]
+
+    @staticmethod
+    def firstSharedCell(paths, groupOf):
+        #(group, group) of the first agent to enter a cell visited before by an agent of another group
+        visitor = {}
+        for t in range(max(len(path) for path in paths)):
+            for ag, path in enumerate(paths):
+                if t < len(path):
+                    other = visitor.setdefault(path[t], ag)
+                    if groupOf[other] != groupOf[ag]:
+                        return groupOf[other], groupOf[ag]
+        return None
+
+    @staticmethod
+    def countCuts(paths):
+        decomposition = PlanArray.fromPaths(paths).minimalDisjointDecomposition()
+        if decomposition is None:
+            return 0
+        return len(decomposition) - 2
+
+    def getPlan(self, ag):
+        return self.mag.index.toNodes(self.paths[ag])
@@ -0,0 +1,142 @@
+import cProfile
+import math
+from timeit import default_timer as timer
+
+from openList import OpenList
+
+
+class Instrumentation:
+    #opt-in per phase timers and counters of an A* search (AstarSolver.instrumentation). When it is None the solver
+    #runs as is, the only cost is one test per expansion. When set, the open list and the heuristic are replaced by
+    #counting and timing wrappers, and each expansion is timed.
+    #phases: expand (moves, legality checks, new nodes and their hashes), heuristic, open list. Finer detail, e.g.
+    #per function, comes from the cProfile export (profileCall).
+    #counters are derived where possible so that the hot loops are not touched. The children over the segment budget
+    #are counted where getChildren drops them, before any state lookup.
+
+    PHASES = ("expand", "heuristic", "open list")
+
+    def __init__(self):
+        self.times = {phase: 0.0 for phase in Instrumentation.PHASES}
+        self.counters = {"expansions": 0, "combinations": 0, "children": 0, "partial children": 0,
+                         "pruned by segment bound": 0, "heuristic evaluations": 0, "dead ends": 0, "open pushes": 0,
+                         "open pops": 0, "decrease keys": 0, "state lookups": 0, "closed hits": 0, "open hits": 0}
+        self.total = 0.0
+
+    def expansion(self, start, children, moves=None):
+        #an expansion (of a full or partial node) started at time start, that gave children.
+        #moves: the moves of every agent, for the number of joint moves tried (see AstarNode.getAllMoves)
+        self.times["expand"] += timer() - start
+        self.counters["expansions"] += 1
+        if moves is not None:
+            self.counters["combinations"] += math.prod(map(len, moves))
+        for child in children:
+            if child.partial:
+                self.counters["partial children"] += 1
+            else:
+                self.counters["children"] += 1
+
+    def openList(self):
+        return CountingOpenList(self)
+
+    def heuristic(self, heuristic):
+        return TimedHeuristic(heuristic, self)
+
+    def derived(self):
+        #counters computed from the others: joint moves pruned as collisions, swaps or all waits. None with operator
+        #decomposition, where the joint moves are never enumerated
+        counters = self.counters
+        pruned = counters["combinations"] - counters["children"] - counters["pruned by segment bound"]
+        return {"pruned by legality": max(pruned, 0) if counters["combinations"] else None}
+
+    def asDict(self):
+        return {"total": self.total, "times": dict(self.times), "counters": dict(self.counters, **self.derived())}
+
+    def report(self):
+        lines = ["PROFILE:\tphase\tseconds\tshare"]
+        for phase in Instrumentation.PHASES:
+            share = self.times[phase] / self.total if self.total > 0 else 0
+            lines.append("PROFILE:\t" + phase + "\t" + str(round(self.times[phase], 4)) + "\t"
+                         + str(round(100 * share, 1)) + "%")
+        other = self.total - sum(self.times.values())
+        lines.append("PROFILE:\tother\t" + str(round(other, 4)))
+        lines.append("PROFILE:\ttotal\t" + str(round(self.total, 4)))
+        for name, value in list(self.counters.items()) + list(self.derived().items()):
+            lines.append("PROFILE:\t" + name + "\t" + str(value))
+        return "\n".join(lines)
+
+
+class CountingOpenList(OpenList):
+    #OpenList timing and counting its operations
+
+    def __init__(self, instrumentation):
+        super().__init__()
+        self.instrumentation = instrumentation
+
+    def get(self, node):
+        start = timer()
+        record = super().get(node)
+        instrumentation = self.instrumentation
+        instrumentation.counters["state lookups"] += 1
+        if record is not None:
+            instrumentation.counters["closed hits" if record.closed else "open hits"] += 1
+        instrumentation.times["open list"] += timer() - start
+        return record
+
+    def push(self, node, g, h):
+        start = timer()
+        super().push(node, g, h)
+        self.instrumentation.counters["open pushes"] += 1
+        self.instrumentation.times["open list"] += timer() - start
+
+    def pushPartial(self, node):
+        start = timer()
+        super().pushPartial(node)
+        self.instrumentation.counters["open pushes"] += 1
+        self.instrumentation.times["open list"] += timer() - start
+
+    def improve(self, record, parent, g):
+        start = timer()
+        super().improve(record, parent, g)
+        self.instrumentation.counters["decrease keys"] += 1
+        self.instrumentation.times["open list"] += timer() - start
+
+    def addClosed(self, node, g):
+        super().addClosed(node, g)
+        self.instrumentation.counters["dead ends"] += 1
+
+    def pop(self):
+        start = timer()
+        entry = super().pop()
+        self.instrumentation.counters["open pops"] += 1
+        self.instrumentation.times["open list"] += timer() - start
+        return entry
+
+
+class TimedHeuristic:
+    #a heuristic (see heuristics.py) with its evaluations timed and counted
+
+    def __init__(self, heuristic, instrumentation):
+        self.inner = heuristic
+        self.instrumentation = instrumentation
+        self.name = heuristic.name
+
+    def prepare(self, space, numSegments):
+        self.inner.prepare(space, numSegments)
+
+    def value(self, node):
+        start = timer()
+        val = self.inner.value(node)
+        self.instrumentation.counters["heuristic evaluations"] += 1
+        self.instrumentation.times["heuristic"] += timer() - start
+        return val
+
+
+def profileCall(filename, function, *args):
+    #runs function(*args) under cProfile and dumps the stats to filename, in the pstats format read by snakeviz,
+    #gprof2dot or flameprof (which draws flame graphs). Returns the result of the call
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        profiler.dump_stats(filename)
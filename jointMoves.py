@@ -0,0 +1,76 @@
+#legal joint moves of an expansion: one move per agent, without two agents in the same cell (agents that left the
+#graph excepted), two agents swapping cells, or every agent waiting.
+#current: tuple of the cells of the agents (GOAL for agents that left), cells[ag]: tuple of the cells agent ag can
+#move to. foreign[ag]: optional tuple of flags, True for the moves that enter another agent's history, i.e. start a
+#new segment, and allowForeign=False drops the joint moves with such a move.
+#the result is (combinations, flags): the move index of every agent of each legal joint move, and whether it starts
+#a new segment. Agents are added one at a time and a partial joint move is dropped as soon as it collides, swaps or
+#starts a segment over the budget, so the illegal joint moves are never built. The solvers filter fewer than
+#MIN_BATCH joint moves one by one, where the batch costs more than it saves.
+#interrupt: optional function called every INTERRUPT_EVERY partial joint moves, that stops the search by raising
+#SearchInterrupted once a limit is reached (see SearchLimits.interrupt).
+
+from searchLimits import INTERRUPT_EVERY
+
+GOAL = -1
+MIN_BATCH = 32 #fewest joint moves of a batch
+
+
+def legalCombinations(current, cells, foreign=None, allowForeign=True, interrupt=None):
+    #agents whose only move is to leave the graph (or stay gone) never collide, they are left out of the search
+    numAgents = len(cells)
+    if foreign is None:
+        foreign = [(False,) * len(agCells) for agCells in cells]
+    active = [ag for ag in range(numAgents) if cells[ag] != (GOAL,)]
+    gone = [ag for ag in range(numAgents) if cells[ag] == (GOAL,)]
+    combinations = []
+    flags = []
+    startForeign = any(foreign[ag][0] for ag in gone)
+    if startForeign and not allowForeign:
+        return combinations, flags
+    if not active:
+        if any(current[ag] != GOAL for ag in gone):
+            combinations.append((0,) * numAgents)
+            flags.append(startForeign)
+        return combinations, flags
+    chosen = [0] * numAgents
+    taken = {} #cell -> agent moving into it
+    last = len(active) - 1
+    work = [0] #partial joint moves since the last interrupt call
+
+    def extend(depth, isForeign, moving):
+        #moving: an agent before depth does not wait
+        if interrupt is not None:
+            work[0] += 1
+            if work[0] >= INTERRUPT_EVERY:
+                work[0] = 0
+                interrupt()
+        ag = active[depth]
+        cell = current[ag]
+        agForeign = foreign[ag]
+        for i, nxt in enumerate(cells[ag]):
+            moveForeign = isForeign or agForeign[i]
+            if moveForeign and not allowForeign:
+                continue
+            if nxt != GOAL:
+                if nxt in taken: #collision
+                    continue
+                if cell != GOAL:
+                    other = taken.get(cell)
+                    if other is not None and current[other] == nxt: #swap
+                        continue
+            chosen[ag] = i
+            if depth == last:
+                if moving or nxt != cell:
+                    combinations.append(tuple(chosen))
+                    flags.append(moveForeign)
+                continue
+            if nxt == GOAL:
+                extend(depth + 1, moveForeign, True)
+            else:
+                taken[nxt] = ag
+                extend(depth + 1, moveForeign, moving or nxt != cell)
+                del taken[nxt]
+
+    extend(0, startForeign, any(current[ag] != GOAL for ag in gone))
+    return combinations, flags
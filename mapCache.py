@@ -0,0 +1,146 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from array import array
+
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from gridGraph import GridGraph
+
+
+class MapCache:
+    #directory of compiled maps, keyed by the hash of the .map file contents.
+    #each map gets a sub directory holding:
+    #  grid.bin: header, cell coordinates, and the adjacency in CSR form (indptr, indices)
+    #  dist-<cell id>.bin: distance table of one target cell (see DistanceTables)
+    #all files are flat native int32 arrays that are memory mapped read-only, so concurrent
+    #processes share them. Files are written to a temporary name and renamed, readers never see partial files.
+    #loaded maps are also kept in memory, so a process that plans many instances compiles each map once.
+    #directory None keeps the maps in memory only.
+
+    MAGIC = 0x454D4731 #also detects files written with another byte order
+    ENV_VAR = "EXPLAINABLE_MAPF_CACHE"
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.loaded = {}
+
+    @staticmethod
+    def fromEnvironment():
+        #the cache named by the EXPLAINABLE_MAPF_CACHE environment variable, None if it is not set
+        directory = os.environ.get(MapCache.ENV_VAR)
+        if not directory:
+            return None
+        return MapCache(directory)
+
+    @staticmethod
+    def mapKey(filename):
+        with open(filename, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def load(self, filename):
+        #the CompiledMap of a .map file, compiled and stored on a cache miss
+        key = MapCache.mapKey(filename)
+        compiled = self.loaded.get(key)
+        if compiled is not None:
+            return compiled
+        if self.directory is None:
+            import MultiAgentGraph
+            graph = MultiAgentGraph.MultiAgentGraph.readGraphFile(filename)
+            compiled = CompiledMap(key, graph, DistanceTables(graph.index))
+        else:
+            mapDir = os.path.join(self.directory, key)
+            graph = self.readGrid(os.path.join(mapDir, "grid.bin"))
+            if graph is None:
+                import MultiAgentGraph #only needed to compile a map that is not cached yet
+                graph = MultiAgentGraph.MultiAgentGraph.readGraphFile(filename)
+                os.makedirs(mapDir, exist_ok=True)
+                self.writeGrid(os.path.join(mapDir, "grid.bin"), graph)
+            compiled = CompiledMap(key, graph, DistanceTables(graph.index, DistanceStore(mapDir, graph.number_of_nodes())))
+        self.loaded[key] = compiled
+        return compiled
+
+    @staticmethod
+    def readGrid(path):
+        data = readInts(path)
+        if data is None or len(data) < 3 or data[0] != MapCache.MAGIC:
+            return None
+        numCells, numEdges = data[1], data[2]
+        if len(data) != 3 + 2 * numCells + numCells + 1 + numEdges:
+            return None
+        coords = data[3:3 + 2 * numCells]
+        indptr = data[3 + 2 * numCells:4 + 3 * numCells]
+        indices = data[4 + 3 * numCells:]
+        cells = list(zip(coords[0::2], coords[1::2]))
+        neighbors = [tuple(indices[indptr[i]:indptr[i + 1]]) for i in range(numCells)]
+        return GridGraph(CellIndex(cells, neighbors))
+
+    @staticmethod
+    def writeGrid(path, graph):
+        data = array('i', [MapCache.MAGIC, graph.number_of_nodes(), graph.number_of_edges()])
+        for x, y in graph.index.cells:
+            data.append(x)
+            data.append(y)
+        data.extend(graph.indptr)
+        data.extend(graph.indices)
+        writeInts(path, data)
+
+
+class CompiledMap:
+    #a map loaded from a MapCache: its GridGraph, cell index and persistent distance tables
+
+    def __init__(self, key, graph, distanceTables):
+        self.key = key
+        self.graph = graph
+        self.index = graph.index
+        self.distanceTables = distanceTables
+
+
+class DistanceStore:
+    #storage of the distance tables of one map in its cache directory
+
+    def __init__(self, directory, numCells):
+        self.directory = directory
+        self.numCells = numCells
+
+    def path(self, target):
+        return os.path.join(self.directory, "dist-" + str(target) + ".bin")
+
+    def load(self, target):
+        data = readInts(self.path(target))
+        if data is None or len(data) != self.numCells + 1 or data[0] != MapCache.MAGIC:
+            return None
+        return data[1:]
+
+    def save(self, target, table):
+        data = array('i', [MapCache.MAGIC])
+        data.extend(table)
+        writeInts(self.path(target), data)
+
+
+def readInts(path):
+    #memory maps a file of native int32, None if it is missing or empty
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+    if len(mapped) % 4 != 0:
+        return None
+    return memoryview(mapped).cast('i')
+
+
+def writeInts(path, data):
+    directory = os.path.dirname(path)
+    fd, tmpPath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            data.tofile(f)
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
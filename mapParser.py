@@ -0,0 +1,66 @@
+import itertools
+
+from gridGraph import GridGraph
+
+
+#parsers of the MovingAI map and scenario files.
+#.map: a header of "type", "height <h>", "width <w>" lines, then "map" and one row of characters per line,
+#where @ is an obstacle (every other character is a free cell, as in readGraphFile so far).
+#.scen: a "version" line, then one tab separated row per agent: bucket, map, width, height, start x, start y,
+#goal x, goal y, optimal length. Rows are read lazily, only up to the requested number of agents.
+
+BLOCKED = b"@"
+FREE_TABLE = bytes(0 if c in BLOCKED else 1 for c in range(256)) #map character -> free flag
+
+
+def readHeader(f):
+    #(width, height) of the header of an open binary .map file, which is left at the first row
+    fields = {}
+    for line in f:
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == b"map":
+            break
+        if len(words) > 1:
+            fields[words[0]] = words[1]
+    if b"width" not in fields or b"height" not in fields:
+        raise ValueError("map file without width or height: " + str(f.name))
+    return int(fields[b"width"]), int(fields[b"height"])
+
+
+def readMask(filename):
+    #(width, height, mask): mask holds width * height free flags in row order (mask[j * width + i] for cell (i, j)),
+    #made by translating the rows of the file, without a per cell loop
+    with open(filename, "rb") as f:
+        width, height = readHeader(f)
+        rows = f.read().split(b"\n")
+    rows = [row.rstrip(b"\r") for row in rows[:height]]
+    if len(rows) < height or min(len(row) for row in rows) < width:
+        raise ValueError("map file with fewer than " + str(height) + " rows of " + str(width) + " cells: " + filename)
+    mask = b"".join(row[:width] for row in rows).translate(FREE_TABLE)
+    return width, height, mask
+
+
+def readGraph(filename):
+    #the GridGraph of the free cells of a .map file
+    width, height, mask = readMask(filename)
+    return GridGraph.fromMask(width, height, mask)
+
+
+def iterScenario(filename, count=None):
+    #((start x, start y), (goal x, goal y)) of the first count rows of a .scen file (all of them if count is None),
+    #read one line at a time. Blank and short lines are skipped, and do not count as rows
+    with open(filename) as f:
+        f.readline() #version
+        rows = (dat for dat in map(str.split, f) if len(dat) >= 8)
+        for dat in itertools.islice(rows, count):
+            yield (int(dat[4]), int(dat[5])), (int(dat[6]), int(dat[7]))
+
+
+def readScenario(filename, count):
+    #the first count rows of a .scen file, see iterScenario
+    rows = list(iterScenario(filename, count))
+    if len(rows) < count:
+        raise ValueError("scenario file with fewer than " + str(count) + " agents: " + filename)
+    return rows
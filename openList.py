@@ -0,0 +1,128 @@
+import heapq
+
+
+class StateRecord:
+    #what the search knows about a state: the node reached with the best g so far (its parent gives the plan),
+    #its heuristic, its open list key (None once closed) and whether it is closed
+
+    __slots__ = ('node', 'g', 'h', 'key', 'closed')
+
+    def __init__(self, node, g, h, key, closed=False):
+        self.node = node
+        self.g = g
+        self.h = h
+        self.key = key
+        self.closed = closed
+
+
+class OpenList:
+    #bucketed priority queue of the search nodes, and the single state -> StateRecord table of open and closed states.
+    #nodes are ordered on the key (f, h, segments): lowest f, then deepest (lowest h), then fewest segments, and within
+    #a key last in first out, so the children of the last expanded node come first. Each key has a bucket (a stack)
+    #and only the distinct keys are in a heap, so pushing into an existing bucket and popping are O(1).
+    #a state reached again with a lower g is moved to its new bucket, the entry in its old bucket becomes stale and is
+    #skipped when popped. Partial nodes (operator decomposition) have no state and are never deduplicated.
+    #subclasses can order the nodes on another key, see key (e.g. hdaStar.TimestepsOpenList).
+
+    def __init__(self):
+        self.buckets = {} #key -> stack of nodes
+        self.keys = [] #heap of the keys of the buckets
+        self.states = {} #node -> StateRecord
+        self.openCount = 0
+        self.closedCount = 0
+
+    def __len__(self):
+        return self.openCount
+
+    def get(self, node):
+        return self.states.get(node)
+
+    def insert(self, key, node):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = [node]
+            heapq.heappush(self.keys, key)
+        else:
+            bucket.append(node)
+
+    def key(self, node, g, h):
+        #open list key of a node reached with cost g
+        return (g + h, h, node.segments)
+
+    def push(self, node, g, h):
+        #a state seen for the first time, see get
+        key = self.key(node, g, h)
+        self.states[node] = StateRecord(node, g, h, key)
+        self.insert(key, node)
+        self.openCount += 1
+
+    def pushPartial(self, node):
+        self.insert(self.key(node, node.g, node.h), node)
+        self.openCount += 1
+
+    def improve(self, record, parent, g):
+        #re-parents an open state reached with a lower g and moves it to its new bucket
+        record.node.parent = parent
+        record.g = g
+        record.key = self.key(record.node, g, record.h)
+        self.insert(record.key, record.node)
+
+    def improveClosed(self, record, parent, g):
+        #a closed state reached with a lower g: the serial search never reopens it (see anytime.AnytimeOpenList)
+        pass
+
+    def reopen(self, record, parent, g):
+        #a closed state reached with a lower g, opened again (see hdaStar and anytime.AnytimeOpenList)
+        record.closed = False
+        self.closedCount -= 1
+        self.openCount += 1
+        self.improve(record, parent, g)
+
+    def close(self, record):
+        record.closed = True
+        record.key = None
+        self.closedCount += 1
+
+    def addClosed(self, node, g):
+        #a state that must never be opened, e.g. a dead end
+        self.states[node] = StateRecord(node, g, None, None, True)
+        self.closedCount += 1
+
+    def peek(self):
+        #key of the best open node, None if the list is empty. Stale entries on top are dropped
+        keys = self.keys
+        buckets = self.buckets
+        while keys:
+            key = keys[0]
+            bucket = buckets[key]
+            if not bucket:
+                heapq.heappop(keys)
+                del buckets[key]
+                continue
+            node = bucket[-1]
+            if node.partial or self.states[node].key == key:
+                return key
+            bucket.pop()
+        return None
+
+    def pop(self):
+        #(f, node, record) of the best open node, record is None for a partial node. None if the list is empty
+        keys = self.keys
+        buckets = self.buckets
+        while keys:
+            key = keys[0]
+            bucket = buckets[key]
+            if not bucket:
+                heapq.heappop(keys)
+                del buckets[key]
+                continue
+            node = bucket.pop()
+            if node.partial:
+                self.openCount -= 1
+                return key[0], node, None
+            record = self.states[node]
+            if record.key != key: #stale entry of a re-parented or closed state
+                continue
+            self.openCount -= 1
+            return key[0], node, record
+        return None
@@ -0,0 +1,78 @@
+import multiprocessing
+from array import array
+
+
+class PlanArray:
+    #the plans of several agents as one agents x T array of integer cell ids (row major, in a flat array('i')),
+    #T being the length of the longest plan. An agent that reached its target disappears, its row is padded with PAD.
+
+    PAD = -1
+
+    def __init__(self, cells, numAgents, length):
+        self.cells = cells
+        self.numAgents = numAgents
+        self.length = length
+
+    @staticmethod
+    def fromPaths(paths, ids=None):
+        #paths: list of plans, each a list of cells (any hashable, e.g. (x, y) tuples).
+        #ids: optional dict from cell to id (e.g. CellIndex.ids), otherwise ids are given in order of appearance
+        if ids is None:
+            ids = {}
+            for path in paths:
+                for cell in path:
+                    if cell not in ids:
+                        ids[cell] = len(ids)
+        length = max((len(path) for path in paths), default=0)
+        cells = array('i')
+        for path in paths:
+            cells.extend(ids[cell] for cell in path)
+            cells.extend([PlanArray.PAD] * (length - len(path)))
+        return PlanArray(cells, len(paths), length)
+
+    def column(self, t):
+        #the cells of the agents at timestep t
+        return self.cells[t::self.length] if self.length > 0 else self.cells
+
+    def hasCollision(self):
+        #True if two agents are in the same cell at the same timestep
+        for t in range(self.length):
+            occupied = [cell for cell in self.column(t) if cell != PlanArray.PAD]
+            if len(set(occupied)) != len(occupied):
+                return True
+        return False
+
+    def minimalDisjointDecomposition(self):
+        #cut timesteps [0, t1, ..., T + 1] such that within each part [t_k, t_k+1) no cell is visited by two agents,
+        #cuts being made as late as possible. None if the plans collide.
+        #one sweep over the timesteps: owners maps each cell visited since the last cut to its agent, a cut is made
+        #at the first timestep where an agent enters a cell owned by another agent, and the new part starts there.
+        if self.hasCollision():
+            return None
+        decomposition = [0]
+        owners = {}
+        for t in range(self.length):
+            column = self.column(t)
+            for ag, cell in enumerate(column):
+                if cell != PlanArray.PAD and owners.get(cell, ag) != ag:
+                    decomposition.append(t)
+                    owners = {}
+                    break
+            for ag, cell in enumerate(column):
+                if cell != PlanArray.PAD:
+                    owners[cell] = ag
+        decomposition.append(self.length + 1)
+        return decomposition
+
+
+def decomposePaths(paths):
+    return PlanArray.fromPaths(paths).minimalDisjointDecomposition()
+
+
+def decomposeAll(pathsList, processes=1):
+    #minimal disjoint decompositions of many plan sets (each a list of paths), in order.
+    #processes > 1 spreads them over a process pool, None uses one process per CPU
+    if processes == 1:
+        return [decomposePaths(paths) for paths in pathsList]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(decomposePaths, pathsList, chunksize=16)
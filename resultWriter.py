@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+
+
+#structured result output, one record (see BenchTester.resultRecord) per planned instance.
+#jsonl: one JSON object per line, with the full plans.
+#csv/tsv: one row per instance with the SUMMARY_FIELDS, plans left out and the decomposition space separated.
+#(other record kinds, e.g. of cbsPlans, give their own fields)
+#every record is written and flushed on its own, so a sweep never holds its results in memory.
+
+FORMATS = ("jsonl", "csv", "tsv")
+KEY_FIELDS = ["map", "scen", "agents", "max_decomp_parts"]
+SUMMARY_FIELDS = KEY_FIELDS + ["status", "found", "decomp_parts", "makespan", "runtime", "expanded", "generated",
+                               "peak_open", "peak_closed", "peak_rss", "decomposition"]
+
+
+class JsonlWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+class TableWriter:
+    def __init__(self, stream, delimiter=",", header=True, fields=SUMMARY_FIELDS):
+        self.stream = stream
+        self.fields = fields
+        self.writer = csv.writer(stream, delimiter=delimiter, lineterminator="\n")
+        if header:
+            self.writer.writerow(fields)
+            self.stream.flush()
+
+    def write(self, record):
+        row = []
+        for field in self.fields:
+            val = record.get(field)
+            if val is None:
+                val = ""
+            elif field == "decomposition":
+                val = " ".join(str(t) for t in val)
+            row.append(val)
+        self.writer.writerow(row)
+        self.stream.flush()
+
+
+def createWriter(stream, fmt, header=True, fields=SUMMARY_FIELDS):
+    #header: whether a table starts with the column names, False when appending to an existing table
+    if fmt == "jsonl":
+        return JsonlWriter(stream)
+    if fmt == "csv":
+        return TableWriter(stream, ",", header, fields)
+    if fmt == "tsv":
+        return TableWriter(stream, "\t", header, fields)
+    raise ValueError("unknown result format: " + str(fmt))
+
+
+def emptyRecord(mapFile, scen, numAgents, maxDecompParts, status, runtime):
+    #record of an instance that ended without a result from the planner (e.g. it was killed)
+    record = {field: None for field in SUMMARY_FIELDS}
+    record.update({"map": mapFile, "scen": scen, "agents": numAgents, "max_decomp_parts": maxDecompParts,
+                   "status": status, "found": False, "runtime": runtime, "plans": None})
+    return record
+
+
+def recordKey(record):
+    return tuple(str(record[field]) for field in KEY_FIELDS)
+
+
+def readKeys(path, fmt, retry=()):
+    #keys of the instances already in a result file, empty if it does not exist.
+    #retry: statuses of the records that do not count, e.g. errors that should be planned again
+    keys = set()
+    if not os.path.exists(path):
+        return keys
+    with open(path, newline="") as f:
+        if fmt == "jsonl":
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record["status"] not in retry:
+                        keys.add(recordKey(record))
+                except (ValueError, KeyError): #a line cut by an interruption
+                    continue
+        else:
+            for row in csv.DictReader(f, delimiter="\t" if fmt == "tsv" else ","):
+                if all(row.get(field) for field in KEY_FIELDS) and row.get("status") and row["status"] not in retry:
+                    keys.add(recordKey(row))
+    return keys
+
+
+def openAppend(path):
+    #opens a result file for appending, with a flag telling if it is empty (i.e. a table needs its header).
+    #a last line cut by an interruption is ended first, so it does not merge with the next record
+    isNew = not os.path.exists(path) or os.path.getsize(path) == 0
+    cut = False
+    if not isNew:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            cut = f.read(1) != b"\n"
+    stream = open(path, "a", newline="")
+    if cut:
+        stream.write("\n")
+    return stream, isNew
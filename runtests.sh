@@ -8,7 +8,7 @@ while IFS= read -r line
 do
   ##printf 'Working on %s file...\n' "$line"
   ##echo "python ExplainablePlanning.py" "$line" "$timeout"
-  runstring="ExplainablePlanning.py $line $timeout"
+  runstring="ExplainablePlanning.py $line $timeout --cache-dir .mapcache"
   echo $runstring
   python3 $runstring
 done < "$input"
@@ -0,0 +1,253 @@
+import sys
+from timeit import default_timer as timer
+
+try:
+    import resource
+except ImportError: #not available on Windows, memory is then neither measured nor limited
+    resource = None
+
+
+class SearchStatus:
+    SOLVED = "solved"
+    NO_PLAN = "no-plan" #the whole search space was explored
+    INCOMPLETE = "incomplete" #an incomplete search ran out of options without a plan, there may still be one
+    TIMEOUT = "timeout"
+    NODE_LIMIT = "node-limit"
+    MEMORY_LIMIT = "memory-limit"
+    ERROR = "error" #the planner raised an exception or its process died, see batchRunner
+
+
+INTERRUPT_EVERY = 4096 #units of work (joint moves, generated nodes) between the limit checks inside an expansion
+MEMORY_RESERVE = 256 #MB, a search stops with MEMORY_LIMIT when less memory than this is left to the process
+RESERVE_SHARE = 0.1 #share of a memory ceiling kept free when it is below MEMORY_RESERVE / RESERVE_SHARE
+
+
+class SearchInterrupted(Exception):
+    #a limit reached in the middle of an expansion, see SearchLimits.interrupt
+
+    def __init__(self, status):
+        Exception.__init__(self, status)
+        self.status = status
+
+
+def currentRss():
+    #resident set size of this process in MB, None if unknown
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, AttributeError, IndexError, ValueError):
+        return peakRss()
+
+
+def readNumber(filename, field=0):
+    #the field-th number of a file, None if it cannot be read
+    try:
+        with open(filename) as f:
+            return int(f.read().split()[field])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def memoryCeilings():
+    #(RLIMIT_AS, cgroup memory.max) of this process in MB, each None if unlimited or unknown. They do not change during
+    #a search, so SearchLimits reads them once
+    addressSpace = None
+    if resource is not None:
+        limit = resource.getrlimit(resource.RLIMIT_AS)[0]
+        if limit != resource.RLIM_INFINITY:
+            addressSpace = limit / (1024 * 1024)
+    cgroup = readNumber("/sys/fs/cgroup/memory.max") #"max" without a limit
+    if cgroup is not None:
+        cgroup /= 1024 * 1024
+    return addressSpace, cgroup
+
+
+def memoryReserve(ceiling):
+    #MB kept free under a memory ceiling of this many MB: MEMORY_RESERVE, or a share of a small ceiling, so that a
+    #process under a small cap is not stopped as soon as it starts
+    return min(MEMORY_RESERVE, ceiling * RESERVE_SHARE)
+
+
+def addressSpaceSize():
+    #address space of this process in MB, None if unknown
+    size = readNumber("/proc/self/statm")
+    if size is None or resource is None:
+        return None
+    return size * resource.getpagesize() / (1024 * 1024)
+
+
+def addressSpaceCeiling(extra):
+    #RLIMIT_AS that lets this process grow by extra MB of address space before memoryHeadroom stops a search, with
+    #the memoryReserve of the ceiling above that for the allocations between two limit checks. None if the size of
+    #the process is unknown
+    size = addressSpaceSize()
+    if size is None:
+        return None
+    return min((size + extra) / (1 - RESERVE_SHARE), size + extra + MEMORY_RESERVE)
+
+
+def memoryHeadroom(ceilings, system=True):
+    #MB this process can still allocate before it is within the memoryReserve of one of its ceilings: the address
+    #space under its RLIMIT_AS and the memory under its cgroup limit (ceilings, see memoryCeilings), and if system,
+    #the memory available on the system. None if none of them is known.
+    #a search stopped at that point reports MEMORY_LIMIT instead of an uncaught MemoryError or being killed
+    addressSpace, cgroup = ceilings
+    left = []
+    if addressSpace is not None:
+        size = addressSpaceSize()
+        if size is not None:
+            left.append(addressSpace - size - memoryReserve(addressSpace))
+    if cgroup is not None:
+        current = readNumber("/sys/fs/cgroup/memory.current")
+        if current is not None:
+            left.append(cgroup - current / (1024 * 1024) - memoryReserve(cgroup))
+    if system:
+        available = total = None
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemTotal:"):
+                        total = int(line.split()[1]) / 1024
+                    elif line.startswith("MemAvailable:"):
+                        available = int(line.split()[1]) / 1024
+        except (OSError, IndexError, ValueError):
+            pass
+        if available is not None:
+            left.append(available - memoryReserve(total if total is not None else available))
+    return min(left) if left else None
+
+
+def peakRss():
+    #peak resident set size of this process in MB, None if unknown
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin": #bytes on macOS, kilobytes elsewhere
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class SearchStats:
+    #live counters of a search, updated by the solver and refreshed at every limit check
+
+    def __init__(self):
+        self.status = None
+        self.expanded = 0
+        self.generated = 0
+        self.openSize = 0
+        self.closedSize = 0
+        self.peakOpenSize = 0
+        self.peakClosedSize = 0
+        self.bestF = None
+        self.peakRss = None
+        self.startTime = timer()
+        self.elapsed = 0
+
+    def expansionsPerSec(self):
+        if self.elapsed <= 0:
+            return 0
+        return self.expanded / self.elapsed
+
+    def __str__(self):
+        return ("expanded: " + str(self.expanded) + ", generated: " + str(self.generated)
+                + ", open: " + str(self.openSize) + ", closed: " + str(self.closedSize)
+                + ", expansions/sec: " + str(int(self.expansionsPerSec())) + ", best f: " + str(self.bestF)
+                + ", peak RSS (MB): " + str(self.peakRss) + ", elapsed: " + str(round(self.elapsed, 3)))
+
+    def updateSizes(self, openSize, closedSize):
+        self.openSize = openSize
+        self.closedSize = closedSize
+        self.peakOpenSize = max(self.peakOpenSize, openSize)
+        self.peakClosedSize = max(self.peakClosedSize, closedSize)
+
+    def add(self, other):
+        #counts the stats of a search run as part of this one (e.g. one of several searches), after those so far
+        self.expanded += other.expanded
+        self.generated += other.generated
+        self.updateSizes(other.openSize, other.closedSize)
+        self.peakOpenSize = max(self.peakOpenSize, other.peakOpenSize)
+        self.peakClosedSize = max(self.peakClosedSize, other.peakClosedSize)
+        self.elapsed = other.startTime + other.elapsed - self.startTime
+
+
+class SearchLimits:
+    #wall clock, expanded node and memory limits of a search, checked every checkEvery expansions.
+    #an expansion of many agents can generate millions of children, so the wall clock and memory limits are also
+    #checked inside it, every INTERRUPT_EVERY units of work (see interrupt). A search also stops before the process
+    #runs out of memory under its address space or cgroup limit, see memoryHeadroom. The memory available on the
+    #system, which depends on the other processes, is only used when there is neither maxMemory nor a cgroup limit.
+    #timeout is in seconds and maxMemory in MB, None means no limit.
+    #progress: optional function called with the SearchStats at every check.
+
+    def __init__(self, timeout=None, maxNodes=None, maxMemory=None, checkEvery=1000, progress=None):
+        self.timeout = timeout
+        self.maxNodes = maxNodes
+        self.maxMemory = maxMemory
+        self.checkEvery = checkEvery
+        self.progress = progress
+        self.ceilings = None #memoryCeilings, read at the first check
+
+    def nextCheck(self, stats):
+        #number of expansions at which check must be called next
+        nxt = stats.expanded + self.checkEvery
+        if self.maxNodes is not None and self.maxNodes < nxt:
+            return self.maxNodes
+        return nxt
+
+    def remaining(self, stats, maxNodes=None):
+        #the limits left to a further search after the ones counted in stats, with at most maxNodes expansions if given
+        timeout = None
+        if self.timeout is not None:
+            timeout = max(self.timeout - (timer() - stats.startTime), 0)
+        if self.maxNodes is not None:
+            left = max(self.maxNodes - stats.expanded, 0)
+            maxNodes = left if maxNodes is None else min(maxNodes, left)
+        limits = SearchLimits(timeout, maxNodes, self.maxMemory, self.checkEvery, self.progress)
+        limits.ceilings = self.ceilings
+        return limits
+
+    def headroom(self):
+        #memoryHeadroom of the process under these limits
+        if self.ceilings is None:
+            self.ceilings = memoryCeilings()
+        return memoryHeadroom(self.ceilings, self.maxMemory is None and self.ceilings[1] is None)
+
+    def check(self, stats, openSize, closedSize):
+        #returns the status the search must stop with, or None to continue
+        stats.updateSizes(openSize, closedSize)
+        stats.elapsed = timer() - stats.startTime
+        rss = currentRss()
+        stats.peakRss = peakRss()
+        if self.progress is not None:
+            self.progress(stats)
+        if self.timeout is not None and stats.elapsed > self.timeout:
+            return SearchStatus.TIMEOUT
+        if self.maxNodes is not None and stats.expanded >= self.maxNodes:
+            return SearchStatus.NODE_LIMIT
+        if self.maxMemory is not None and rss is not None and rss > self.maxMemory:
+            return SearchStatus.MEMORY_LIMIT
+        headroom = self.headroom()
+        if headroom is not None and headroom < 0:
+            return SearchStatus.MEMORY_LIMIT
+        return None
+
+    def interrupt(self, stats):
+        #raises SearchInterrupted if the timeout or memory limit is reached
+        stats.elapsed = timer() - stats.startTime
+        if self.timeout is not None and stats.elapsed > self.timeout:
+            raise SearchInterrupted(SearchStatus.TIMEOUT)
+        if self.maxMemory is not None:
+            rss = currentRss()
+            if rss is not None and rss > self.maxMemory:
+                raise SearchInterrupted(SearchStatus.MEMORY_LIMIT)
+        headroom = self.headroom()
+        if headroom is not None and headroom < 0:
+            raise SearchInterrupted(SearchStatus.MEMORY_LIMIT)
+
+    def finish(self, stats, status, openSize, closedSize):
+        stats.status = status
+        stats.updateSizes(openSize, closedSize)
+        stats.elapsed = timer() - stats.startTime
+        stats.peakRss = peakRss()
+        return stats
@@ -0,0 +1,127 @@
+import functools
+import operator
+import random
+from array import array
+
+
+class SingleSets(dict):
+    #lazily built one-cell sets, keyed by cell id (GOAL cells, i.e. negative ids, give empty sets)
+
+    def __init__(self, space):
+        super().__init__()
+        self.space = space
+
+    def __missing__(self, cell):
+        cellSet = None if cell < 0 else self.space.insert(None, cell, 0)
+        self[cell] = cellSet
+        return cellSet
+
+
+class HistorySpace:
+    #persistent sets of cell ids, used for the cells each agent visited in the current segment.
+    #a set is the root of a trie of tuples with BRANCH_SIZE children, whose leaves are bitsets (None for an
+    #empty subtree). Sets are never modified: adding a cell copies only the path to its leaf and shares the rest.
+    #maps of up to FLAT_CELLS cells use a single leaf, i.e. a plain bitset of the whole map.
+    #the space also holds the Zobrist keys of the (cell, agent) pairs, the hash of a set is the xor of its keys.
+
+    FLAT_CELLS = 4096
+    LEAF_BITS = 6
+    BRANCH_BITS = 5
+    BRANCH_SIZE = 1 << BRANCH_BITS
+
+    def __init__(self, numCells, numAgents, seed=0):
+        self.numAgents = numAgents
+        if numCells <= HistorySpace.FLAT_CELLS:
+            self.leafBits = max(numCells - 1, 0).bit_length()
+            levels = 0
+        else:
+            self.leafBits = HistorySpace.LEAF_BITS
+            levels = 0
+            while 1 << (self.leafBits + HistorySpace.BRANCH_BITS * levels) < numCells:
+                levels += 1
+        self.leafMask = (1 << self.leafBits) - 1
+        #shifts[level]: shift of the cell id giving the child index in an interior node of that level
+        self.shifts = tuple(self.leafBits + HistorySpace.BRANCH_BITS * (levels - 1 - level) for level in range(levels))
+        self.keys = array('Q')
+        self.keys.frombytes(random.Random(seed).randbytes(8 * numCells * numAgents))
+        self.singleSets = SingleSets(self)
+
+    def key(self, cell, ag):
+        return self.keys[cell * self.numAgents + ag]
+
+    def contains(self, cellSet, cell):
+        node = cellSet
+        for shift in self.shifts:
+            if node is None:
+                return False
+            node = node[(cell >> shift) & (HistorySpace.BRANCH_SIZE - 1)]
+        return node is not None and node >> (cell & self.leafMask) & 1 == 1
+
+    def owners(self, history, cells):
+        #owner agent of each of the given cells in a history (a tuple of sets indexed on agent),
+        #cells visited by no agent are left out. Sets of one segment are disjoint, so owners are unique.
+        owners = {}
+        if not self.shifts:
+            query = 0
+            for cell in cells:
+                query |= 1 << cell
+            for ag, cellSet in enumerate(history):
+                hits = (cellSet or 0) & query
+                while hits:
+                    low = hits & -hits
+                    owners[low.bit_length() - 1] = ag
+                    hits ^= low
+        else:
+            for cell in cells:
+                for ag, cellSet in enumerate(history):
+                    if self.contains(cellSet, cell):
+                        owners[cell] = ag
+                        break
+        return owners
+
+    def add(self, cellSet, cell):
+        if not self.shifts:
+            return (cellSet or 0) | (1 << cell)
+        return self.insert(cellSet, cell, 0)
+
+    def isSubset(self, cellSet, other, level=0):
+        #True if every cell of cellSet is in other, shared subtrees are skipped
+        if cellSet is other or not cellSet:
+            return True
+        if other is None:
+            return False
+        if level == len(self.shifts):
+            return cellSet & ~other == 0
+        return all(self.isSubset(cellSet[i], other[i], level + 1) for i in range(HistorySpace.BRANCH_SIZE))
+
+    def singles(self, cells):
+        #a history holding only the given cells, one per agent
+        return tuple(map(self.singleSets.__getitem__, cells))
+
+    def hashOf(self, history):
+        #per agent Zobrist hashes of a history, computed from scratch
+        return tuple(functools.reduce(operator.xor, [self.key(cell, ag) for cell in self.cells(cellSet)], 0)
+                     for ag, cellSet in enumerate(history))
+
+    def insert(self, node, cell, level):
+        if level == len(self.shifts):
+            return (node or 0) | (1 << (cell & self.leafMask))
+        if node is None:
+            node = (None,) * HistorySpace.BRANCH_SIZE
+        i = (cell >> self.shifts[level]) & (HistorySpace.BRANCH_SIZE - 1)
+        return node[:i] + (self.insert(node[i], cell, level + 1),) + node[i + 1:]
+
+    def cells(self, cellSet):
+        #the sorted cell ids of a set
+        result = []
+        stack = [(cellSet, 0, 0)]
+        while stack:
+            node, prefix, level = stack.pop()
+            if node is None:
+                continue
+            if level < len(self.shifts):
+                for i in range(len(node)):
+                    stack.append((node[i], (prefix << HistorySpace.BRANCH_BITS) | i, level + 1))
+            else:
+                result.extend((prefix << self.leafBits) | bit for bit in range(self.leafMask + 1) if node >> bit & 1)
+        return sorted(result)
@@ -0,0 +1,175 @@
+import contextlib
+import io
+import multiprocessing
+from multiprocessing.connection import wait
+from timeit import default_timer as timer
+
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from planArray import PlanArray
+from searchLimits import SearchStatus
+
+
+class SegmentSweep:
+    #finds a plan of a MultiAgentGraph with the fewest decomposition parts, planning several part budgets at once.
+    #the plain A* plan (astarNoHist), decomposed, gives a first upper bound. That search lets agents wait, so its plan
+    #is only kept if the action model allows it: always under wait, under move if no agent waits, never under stay
+    #(agents would stay at their targets). It runs for at most SEED_SHARE of the timeout, under the node and memory
+    #limits of the sweep, and its stats are those of the result when its plan is the best one. A seed plan over maxParts
+    #parts is not a result: only its number of parts is kept (upperBound), to cancel the budgets at or above it.
+    #budgets below it are planned in worker processes (smallest first), which inherit the map, the cell index and the
+    #distance tables from this process.
+    #a plan found with some budget cancels the budgets at or above its number of parts, and a budget whose search
+    #space is exhausted without a plan cancels the smaller budgets, as they cannot have a plan either.
+
+    TIMEOUT_GRACE = 5 #seconds after the timeout at which workers that did not stop are terminated
+    SEED_SHARE = 0.25 #share of the timeout given to the plain A* plan
+
+    def __init__(self, mag, maxParts, timeout=300, operatorDecomposition=False, maxNodes=None, maxMemory=None,
+                 processes=None, seed=True, heuristic="sum", actions="move"):
+        self.mag = mag
+        self.maxParts = maxParts
+        self.timeout = timeout
+        self.operatorDecomposition = operatorDecomposition
+        self.maxNodes = maxNodes
+        self.maxMemory = maxMemory
+        self.processes = processes or multiprocessing.cpu_count()
+        self.seed = seed
+        self.heuristic = heuristic
+        self.actions = actions
+        self.bestParts = None
+        self.bestPlans = None
+        self.bestStats = None
+        self.upperBound = None #parts of a plan known to exist, possibly over maxParts
+        self.lowerBound = 1 #no plan has fewer parts
+        self.status = None
+        self.runtime = 0
+
+    def prepare(self):
+        #builds the cell index and distance tables once, so the workers share them
+        mag = self.mag
+        if mag.index is None:
+            mag.index = CellIndex.fromGraph(mag.graph)
+        if mag.distanceTables is None:
+            mag.distanceTables = DistanceTables(mag.index)
+        for ag in mag.agents:
+            mag.distanceTables.get(mag.index.ids[mag.getTarget(ag)])
+
+    def seedUpperBound(self, timeout):
+        mag = self.mag
+        with contextlib.redirect_stdout(io.StringIO()):
+            found = mag.planAstarNoHist(timeout, self.maxNodes, self.maxMemory)
+            decomposition = mag.computeMinimalDisjointDecomposition() if found else None
+        stats = mag.planStats
+        if decomposition is None:
+            return
+        plans = {ag: mag.getPlan(ag) for ag in mag.agents}
+        if self.allowsPlans(plans):
+            parts = len(decomposition) - 1
+            self.upperBound = parts
+            if parts <= self.maxParts:
+                self.bestParts = parts
+                self.bestPlans = plans
+                self.bestStats = stats
+
+    def allowsPlans(self, plans):
+        #True if the plans are valid under the action model of the sweep (plans without waits are valid under all of
+        #them but stay, where agents stay at their targets instead of leaving)
+        if self.actions == "wait":
+            return True
+        if self.actions == "move":
+            return not any(plan[t] == plan[t + 1] for plan in plans.values() for t in range(len(plan) - 1))
+        return False
+
+    def run(self):
+        #returns the number of parts of the best plan found, None if there is none
+        start = timer()
+        deadline = start + self.timeout
+        self.prepare()
+        if self.seed and self.actions != "stay":
+            self.seedUpperBound(max(min(self.timeout * SegmentSweep.SEED_SHARE, deadline - timer()), 0))
+        if "fork" in multiprocessing.get_all_start_methods(): #workers then share the tables without copying them
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        pending = list(range(1, self.maxParts + 1))
+        running = {} #reader connection -> (parts, worker), each worker sends its result on its own pipe
+        try:
+            while True:
+                pending = [parts for parts in pending if self.isOpen(parts)]
+                while pending and len(running) < self.processes:
+                    parts = pending.pop(0)
+                    reader, writer = context.Pipe(duplex=False)
+                    worker = context.Process(target=planBudget, daemon=True,
+                                             args=(self.mag, parts, max(deadline - timer(), 0), self.operatorDecomposition,
+                                                   self.maxNodes, self.maxMemory, self.heuristic, self.actions,
+                                                   writer))
+                    worker.start()
+                    writer.close()
+                    running[reader] = (parts, worker)
+                if not running:
+                    break
+                ready = wait(list(running), max(deadline + SegmentSweep.TIMEOUT_GRACE - timer(), 0))
+                if not ready:
+                    break
+                for reader in ready:
+                    parts, worker = running.pop(reader)
+                    try:
+                        self.addResult(parts, *reader.recv())
+                    except EOFError: #the worker died without a result
+                        pass
+                    reader.close()
+                    worker.join()
+                for reader, (parts, worker) in list(running.items()):
+                    if not self.isOpen(parts):
+                        self.stop(reader, worker)
+                        running.pop(reader)
+        finally:
+            for reader, (parts, worker) in running.items():
+                self.stop(reader, worker)
+        if self.lowerBound > self.maxParts: #proven, whatever the seed found over the budget
+            self.status = SearchStatus.NO_PLAN
+            self.bestParts = None
+            self.bestPlans = None
+        elif self.bestParts is not None:
+            self.status = SearchStatus.SOLVED
+        else:
+            self.status = SearchStatus.TIMEOUT
+        self.runtime = timer() - start
+        return self.bestParts
+
+    @staticmethod
+    def stop(reader, worker):
+        worker.terminate()
+        worker.join()
+        reader.close()
+
+    def isOpen(self, parts):
+        #True if planning with this budget can still improve the result
+        return self.lowerBound <= parts and (self.upperBound is None or parts < self.upperBound)
+
+    def addResult(self, parts, found, status, plans, stats):
+        if found:
+            decomposition = PlanArray.fromPaths([plans[ag] for ag in sorted(plans)]).minimalDisjointDecomposition()
+            numParts = len(decomposition) - 1
+            if self.bestParts is None or numParts < self.bestParts:
+                self.bestParts = numParts
+                self.upperBound = numParts if self.upperBound is None else min(numParts, self.upperBound)
+                self.bestPlans = plans
+                self.bestStats = stats
+        elif status == SearchStatus.NO_PLAN:
+            self.lowerBound = max(self.lowerBound, parts + 1)
+
+    def isProven(self):
+        #True if the best plan is known to have the fewest parts
+        return self.bestParts is not None and self.lowerBound >= self.bestParts
+
+
+def planBudget(mag, parts, timeout, operatorDecomposition, maxNodes, maxMemory, heuristic, actions, connection):
+    #worker: plans with at most the given number of parts and sends (found, status, plans, stats) on the connection
+    with contextlib.redirect_stdout(io.StringIO()):
+        found = mag.planAstar(parts - 1, timeout, operatorDecomposition, maxNodes, maxMemory, heuristic=heuristic,
+                              actions=actions)
+    plans = {ag: mag.getPlan(ag) for ag in mag.agents} if found else None
+    connection.send((found, mag.planStatus, plans, mag.planStats))
+    connection.close()
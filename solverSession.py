@@ -0,0 +1,113 @@
+from astar import AstarSolver
+from cbs import CbsSolver
+from cellIndex import CellIndex
+from distanceTables import DistanceTables
+from planArray import PlanArray
+from searchLimits import SearchLimits, SearchStatus
+
+
+class SolverSession:
+    #repeated planning on one MultiAgentGraph, where the sources and targets of a few agents change between queries
+    #(updateSource / updateTarget, e.g. from an interactive tool).
+    #the cell index, the distance tables of every target seen so far and the solver are kept across queries, and only
+    #the endpoints that changed are updated. Distances are per target, so a new source costs nothing and a target seen
+    #before costs a lookup. The heuristic is rebuilt only when a target changed, as its caches depend on the targets.
+    #a query first repairs the previous plan: the agents whose endpoints changed are planned again one at a time with
+    #a space-time A* around the other agents' plans (CbsSolver.planAgent). A repaired plan that fits the segment
+    #budget is the incumbent of the full search, which then only keeps the states that can lead to a plan of fewer
+    #timesteps (AstarSolver.costBound): the result is a plan at least as short as the one of planAstar, the repaired
+    #plan when the search finds no shorter one or reaches a limit (self.repaired). Repairs follow the move action
+    #model only.
+
+    def __init__(self, mag, heuristic="sum", actions="move", operatorDecomposition=False):
+        self.mag = mag
+        self.heuristic = heuristic
+        self.actions = actions
+        self.operatorDecomposition = operatorDecomposition
+        if mag.index is None:
+            mag.index = CellIndex.fromGraph(mag.graph)
+        if mag.distanceTables is None:
+            mag.distanceTables = DistanceTables(mag.index)
+        self.solver = None
+        self.sources = None
+        self.targets = None
+        self.paths = None #cell id paths of the last plan, indexed on agent
+        self.repaired = False #True if the last plan was repaired rather than searched
+        self.status = None
+        self.stats = None
+        self.runtime = 0
+
+    def matches(self, heuristic, actions, operatorDecomposition):
+        return (self.heuristic == heuristic and self.actions == actions
+                and self.operatorDecomposition == operatorDecomposition)
+
+    def update(self):
+        #brings the solver up to date with the endpoints of the graph, returns the agents whose endpoints changed
+        mag = self.mag
+        sources = [mag.getSource(ag) for ag in range(mag.num_agents)]
+        targets = [mag.getTarget(ag) for ag in range(mag.num_agents)]
+        if self.solver is None:
+            self.solver = AstarSolver(mag.graph, sources, targets, mag.index, self.actions)
+            self.solver.computeHeuristic(mag.distanceTables, self.heuristic)
+            changed = list(range(mag.num_agents))
+        else:
+            changed = [ag for ag in range(mag.num_agents)
+                       if sources[ag] != self.sources[ag] or targets[ag] != self.targets[ag]]
+            if changed:
+                self.solver.setEndpoints(sources, targets)
+                if targets != self.targets:
+                    self.solver.computeHeuristic(mag.distanceTables, self.heuristic)
+        self.sources = sources
+        self.targets = targets
+        return changed
+
+    def plan(self, numSegments, timeout=300, maxNodes=None, maxMemory=None, progress=None):
+        #plans for the current endpoints, outcome in self.status and self.stats, plans from getPlan
+        changed = self.update()
+        limits = SearchLimits(timeout, maxNodes, maxMemory, progress=progress)
+        self.repaired = False
+        repaired = None
+        if self.paths is not None and self.actions == "move":
+            repaired = self.repair(changed, numSegments)
+        solver = self.solver
+        if repaired is not None:
+            solver.costBound = max(map(len, repaired)) - 1 #timesteps of the repaired plan
+        try:
+            found = solver.astar(numSegments, timeout, self.operatorDecomposition, limits)
+        finally:
+            solver.costBound = None
+        self.status = solver.status
+        self.stats = solver.stats
+        self.runtime = solver.runtime
+        if found:
+            self.paths = [self.mag.index.toIds(solver.getPlan(ag)) for ag in range(self.mag.num_agents)]
+        elif repaired is not None:
+            self.paths = repaired
+            self.repaired = True
+            self.status = self.stats.status = SearchStatus.SOLVED
+        else:
+            self.paths = None
+        return self.paths is not None
+
+    def repair(self, changed, numSegments):
+        #the previous plan with the changed agents planned again, None if it does not fit the budget
+        paths = list(self.paths)
+        planner = CbsSolver(self.mag.graph, self.sources, self.targets, self.mag.index)
+        planner.computeHeuristic(self.mag.distanceTables)
+        for ag in changed:
+            if planner.targetDistances[ag][planner.initIds[ag]] == DistanceTables.UNREACHABLE:
+                return None
+            others = paths[:ag] + paths[ag + 1:]
+            vertex = {(cell, t) for path in others for t, cell in enumerate(path)}
+            edge = {(path[t], path[t - 1], t) for path in others for t in range(1, len(path))} #swaps
+            path = planner.planAgent(ag, (vertex, edge), others)
+            if path is None:
+                return None
+            paths[ag] = path
+        decomposition = PlanArray.fromPaths(paths).minimalDisjointDecomposition()
+        if decomposition is None or len(decomposition) - 2 > numSegments:
+            return None
+        return paths
+
+    def getPlan(self, ag):
+        return self.mag.index.toNodes(self.paths[ag])
@@ -0,0 +1,58 @@
+import contextlib
+import io
+
+import ExplainablePlanning
+import benchSuite
+
+
+#small generated instances of the planning tests, fields as in benchSuite.SUITE.
+#name: (case, makespan, decomposition parts), the plan quality every engine finds on them
+CASES = {
+    "empty-16": (("empty-16", "empty", 16, 16, None, 1, 4, 2), 21, 2),
+    "random-32-10": (("random-32-10", "random", 32, 32, 0.10, 3, 4, 2), 32, 2),
+}
+#an instance on which the first plan of A* is longer than the fewest timesteps possible with the segment budget
+BRANCHING = ("empty-16-5", "empty", 16, 16, None, 4, 5, 2)
+TIMEOUT = 60
+
+
+def load(case, directory):
+    #a BenchTester with the case generated in directory and read, its MultiAgentGraph is tester.mag
+    mapFile, scenFile = benchSuite.generateCase(case, str(directory))
+    tester = ExplainablePlanning.BenchTester()
+    tester.cache = None
+    tester.resetParams(case[7], case[6])
+    with contextlib.redirect_stdout(io.StringIO()):
+        tester.readGraph(mapFile, scenFile)
+    return tester
+
+
+def plan(case, directory, planner):
+    #plans the case with planner(mag, numSeg), returns (found, tester) with the decomposition of the plan computed
+    tester = load(case, directory)
+    with contextlib.redirect_stdout(io.StringIO()):
+        found = planner(tester.mag, case[7] - 1)
+        if found:
+            tester.mag.computeMinimalDisjointDecomposition()
+    return found, tester
+
+
+def checkPlans(mag):
+    #every agent goes from its source to its target without a collision
+    for ag in mag.agents:
+        path = mag.getPlan(ag)
+        assert path[0] == mag.getSource(ag)
+        assert path[-1] == mag.getTarget(ag)
+    assert not mag.checkCollision()
+
+
+def checkCase(name, directory, planner):
+    #plans one of the CASES and checks the plan quality, returns the tester
+    case, makespan, parts = CASES[name]
+    found, tester = plan(case, directory, planner)
+    assert found
+    checkPlans(tester.mag)
+    record = tester.resultRecord()
+    assert record["makespan"] == makespan
+    assert record["decomp_parts"] == parts
+    return tester
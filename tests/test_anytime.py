@@ -0,0 +1,89 @@
+import contextlib
+import io
+import time
+
+import pytest
+
+from anytime import AnytimeOpenList
+from astar import AstarNode
+from planCases import BRANCHING, CASES, TIMEOUT, checkCase, checkPlans, load, plan
+
+
+#a small instance on which a loose first bound gives a plan that a later search improves
+IMPROVING = ("empty-8", "empty", 8, 8, None, 4, 5, 2)
+
+
+def node(*current):
+    return AstarNode(None, current, (), (0,) * len(current), 0)
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_anytime_plans(name, tmp_path):
+    tester = checkCase(name, tmp_path, lambda mag, numSeg: mag.planAnytime(numSeg, TIMEOUT))
+    assert tester.mag.bound == 1
+
+
+def test_anytime_improves_to_cheapest(tmp_path):
+    found, tester = plan(IMPROVING, tmp_path, lambda mag, numSeg: mag.planIdaStar(numSeg, TIMEOUT))
+    assert found
+    cheapest = tester.resultRecord()["makespan"] - 1
+    found, tester = plan(IMPROVING, tmp_path, lambda mag, numSeg: mag.planAnytime(numSeg, TIMEOUT, bound=20))
+    assert found
+    checkPlans(tester.mag)
+    costs = [solution.cost for solution in tester.mag.solutions]
+    assert len(costs) > 1 and costs == sorted(costs, reverse=True)
+    assert costs[-1] == cheapest and tester.mag.bound == 1
+    for solution in tester.mag.solutions:
+        assert solution.cost <= solution.bound * cheapest
+
+
+def test_open_list_kept_across_searches():
+    openList = AnytimeOpenList(1)
+    openList.push(node(0, 1), 5, 10)
+    openList.push(node(2, 3), 5, 4)
+    openList.addClosed(node(4, 5), 3)
+    f, first, record = openList.pop()
+    assert first == node(2, 3) and f == 9
+    openList.close(record)
+    #closed in the current search: waits for the next one
+    openList.improveClosed(record, None, 3)
+    assert len(openList) == 1 and record.g == 3 and openList.inconsistent == {record}
+    deadEnd = openList.get(node(4, 5))
+    openList.improveClosed(deadEnd, None, 1)
+    assert deadEnd.closed and deadEnd not in openList.inconsistent
+    assert openList.lowest(lambda record: record.g) == 3
+    #the next search opens it again, and orders the open states on the new weight
+    openList.restart(0.5)
+    assert len(openList) == 2 and not openList.inconsistent
+    f, first, record = openList.pop()
+    assert first == node(2, 3) and f == 5
+    f, second, other = openList.pop()
+    assert second == node(0, 1) and f == 10
+    openList.close(other)
+    openList.close(record)
+    #closed in an earlier search: opened again at once
+    openList.restart(0.25)
+    openList.improveClosed(other, None, 2)
+    assert len(openList) == 1 and not other.closed
+    assert openList.pop()[1] == node(0, 1)
+
+
+@pytest.mark.parametrize("heuristic", ["sum", "pairwise"])
+def test_anytime_bound_is_proven(heuristic, tmp_path):
+    #the cheapest plan, from IDA*
+    found, tester = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planIdaStar(numSeg, TIMEOUT))
+    assert found
+    cheapest = tester.resultRecord()["makespan"] - 1
+    mag = load(BRANCHING, tmp_path).mag
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert mag.planAnytime(BRANCHING[7] - 1, 2, heuristic=heuristic)
+    #no cheaper plan is found before the timeout, which is respected
+    assert time.time() - start < 3
+    assert mag.planStats.elapsed >= 2
+    for solution in mag.solutions:
+        assert solution.cost <= solution.bound * cheapest
+    assert mag.bound == mag.solutions[-1].bound
+    if heuristic != "sum":
+        #not consistent: only the longest distance of an agent to its target bounds the cost (here the cheapest cost)
+        assert mag.bound == mag.solutions[-1].cost / cheapest
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import time
+
+import pytest
+
+import astar
+from astar import AstarNode, DominanceTable
+from planCases import BRANCHING, CASES, TIMEOUT, checkCase, checkPlans, load, plan
+from searchLimits import SearchStatus
+from segmentHistory import HistorySpace
+
+
+#eight agents that may wait, in a single part: IDA* follows thousands of pruned partial nodes per expansion
+CROWDED = ("random-64-15", "random", 64, 64, 0.15, 2, 8, 1)
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_astar_plans(name, tmp_path):
+    tester = checkCase(name, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT))
+    assert tester.mag.planStatus == "solved"
+    assert tester.resultRecord()["expanded"] > 0
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_operator_decomposition_plans(name, tmp_path):
+    #one agent at a time finds a plan of the same quality as the full joint moves
+    tester = checkCase(name, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT, True))
+    assert tester.mag.planStatus == "solved"
+
+
+def test_nodes_equal_on_state():
+    #nodes built apart from the same cells, history and segments are the same state
+    space = HistorySpace(10, 2)
+    first = AstarNode(None, (0, 1), space.singles((0, 1)), space.hashOf(space.singles((0, 1))), 0)
+    history = space.singles((0, 1))
+    second = AstarNode(first, (0, 1), history, space.hashOf(history), 0)
+    assert first == second and hash(first) == hash(second)
+    assert first != AstarNode(None, (0, 1), history, space.hashOf(history), 1)
+    moved = (space.add(history[0], 2), history[1])
+    other = AstarNode(None, (0, 1), moved, space.hashOf(moved), 0)
+    assert first != other
+
+
+@pytest.mark.parametrize("actions", ["wait", "stay"])
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_action_models_plan(name, actions, tmp_path):
+    checkCase(name, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT, actions=actions))
+
+
+def test_dominance_table():
+    space = HistorySpace(10, 2)
+    history = space.singles((0, 1))
+    table = DominanceTable(space)
+    assert not table.dominated(AstarNode(None, (0, 1), history, space.hashOf(history), 0), 3)
+    #the same cells, a larger history, no fewer segments and no lower g
+    larger = (space.add(history[0], 2), history[1])
+    assert table.dominated(AstarNode(None, (0, 1), larger, space.hashOf(larger), 0), 3)
+    assert table.dominated(AstarNode(None, (0, 1), larger, space.hashOf(larger), 1), 4)
+    #a lower g, or fewer visited cells, is not dominated
+    assert not table.dominated(AstarNode(None, (0, 1), larger, space.hashOf(larger), 0), 2)
+    other = (space.singles((5,))[0], history[1])
+    assert not table.dominated(AstarNode(None, (0, 1), other, space.hashOf(other), 0), 5)
+    assert not table.dominated(AstarNode(None, (1, 0), history, space.hashOf(history), 0), 3)
+
+
+def test_dominance_prunes_waits(tmp_path, monkeypatch):
+    #waiting keeps a history as is, so with waits most states are dominated: far fewer expansions, same plan quality
+    planner = lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT, actions="wait")
+    found, pruned = plan(BRANCHING, tmp_path, planner)
+    assert found
+    checkPlans(pruned.mag)
+    monkeypatch.setattr(astar.DominanceTable, "dominated", lambda self, node, g: False)
+    found, full = plan(BRANCHING, tmp_path, planner)
+    assert found
+    assert pruned.resultRecord()["makespan"] == full.resultRecord()["makespan"]
+    assert pruned.resultRecord()["expanded"] * 2 < full.resultRecord()["expanded"]
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_idastar_plans(name, tmp_path):
+    checkCase(name, tmp_path, lambda mag, numSeg: mag.planIdaStar(numSeg, TIMEOUT))
+
+
+def test_idastar_not_longer_than_astar(tmp_path):
+    #deepening on the timesteps finds the fewest possible with the segment budget
+    found, first = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT))
+    assert found
+    found, tester = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planIdaStar(numSeg, TIMEOUT))
+    assert found
+    checkPlans(tester.mag)
+    assert tester.resultRecord()["makespan"] < first.resultRecord()["makespan"]
+    assert tester.resultRecord()["decomp_parts"] <= BRANCHING[7]
+
+
+@pytest.mark.parametrize("actions", ["move", "wait"])
+def test_idastar_timeout_respected(actions, tmp_path):
+    mag = load(CROWDED, tmp_path).mag
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not mag.planIdaStar(0, 1, actions=actions)
+    assert time.time() - start < 1.5
+    assert mag.planStatus == SearchStatus.TIMEOUT
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import benchSuite
+import resultWriter
+import searchLimits
+from batchRunner import BatchRunner
+from planCases import CASES
+from searchLimits import SearchStatus
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#the address space size and cap in MB of a worker started with a memory limit of sys.argv[1] MB
+WORKER_CAP = """
+import resource, sys
+sys.path.insert(0, {root!r})
+import batchRunner, searchLimits
+size = searchLimits.addressSpaceSize()
+batchRunner.initWorker(None, float(sys.argv[1]))
+print(size, resource.getrlimit(resource.RLIMIT_AS)[0] / (1024 * 1024))
+""".format(root=ROOT)
+
+
+def instances(directory):
+    #(map, scen, agents, segments) of the shared test cases, generated in directory
+    rows = []
+    for name in sorted(CASES):
+        case = CASES[name][0]
+        mapFile, scenFile = benchSuite.generateCase(case, str(directory))
+        rows.append((mapFile, scenFile, case[6], case[7]))
+    return rows
+
+
+def readRecords(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("maxMemory", [None, 60, 120])
+def test_instances_solve(maxMemory, tmp_path):
+    #a small memory cap still leaves the workers enough room for these instances
+    output = str(tmp_path / "results.jsonl")
+    todo = instances(tmp_path)
+    runner = BatchRunner(output, processes=2, timeout=60, maxMemory=maxMemory, fmt="jsonl")
+    assert runner.run(todo) == len(todo)
+    records = readRecords(output)
+    assert sorted(record["status"] for record in records) == [SearchStatus.SOLVED] * len(todo)
+    for record in records:
+        name = next(name for name in CASES if record["scen"].endswith(name + ".scen"))
+        assert record["makespan"] == CASES[name][1]
+        assert record["decomp_parts"] == CASES[name][2]
+
+
+@pytest.mark.skipif(searchLimits.resource is None or not os.path.exists("/proc/self/statm"),
+                    reason="needs RLIMIT_AS and /proc")
+@pytest.mark.parametrize("maxMemory", [60, 4000])
+def test_worker_cap_follows_memory_limit(maxMemory):
+    #the cap leaves the worker about maxMemory MB above its size, plus the reserve the search keeps free
+    result = subprocess.run([sys.executable, "-c", WORKER_CAP, str(maxMemory)], capture_output=True, text=True,
+                            timeout=60)
+    size, cap = map(float, result.stdout.split())
+    assert maxMemory < cap - size <= maxMemory + searchLimits.memoryReserve(cap) + 1
+    #the search of the worker stops once it grew by maxMemory (see searchLimits.memoryHeadroom)
+    assert cap - size - searchLimits.memoryReserve(cap) == pytest.approx(maxMemory)
+
+
+def test_resume_retries_errors(tmp_path):
+    output = str(tmp_path / "results.tsv")
+    todo = instances(tmp_path)
+    #an earlier sweep planned the first instance and failed on the second one
+    with open(output, "w", newline="") as f:
+        writer = resultWriter.createWriter(f, "tsv")
+        writer.write(resultWriter.emptyRecord(*todo[0], SearchStatus.TIMEOUT, 60))
+        writer.write(resultWriter.emptyRecord(*todo[1], SearchStatus.ERROR, None))
+    runner = BatchRunner(output, processes=1, timeout=60, fmt="tsv")
+    assert runner.run(todo) == 1
+    assert runner.run(todo) == 0
+    keys = resultWriter.readKeys(output, "tsv", retry=(SearchStatus.ERROR,))
+    assert keys == {resultWriter.recordKey(resultWriter.emptyRecord(*inst, None, None)) for inst in todo}
@@ -0,0 +1,85 @@
+import random
+import time
+
+import pytest
+
+from cbs import CbsSolver
+from gridGraph import GridGraph
+from planCases import BRANCHING, CASES, TIMEOUT, checkCase, checkPlans, plan
+from searchLimits import SearchInterrupted, SearchLimits, SearchStats, SearchStatus
+
+
+def gridSolver(size, sources, targets):
+    solver = CbsSolver(GridGraph.grid(size, size), sources, targets)
+    solver.computeHeuristic()
+    return solver
+
+
+def collisions(path, others):
+    #collisions of path with the other paths, as counted by CbsSolver.planAgent
+    reserved = {}
+    for other in others:
+        for t, cell in enumerate(other):
+            reserved[(cell, t)] = reserved.get((cell, t), 0) + 1
+    count = 0
+    for t in range(1, len(path)):
+        count += reserved.get((path[t], t), 0)
+        if reserved.get((path[t], t - 1)) and reserved.get((path[t - 1], t)):
+            count += 1
+    return count
+
+
+def shortestPaths(solver, ag):
+    #every shortest path of agent ag, as cell ids
+    dist = solver.targetDistances[ag]
+    paths = [[solver.initIds[ag]]]
+    while paths[0][-1] != solver.targetIds[ag]:
+        paths = [path + [nb] for path in paths for nb in solver.index.neighbors[path[-1]]
+                 if dist[nb] == dist[path[-1]] - 1]
+    return paths
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_cbs_plans(name, tmp_path):
+    checkCase(name, tmp_path, lambda mag, numSeg: mag.planCBS(numSeg, TIMEOUT))
+
+
+def test_cbs_not_longer_than_astar(tmp_path):
+    found, astar = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT))
+    assert found
+    found, tester = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planCBS(numSeg, TIMEOUT))
+    assert found
+    checkPlans(tester.mag)
+    assert tester.resultRecord()["makespan"] <= astar.resultRecord()["makespan"]
+    assert tester.resultRecord()["decomp_parts"] <= BRANCHING[7]
+
+
+def test_low_level_fewest_collisions():
+    #among the shortest paths, the one with the fewest collisions with random walks of two other agents
+    rand = random.Random(2)
+    solver = gridSolver(5, [(0, 0)], [(4, 4)])
+    shortest = shortestPaths(solver, 0)
+    for attempt in range(20):
+        others = []
+        for other in range(2):
+            walk = [rand.randrange(solver.index.numCells())]
+            for t in range(8):
+                walk.append(rand.choice(solver.index.neighbors[walk[-1]]))
+            others.append(walk)
+        path = solver.planAgent(0, (frozenset(), frozenset()), others)
+        assert len(path) == len(shortest[0])
+        assert collisions(path, others) == min(collisions(other, others) for other in shortest)
+
+
+def test_low_level_interrupted():
+    #the target is forbidden for a long time, the search goes through most of the space-time states first
+    solver = gridSolver(32, [(0, 0)], [(31, 31)])
+    target = solver.targetIds[0]
+    constraints = (frozenset((target, t) for t in range(100000)), frozenset())
+    limits = SearchLimits(timeout=0.5)
+    stats = SearchStats()
+    start = time.time()
+    with pytest.raises(SearchInterrupted) as raised:
+        solver.planAgent(0, constraints, [], lambda: limits.interrupt(stats))
+    assert raised.value.status == SearchStatus.TIMEOUT
+    assert time.time() - start < 1.5
@@ -0,0 +1,40 @@
+import contextlib
+import io
+import time
+
+import pytest
+
+from planCases import BRANCHING, CASES, TIMEOUT, checkCase, checkPlans, load, plan
+from searchLimits import SearchStatus
+
+
+#eight agents on a large map: the first expansions alone take seconds
+CROWDED = ("random-64-15", "random", 64, 64, 0.15, 2, 8, 2)
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_hda_plans(name, tmp_path):
+    tester = checkCase(name, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT, workers=2))
+    assert tester.mag.planStats.expanded > 0
+
+
+def test_incumbent_at_timeout_not_longer_than_astar(tmp_path):
+    #the search is stopped by the timeout, its incumbent is at least the plan of the serial dive
+    found, astar = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT))
+    assert found
+    found, tester = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, 3, workers=2))
+    assert found
+    checkPlans(tester.mag)
+    assert tester.resultRecord()["makespan"] <= astar.resultRecord()["makespan"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_timeout_respected(workers, tmp_path):
+    mag = load(CROWDED, tmp_path).mag
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not mag.planAstar(1, 2, workers=workers)
+    assert time.time() - start < 3
+    assert mag.planStatus == SearchStatus.TIMEOUT
+    #the final counters of the workers and of the dive
+    assert mag.planStats.expanded > 0 and mag.planStats.generated > 1
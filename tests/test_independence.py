@@ -0,0 +1,19 @@
+import pytest
+
+from planCases import BRANCHING, CASES, TIMEOUT, checkCase, checkPlans, plan
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_independent_plans(name, tmp_path):
+    checkCase(name, tmp_path, lambda mag, numSeg: mag.planIndependent(numSeg, TIMEOUT))
+
+
+def test_independent_not_longer_than_astar(tmp_path):
+    #planned apart, the groups avoid the detours of the first joint plan of A* on this instance
+    found, astar = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT))
+    assert found
+    found, tester = plan(BRANCHING, tmp_path, lambda mag, numSeg: mag.planIndependent(numSeg, TIMEOUT))
+    assert found
+    checkPlans(tester.mag)
+    assert tester.resultRecord()["makespan"] <= astar.resultRecord()["makespan"]
+    assert tester.resultRecord()["decomp_parts"] <= BRANCHING[7]
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import jointMoves
+from instrumentation import Instrumentation
+from planCases import CASES, TIMEOUT, checkCase
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile(name, directory, operatorDecomposition=False):
+    #the counters of an instrumented A* search of one of the CASES, whose plan quality is checked
+    instrumentation = Instrumentation()
+    checkCase(name, directory, lambda mag, numSeg: mag.planAstar(numSeg, TIMEOUT, operatorDecomposition,
+                                                                 instrumentation=instrumentation))
+    return instrumentation.asDict()["counters"]
+
+
+def test_pruned_counters(tmp_path):
+    #the plan of this case takes both parts, so that children over the budget are generated
+    counters = profile("empty-16", tmp_path)
+    assert counters["pruned by segment bound"] > 0
+    assert counters["pruned by legality"] > 0
+    assert counters["combinations"] == (counters["children"] + counters["pruned by segment bound"]
+                                        + counters["pruned by legality"])
+    #every child over the budget was dropped before the state table
+    assert counters["state lookups"] == counters["children"]
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_batch_counts_as_single_joint_moves(name, tmp_path, monkeypatch):
+    batch = profile(name, tmp_path)
+    monkeypatch.setattr(jointMoves, "MIN_BATCH", float("inf"))
+    assert profile(name, tmp_path) == batch
+
+
+def test_pruned_counters_with_operator_decomposition(tmp_path):
+    counters = profile("empty-16", tmp_path, operatorDecomposition=True)
+    assert counters["pruned by segment bound"] > 0
+    assert counters["pruned by legality"] is None
+
+
+@pytest.mark.parametrize("engine", [["--ida", "1000"], ["--cbs"], ["--id"], ["--anytime"], ["--minimize"],
+                                    ["--workers", "2"]])
+def test_profile_rejected_with_other_engines(engine):
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "ExplainablePlanning.py"), "missing.map",
+                             "missing.scen", "4", "2", "10", "--profile"] + engine,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 2
+    assert "--profile times the serial A* search only" in result.stderr
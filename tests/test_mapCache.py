@@ -0,0 +1,68 @@
+from gridGraph import GridGraph
+from mapCache import MapCache
+
+
+MAP = """type octile
+height 4
+width 5
+map
+.....
+.@@..
+.....
+..@..
+"""
+
+
+def writeMap(directory, text=MAP, name="test.map"):
+    path = directory / name
+    path.write_text(text)
+    return str(path)
+
+
+def sameGraph(a, b):
+    assert a.index.cells == b.index.cells
+    assert list(a.indptr) == list(b.indptr)
+    assert list(a.indices) == list(b.indices)
+
+
+def test_grid_round_trip(tmp_path):
+    mapFile = writeMap(tmp_path)
+    graph = MapCache(None).load(mapFile).graph
+    path = str(tmp_path / "grid.bin")
+    MapCache.writeGrid(path, graph)
+    loaded = MapCache.readGrid(path)
+    assert isinstance(loaded, GridGraph)
+    assert loaded.number_of_nodes() == graph.number_of_nodes() == 17
+    assert loaded.number_of_edges() == graph.number_of_edges()
+    sameGraph(loaded, graph)
+
+
+def test_cache_directory_round_trip(tmp_path):
+    mapFile = writeMap(tmp_path)
+    cacheDir = str(tmp_path / "cache")
+    first = MapCache(cacheDir).load(mapFile)
+    table = list(first.distanceTables.get(0))
+    #a new cache (e.g. in another process) reads the compiled map and the distance table back from the files
+    second = MapCache(cacheDir).load(mapFile)
+    sameGraph(second.graph, first.graph)
+    assert list(second.distanceTables.store.load(0)) == table
+    assert list(second.distanceTables.get(0)) == table
+    assert list(MapCache(None).load(mapFile).distanceTables.get(0)) == table
+
+
+def test_cache_keys_on_contents(tmp_path):
+    mapFile = writeMap(tmp_path)
+    cache = MapCache(str(tmp_path / "cache"))
+    assert cache.load(mapFile) is cache.load(mapFile)
+    other = writeMap(tmp_path, MAP.replace("..@..", "....."), "other.map")
+    assert cache.load(other).key != cache.load(mapFile).key
+    assert cache.load(other).graph.number_of_nodes() == 18
+
+
+def test_cache_rejects_bad_files(tmp_path):
+    path = tmp_path / "grid.bin"
+    assert MapCache.readGrid(str(path)) is None
+    path.write_bytes(b"")
+    assert MapCache.readGrid(str(path)) is None
+    path.write_bytes(b"\x00" * 12)
+    assert MapCache.readGrid(str(path)) is None
@@ -0,0 +1,37 @@
+import pytest
+
+import mapParser
+
+
+SCEN = ("version 1\n"
+        "0\tm.map\t8\t8\t0\t0\t7\t7\t9.9\n"
+        "\n"
+        "0\tm.map\t8\t8\t1\t0\n"
+        "  \n"
+        "0\tm.map\t8\t8\t2\t0\t5\t7\t7.1\n"
+        "0\tm.map\t8\t8\t3\t0\t3\t7\t7\n")
+MAP = "type octile\r\nheight 3\r\nwidth 4\r\nmap\r\n..@.\r\n@...\r\n.T@@\r\n"
+
+
+def write(directory, name, text):
+    path = directory / name
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+def test_scenario_skips_blank_and_short_rows(tmp_path):
+    filename = write(tmp_path, "m.scen", SCEN)
+    assert mapParser.readScenario(filename, 3) == [((0, 0), (7, 7)), ((2, 0), (5, 7)), ((3, 0), (3, 7))]
+    assert list(mapParser.iterScenario(filename, 2)) == [((0, 0), (7, 7)), ((2, 0), (5, 7))]
+    assert len(list(mapParser.iterScenario(filename))) == 3
+    with pytest.raises(ValueError):
+        mapParser.readScenario(filename, 4)
+
+
+def test_map_mask(tmp_path):
+    filename = write(tmp_path, "m.map", MAP)
+    width, height, mask = mapParser.readMask(filename)
+    assert (width, height) == (4, 3)
+    assert mask == bytes([1, 1, 0, 1, 0, 1, 1, 1, 1, 1, 0, 0])
+    with pytest.raises(ValueError):
+        mapParser.readMask(write(tmp_path, "short.map", MAP.replace(".T@@\r\n", "")))
@@ -0,0 +1,76 @@
+import io
+import json
+
+import pytest
+
+import resultWriter
+
+
+def record(scen, status="solved", found=True):
+    return {"map": "maps/empty.map", "scen": scen, "agents": 4, "max_decomp_parts": 2, "status": status,
+            "found": found, "decomp_parts": 2 if found else None, "makespan": 21 if found else None, "runtime": 0.5,
+            "expanded": 10, "generated": 30, "peak_open": 5, "peak_closed": 10, "peak_rss": 50.0,
+            "decomposition": [0, 7, 21] if found else None, "plans": [[[0, 0], [0, 1]]] if found else None}
+
+
+RECORDS = [record("a.scen"), record("b.scen", "timeout", False), record("c.scen", "error", False)]
+
+
+def writeRecords(path, fmt, records=RECORDS):
+    with open(path, "w", newline="") as f:
+        writer = resultWriter.createWriter(f, fmt)
+        for rec in records:
+            writer.write(rec)
+
+
+@pytest.mark.parametrize("fmt", resultWriter.FORMATS)
+def test_keys_round_trip(fmt, tmp_path):
+    path = str(tmp_path / ("results." + fmt))
+    writeRecords(path, fmt)
+    assert resultWriter.readKeys(path, fmt) == {resultWriter.recordKey(rec) for rec in RECORDS}
+    assert resultWriter.readKeys(str(tmp_path / "missing.jsonl"), fmt) == set()
+
+
+@pytest.mark.parametrize("fmt", resultWriter.FORMATS)
+def test_retried_records_do_not_count(fmt, tmp_path):
+    path = str(tmp_path / ("results." + fmt))
+    writeRecords(path, fmt)
+    keys = {resultWriter.recordKey(rec) for rec in RECORDS}
+    assert resultWriter.readKeys(path, fmt, retry=("error",)) == keys - {resultWriter.recordKey(RECORDS[2])}
+
+
+def test_jsonl_keeps_records():
+    stream = io.StringIO()
+    writer = resultWriter.createWriter(stream, "jsonl")
+    for rec in RECORDS:
+        writer.write(rec)
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == RECORDS
+
+
+def test_table_summary():
+    stream = io.StringIO()
+    writer = resultWriter.createWriter(stream, "tsv")
+    writer.write(RECORDS[0])
+    writer.write(RECORDS[1])
+    lines = [line.split("\t") for line in stream.getvalue().splitlines()]
+    assert lines[0] == resultWriter.SUMMARY_FIELDS
+    row = dict(zip(resultWriter.SUMMARY_FIELDS, lines[1]))
+    assert row["decomposition"] == "0 7 21"
+    assert row["makespan"] == "21"
+    assert dict(zip(resultWriter.SUMMARY_FIELDS, lines[2]))["makespan"] == ""
+
+
+def test_append_after_interruption(tmp_path):
+    path = str(tmp_path / "results.csv")
+    stream, isNew = resultWriter.openAppend(path)
+    assert isNew
+    with stream:
+        resultWriter.createWriter(stream, "csv", header=isNew).write(RECORDS[0])
+    with open(path, "a", newline="") as f:
+        f.write("maps/empty.map,b.scen,4") #a row cut by an interruption
+    stream, isNew = resultWriter.openAppend(path)
+    assert not isNew
+    with stream:
+        resultWriter.createWriter(stream, "csv", header=isNew).write(RECORDS[2])
+    keys = resultWriter.readKeys(path, "csv")
+    assert keys == {resultWriter.recordKey(RECORDS[0]), resultWriter.recordKey(RECORDS[2])}
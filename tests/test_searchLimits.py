@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import searchLimits
+from searchLimits import SearchInterrupted, SearchLimits, SearchStats, SearchStatus
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#plans a case under an address space cap of sys.argv[1] MB above the size of the process, prints the status
+CAPPED_PLAN = """
+import contextlib, io, resource, sys, tempfile
+sys.path[:0] = [{root!r}, {tests!r}]
+import planCases, searchLimits
+limit = int((searchLimits.addressSpaceSize() + float(sys.argv[1])) * 1024 * 1024)
+resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+found, tester = planCases.plan(planCases.CASES["empty-16"][0], tempfile.mkdtemp(),
+                               lambda mag, numSeg: mag.planAstar(numSeg, 60))
+print(tester.mag.planStatus)
+""".format(root=ROOT, tests=os.path.join(ROOT, "tests"))
+
+
+def test_reserve_is_a_share_of_small_ceilings():
+    assert searchLimits.memoryReserve(120) == pytest.approx(12)
+    assert searchLimits.memoryReserve(100000) == searchLimits.MEMORY_RESERVE
+
+
+def test_headroom_under_small_address_space():
+    size = searchLimits.addressSpaceSize()
+    if size is None:
+        pytest.skip("the address space of the process is unknown")
+    headroom = searchLimits.memoryHeadroom((size + 120, None), system=False)
+    assert headroom == pytest.approx(120 - searchLimits.memoryReserve(size + 120), abs=10)
+    assert searchLimits.memoryHeadroom((size + 1, None), system=False) < 0
+    assert searchLimits.memoryHeadroom((None, None), system=False) is None
+
+
+@pytest.mark.skipif(searchLimits.resource is None or not os.path.exists("/proc/self/statm"),
+                    reason="needs RLIMIT_AS and /proc")
+def test_search_under_small_address_space():
+    result = subprocess.run([sys.executable, "-c", CAPPED_PLAN, "120"], capture_output=True, text=True, timeout=120)
+    assert result.stdout.split()[-1] == SearchStatus.SOLVED, result.stderr
+
+
+def test_check_limits():
+    stats = SearchStats()
+    assert SearchLimits().check(stats, 0, 0) is None
+    assert SearchLimits(timeout=0).check(stats, 0, 0) == SearchStatus.TIMEOUT
+    stats.expanded = 10
+    assert SearchLimits(maxNodes=10).check(stats, 5, 3) == SearchStatus.NODE_LIMIT
+    assert stats.peakOpenSize == 5 and stats.peakClosedSize == 3
+    assert SearchLimits(maxMemory=0.001).check(stats, 0, 0) == SearchStatus.MEMORY_LIMIT
+
+
+def test_interrupt_raises_at_limit():
+    SearchLimits(timeout=60, maxMemory=100000).interrupt(SearchStats())
+    with pytest.raises(SearchInterrupted) as raised:
+        SearchLimits(timeout=0).interrupt(SearchStats())
+    assert raised.value.status == SearchStatus.TIMEOUT
@@ -0,0 +1,52 @@
+import contextlib
+import io
+import time
+
+from planCases import checkPlans, load
+from searchLimits import SearchStatus
+from segmentSweep import SegmentSweep
+
+
+#two agents whose plain A* plan has a single part: the seed plan is the result, no budget is left to the workers
+SEEDED = ("empty-16", "empty", 16, 16, None, 1, 2, 2)
+#eight agents that may wait: an expansion of the plain A* has up to 5^8 joint moves
+CROWDED = ("random-64-15", "random", 64, 64, 0.15, 2, 8, 2)
+
+
+def test_seed_plan_is_the_result(tmp_path):
+    tester = load(SEEDED, tmp_path)
+    mag = tester.mag
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert mag.minimizeSegments(2, 30, processes=2, actions="wait")
+    assert mag.minParts == 1 and mag.minPartsProven
+    assert mag.planStatus == SearchStatus.SOLVED
+    #the stats of the seed search, not None
+    assert mag.planStats is not None and mag.planStats.expanded > 0
+    checkPlans(mag)
+
+
+def test_sweep_finds_fewest_parts(tmp_path):
+    tester = load(SEEDED, tmp_path)
+    sweep = SegmentSweep(tester.mag, 2, 30, processes=2, seed=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert sweep.run() == 1
+    assert sweep.status == SearchStatus.SOLVED and sweep.isProven()
+    assert sweep.bestStats is not None
+
+
+def test_seed_search_respects_timeout(tmp_path):
+    mag = load(CROWDED, tmp_path).mag
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not mag.planAstarNoHist(1)
+    assert time.time() - start < 2
+    assert mag.planStatus == SearchStatus.TIMEOUT
+    assert mag.planStats.elapsed >= 1
+
+
+def test_sweep_respects_timeout(tmp_path):
+    mag = load(CROWDED, tmp_path).mag
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        mag.minimizeSegments(2, 2, processes=2)
+    assert time.time() - start < 3.5
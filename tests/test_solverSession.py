@@ -0,0 +1,32 @@
+import contextlib
+import io
+
+import pytest
+
+from planCases import CASES, TIMEOUT, checkCase, checkPlans
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_session_plans(name, tmp_path):
+    checkCase(name, tmp_path, lambda mag, numSeg: mag.planSession(numSeg, TIMEOUT))
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_session_replans_changed_target(name, tmp_path):
+    #a new target halfway along the first plan of agent 0: the query is repaired, then searched for a shorter plan,
+    #and its plan is never longer than the one of a fresh planAstar
+    case = CASES[name][0]
+    numSeg = case[7] - 1
+    tester = checkCase(name, tmp_path, lambda mag, numSeg: mag.planSession(numSeg, TIMEOUT))
+    mag = tester.mag
+    first = mag.getPlan(0)
+    mag.updateTarget(0, first[len(first) // 2])
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert mag.planSession(numSeg, TIMEOUT)
+        mag.computeMinimalDisjointDecomposition()
+        checkPlans(mag)
+        session = mag.resultRecord()
+        assert mag.planAstar(numSeg, TIMEOUT)
+        mag.computeMinimalDisjointDecomposition()
+    assert session["makespan"] <= mag.resultRecord()["makespan"]
+    assert session["decomp_parts"] <= case[7]